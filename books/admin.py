@@ -1,6 +1,13 @@
 from django.contrib import admin
+from django.db import transaction
 
+from borrowings.holds import allocate_restocked_holds
 from .models import Book
 
 
-admin.site.register(Book)
+@admin.register(Book)
+class BookAdmin(admin.ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            allocate_restocked_holds([obj.pk])
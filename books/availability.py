@@ -0,0 +1,118 @@
+"""
+When will a copy of a sold-out book be free again?
+
+The copies of a book that are out are held by its BORROWED and
+WAITING_PAYMENT borrowings, and the next one expected back is the
+earliest `expected_return_date` among them. The partial
+`borrowing_book_return_idx` index on (book, expected_return_date) covers
+exactly those rows, so the answer is one index probe per book no matter
+how many returned borrowings a title has. A batch of books is a single
+query with one correlated `LIMIT 1` subquery per row.
+
+Copies go to waiting holds first, so with `n` patrons queued a newcomer
+gets the `n + 1`-th copy to come free. Only books with a queue need more
+than the next return; their expected returns are read by one more query.
+"""
+
+from collections import defaultdict
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from books.models import Book
+from borrowings.models import Borrowing, Hold
+
+# Upper bound of one batched availability request
+MAX_AVAILABILITY_BOOKS = 100
+
+HOLDING_STATUSES = (
+    Borrowing.BorrowingStatus.BORROWED,
+    Borrowing.BorrowingStatus.WAITING_PAYMENT,
+)
+
+
+def next_return_subquery():
+    return Subquery(
+        Borrowing.objects.filter(book=OuterRef("pk"), status__in=HOLDING_STATUSES)
+        .order_by("expected_return_date")
+        .values("expected_return_date")[:1]
+    )
+
+
+def holds_waiting_subquery():
+    """Number of waiting holds of a book, counted on `hold_queue_idx`."""
+    return Coalesce(
+        Subquery(
+            Hold.objects.filter(book=OuterRef("pk"), status=Hold.HoldStatus.WAITING)
+            .order_by()
+            .values("book")
+            .annotate(count=Count("pk"))
+            .values("count"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def expected_returns(book_ids):
+    """{book id: expected return dates of its copies that are out, earliest first}."""
+    returns = defaultdict(list)
+    for book_id, expected_return_date in (
+        Borrowing.objects.filter(book_id__in=book_ids, status__in=HOLDING_STATUSES)
+        .order_by("book_id", "expected_return_date")
+        .values_list("book_id", "expected_return_date")
+    ):
+        returns[book_id].append(expected_return_date)
+    return returns
+
+
+def get_availability(book_ids):
+    """
+    Availability of the existing books among `book_ids`, in request order.
+
+    `next_return_date` is the earliest expected return of a copy that is
+    out (it may be past for an overdue copy). `available_from` is when a
+    patron asking now could get a copy: the shelf copies (today) and then
+    the expected returns are handed out in order, `holds_waiting` of them
+    to the patrons already queued, never before today. It is None when no
+    such copy is expected.
+    """
+    today = timezone.now().date()
+    books = {
+        book["id"]: book
+        for book in Book.objects.filter(pk__in=book_ids)
+        .annotate(
+            next_return_date=next_return_subquery(),
+            holds_waiting=holds_waiting_subquery(),
+        )
+        .values("id", "inventory", "next_return_date", "holds_waiting")
+    }
+    queued = [book_id for book_id, book in books.items() if book["holds_waiting"]]
+    returns = expected_returns(queued) if queued else {}
+
+    availability = []
+    for book_id in dict.fromkeys(book_ids):
+        book = books.get(book_id)
+        if book is None:
+            continue
+        next_return_date = book["next_return_date"]
+        holds_waiting = book["holds_waiting"]
+        if holds_waiting:
+            supply = [today] * book["inventory"] + returns[book_id]
+            free_date = supply[holds_waiting] if len(supply) > holds_waiting else None
+        elif book["inventory"] > 0:
+            free_date = today
+        else:
+            free_date = next_return_date
+        availability.append(
+            {
+                "book": book_id,
+                "inventory": book["inventory"],
+                "available": book["inventory"] > holds_waiting,
+                "holds_waiting": holds_waiting,
+                "next_return_date": next_return_date,
+                "available_from": max(free_date, today) if free_date else None,
+            }
+        )
+    return availability
@@ -0,0 +1,114 @@
+"""
+Read-through cache for the public book catalogue.
+
+- List pages are keyed by a catalogue version and the full request URL;
+  bumping the version makes every cached page stale at once. The version
+  is seeded from the clock, so a counter that was evicted or lost in a
+  cache restart never comes back at a version whose pages are still
+  cached.
+- Single-book payloads are keyed by book id and a per-book version, which
+  is dropped when that book changes and re-seeded from the clock. A
+  payload built from a read before the change and written after it lands
+  under the old version, where no reader looks.
+- Hits and misses are counted in the cache itself so all workers share them.
+- Celery tasks (Stripe webhooks, expiry, reconciliation) change inventory
+  too, so the workers must use the same cache as the web processes
+  (`CACHE_URL`) for their invalidations to reach it.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = "books:catalogue:version"
+HITS_KEY = "books:catalogue:hits"
+MISSES_KEY = "books:catalogue:misses"
+
+
+def _incr(key, start=0):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key missing or evicted: start counting again
+        cache.add(key, start, timeout=None)
+        return cache.incr(key)
+
+
+def _bump_version():
+    return _incr(VERSION_KEY, start=time.time_ns())
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        seed = time.time_ns()
+        cache.add(key, seed, timeout=None)
+        version = cache.get(key, seed)
+    return version
+
+
+def get_catalogue_version():
+    return _get_version(VERSION_KEY)
+
+
+def list_key(request):
+    return f"books:list:v{get_catalogue_version()}:{request.build_absolute_uri()}"
+
+
+def _book_version_key(book_id):
+    return f"books:detail:{book_id}:version"
+
+
+def detail_key(book_id):
+    """Key of a book's payload; take it before reading the book."""
+    version = _get_version(_book_version_key(book_id))
+    return f"books:detail:{book_id}:v{version}"
+
+
+def read_through(key, build):
+    """Return the cached payload for `key`, building and storing it on a miss."""
+    data = cache.get(key)
+    if data is not None:
+        _incr(HITS_KEY)
+        return data
+
+    _incr(MISSES_KEY)
+    data = build()
+    cache.set(key, data, timeout=settings.BOOK_CACHE_TIMEOUT)
+    return data
+
+
+def invalidate_book(book_id):
+    """
+    Drop cached payloads for a book once the current transaction commits,
+    so concurrent readers cannot re-cache the pre-commit state.
+    """
+
+    def invalidate():
+        _bump_version()
+        cache.delete(_book_version_key(book_id))
+
+    transaction.on_commit(invalidate)
+
+
+def invalidate_books(book_ids):
+    """Like `invalidate_book`, for many books with a single version bump."""
+    keys = [_book_version_key(book_id) for book_id in book_ids]
+
+    def invalidate():
+        _bump_version()
+        cache.delete_many(keys)
+
+    transaction.on_commit(invalidate)
+
+
+def get_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "version": get_catalogue_version(),
+    }
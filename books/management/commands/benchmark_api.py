@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from config.benchmarks.runner import SCENARIOS, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Measures throughput and latency percentiles of the API hot paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", help="Benchmark a running server instead of in-process"
+        )
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=[scenario.name for scenario in SCENARIOS],
+            help="Run only this scenario (repeatable)",
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        parser.add_argument("--compare", help="Baseline JSON report to diff against")
+
+    def handle(self, *args, **options):
+        report = run_benchmarks(
+            base_url=options["url"],
+            requests=options["requests"],
+            warmup=options["warmup"],
+            concurrency=options["concurrency"],
+            only=options["scenario"],
+        )
+
+        for name, result in report["results"].items():
+            latency = result["latency_ms"]
+            self.stdout.write(
+                f"{name:<18} {result['rps'] or 0:>9.1f} req/s  "
+                f"p50 {latency['p50'] or 0:>8.2f} ms  "
+                f"p95 {latency['p95'] or 0:>8.2f} ms  "
+                f"p99 {latency['p99'] or 0:>8.2f} ms  "
+                f"errors {result['errors']}"
+            )
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as baseline_file:
+                baseline = json.load(baseline_file)
+            self.stdout.write(f"\nAgainst {baseline['meta'].get('revision')}:")
+            for name, metric, old, new, change in compare(baseline, report):
+                self.stdout.write(
+                    f"{name:<18} {metric:<7} {old} -> {new} "
+                    f"({'n/a' if change is None else f'{change:+.1f}%'})"
+                )
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from config.benchmarks.serving import PROFILES, benchmark_serving
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the read endpoints under each serving profile"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile",
+            action="append",
+            choices=list(PROFILES),
+            help="Profile to run (repeatable; all by default)",
+        )
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--output", help="Write the JSON reports to this file")
+
+    def handle(self, *args, **options):
+        reports = benchmark_serving(
+            options["profile"] or list(PROFILES),
+            requests=options["requests"],
+            concurrency=options["concurrency"],
+            workers=options["workers"],
+            threads=options["threads"],
+        )
+
+        for profile, report in reports.items():
+            self.stdout.write(profile)
+            for name, result in report["results"].items():
+                self.stdout.write(
+                    f"  {name:<16} {result['rps'] or 0:>9.1f} req/s  "
+                    f"p50 {result['latency_ms']['p50'] or 0:>8.2f} ms  "
+                    f"p95 {result['latency_ms']['p95'] or 0:>8.2f} ms  "
+                    f"errors {result['errors']}"
+                )
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                json.dump(reports, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from books.models import Book
+from config.benchmarks.seed import reset_data, seed_data
+
+
+class Command(BaseCommand):
+    help = "Seeds a deterministic dataset for benchmark_api (use a scratch database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=2000)
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--borrowings", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Delete ALL books, borrowings and payments first",
+        )
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            reset_data()
+        elif Book.objects.exists():
+            raise CommandError(
+                "Database already has books; pass --reset to replace them."
+            )
+
+        counts = seed_data(
+            books=options["books"],
+            users=options["users"],
+            borrowings=options["borrowings"],
+            seed=options["seed"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Seeded "
+                + ", ".join(f"{count} {name}" for name, count in counts.items())
+            )
+        )
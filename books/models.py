@@ -1,6 +1,20 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
 
 
+def book_search_vector():
+    """Weighted full-text vector over title (A) and author (B)."""
+    return SearchVector("title", weight="A", config="english") + SearchVector(
+        "author", weight="B", config="english"
+    )
+
+
+# Its `::regconfig` casts are PostgreSQL only, so it is not in Book.Meta:
+# books.signals creates it after migrate on PostgreSQL
+SEARCH_INDEX = GinIndex(book_search_vector(), name="book_search_vector_idx")
+
+
 class Book(models.Model):
 
     class CoverType(models.TextChoices):
@@ -16,6 +30,8 @@ class Book(models.Model):
     )
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    # Set on save; queryset updates set it explicitly
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.title} by {self.author}"
@@ -0,0 +1,77 @@
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+from rest_framework.exceptions import ValidationError
+
+from books.models import Book, book_search_vector
+
+
+def search_books(queryset, terms):
+    """
+    Filter books matching `terms` and annotate them with a relevance `rank`.
+
+    PostgreSQL uses the weighted `tsvector` served by the GIN index on
+    `Book` (created on PostgreSQL only, see `books.signals`); other
+    databases, e.g. SQLite in tests, fall back to `icontains` with title
+    matches ranked above author matches.
+    """
+    if connection.vendor == "postgresql":
+        vector = book_search_vector()
+        query = SearchQuery(terms, config="english", search_type="websearch")
+        # ts_rank returns a real; cast it so cursor positions round-trip exactly
+        rank = Cast(SearchRank(vector, query), FloatField())
+        return queryset.annotate(search=vector, rank=rank).filter(search=query)
+
+    return queryset.filter(
+        Q(title__icontains=terms) | Q(author__icontains=terms)
+    ).annotate(
+        rank=Case(
+            When(title__icontains=terms, then=Value(1.0)),
+            default=Value(0.5),
+            output_field=FloatField(),
+        )
+    )
+
+
+def _parse_decimal(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: "A valid number is required."})
+
+
+def filter_books(queryset, params):
+    """
+    Apply catalogue filters from query params:
+    - `cover`: HARD or SOFT.
+    - `min_daily_fee` / `max_daily_fee`: inclusive fee range.
+    - `in_stock`: `true` for books with copies left, `false` for sold out.
+    """
+    cover = params.get("cover")
+    if cover:
+        if cover.upper() not in Book.CoverType.values:
+            raise ValidationError({"cover": f"Must be one of {Book.CoverType.values}."})
+        queryset = queryset.filter(cover=cover.upper())
+
+    min_fee = _parse_decimal(params, "min_daily_fee")
+    if min_fee is not None:
+        queryset = queryset.filter(daily_fee__gte=min_fee)
+
+    max_fee = _parse_decimal(params, "max_daily_fee")
+    if max_fee is not None:
+        queryset = queryset.filter(daily_fee__lte=max_fee)
+
+    in_stock = params.get("in_stock")
+    if in_stock is not None:
+        if in_stock.lower() in ["true", "1"]:
+            queryset = queryset.filter(inventory__gt=0)
+        elif in_stock.lower() in ["false", "0"]:
+            queryset = queryset.filter(inventory=0)
+
+    return queryset
@@ -1,10 +1,30 @@
 from rest_framework import serializers
 
+from books.availability import MAX_AVAILABILITY_BOOKS
 from books.models import Book
+from config.fields import CommaSeparatedListField
+from config.sparse import SparseFieldsSerializerMixin
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Book
-        fields = ("title", "author", "cover", "inventory", "daily_fee")
+        fields = ("id", "title", "author", "cover", "inventory", "daily_fee")
+
+
+class BookAvailabilityRequestSerializer(serializers.Serializer):
+    ids = CommaSeparatedListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=MAX_AVAILABILITY_BOOKS,
+    )
+
+
+class BookAvailabilitySerializer(serializers.Serializer):
+    book = serializers.IntegerField()
+    inventory = serializers.IntegerField()
+    available = serializers.BooleanField()
+    holds_waiting = serializers.IntegerField()
+    next_return_date = serializers.DateField(allow_null=True)
+    available_from = serializers.DateField(allow_null=True)
@@ -0,0 +1,94 @@
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from books.cache import invalidate_book, invalidate_books
+from books.models import Book
+
+
+def reserve_copy(book_id):
+    """
+    Take one copy of a book out of inventory.
+
+    Issues a single conditional `UPDATE ... SET inventory = inventory - 1
+    WHERE inventory > 0`, so concurrent reservations can neither lose updates
+    nor drive inventory below zero. Returns False when the book is sold out.
+    Call inside the transaction that creates the borrowing.
+    """
+    updated = Book.objects.filter(pk=book_id, inventory__gt=0).update(
+        inventory=F("inventory") - 1, updated_at=timezone.now()
+    )
+    if updated:
+        invalidate_book(book_id)
+    return updated == 1
+
+
+def release_copy(book_id):
+    """Put one copy of a book back into inventory with a single UPDATE."""
+    Book.objects.filter(pk=book_id).update(
+        inventory=F("inventory") + 1, updated_at=timezone.now()
+    )
+    invalidate_book(book_id)
+
+
+def _lock_books(book_ids):
+    # Row locks taken in id order, so concurrent multi-book updates
+    # cannot deadlock on each other
+    return list(
+        Book.objects.select_for_update()
+        .filter(pk__in=book_ids)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def reserve_copies(book_ids):
+    """
+    Take one copy of each of several distinct books out of inventory.
+
+    All books are decremented by one `UPDATE ... WHERE id IN (...) AND
+    inventory > 0`. Returns False when any book is missing or sold out; the
+    caller must then roll back its transaction. Call inside a transaction.
+    """
+    book_ids = set(book_ids)
+    _lock_books(book_ids)
+    updated = Book.objects.filter(pk__in=book_ids, inventory__gt=0).update(
+        inventory=F("inventory") - 1, updated_at=timezone.now()
+    )
+    if updated:
+        for book_id in book_ids:
+            invalidate_book(book_id)
+    return updated == len(book_ids)
+
+
+def release_copies(book_ids):
+    """
+    Put one copy of each of several distinct books back with one UPDATE.
+    Call inside a transaction.
+    """
+    book_ids = set(book_ids)
+    _lock_books(book_ids)
+    Book.objects.filter(pk__in=book_ids).update(
+        inventory=F("inventory") + 1, updated_at=timezone.now()
+    )
+    for book_id in book_ids:
+        invalidate_book(book_id)
+
+
+def restock(counts):
+    """
+    Put copies back into inventory; `counts` maps book id to the number of
+    copies returned. A single `UPDATE ... SET inventory = inventory + CASE
+    id WHEN ... END` covers every book. Call inside a transaction.
+    """
+    if not counts:
+        return
+    _lock_books(counts)
+    Book.objects.filter(pk__in=counts).update(
+        inventory=F("inventory")
+        + Case(
+            *[When(pk=book_id, then=Value(count)) for book_id, count in counts.items()],
+            output_field=IntegerField(),
+        ),
+        updated_at=timezone.now(),
+    )
+    invalidate_books(counts)
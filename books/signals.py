@@ -0,0 +1,27 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from books.cache import invalidate_book
+from books.models import SEARCH_INDEX, Book
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_cache(sender, instance, **kwargs):
+    invalidate_book(instance.pk)
+
+
+@receiver(post_migrate)
+def create_search_index(sender, using, **kwargs):
+    """Create the full-text GIN index of the catalogue on PostgreSQL."""
+    connection = connections[using]
+    if sender.name != "books" or connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, Book._meta.db_table
+        )
+    if SEARCH_INDEX.name not in constraints:
+        with connection.schema_editor() as schema_editor:
+            schema_editor.add_index(Book, SEARCH_INDEX)
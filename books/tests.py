@@ -1,6 +1,24 @@
-from django.test import TestCase, RequestFactory
+import json
+import threading
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from books import cache as book_cache
+from books.cache import VERSION_KEY, get_stats
+from books.models import Book
+from books.services import release_copy, reserve_copy
+from borrowings.models import Borrowing, Hold
 from config.permissions import IsStaffUser
 
 User = get_user_model()
@@ -37,3 +55,518 @@ class IsStaffUserPermissionTest(TestCase):
         request = self.factory.get("/fake-url/")
         request.user = AnonymousUser()
         self.assertFalse(self.permission.has_permission(request, None))
+
+
+class InventoryServiceTest(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=1, daily_fee="1.00"
+        )
+
+    def test_reserve_copy_until_sold_out(self):
+        self.assertTrue(reserve_copy(self.book.id))
+        self.assertFalse(reserve_copy(self.book.id))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+    def test_release_copy(self):
+        release_copy(self.book.id)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 2)
+
+    def test_reserve_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            reserve_copy(self.book.id)
+
+
+class InventoryConcurrencyTest(TransactionTestCase):
+    """Hammer one book from many threads, each in its own DB connection."""
+
+    threads = 20
+    copies = 5
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="user@example.com", password="pass")
+        self.book = Book.objects.create(
+            title="Popular Book",
+            author="Test Author",
+            inventory=self.copies,
+            daily_fee="1.00",
+        )
+
+    def test_concurrent_reservations_never_oversell(self):
+        barrier = threading.Barrier(self.threads)
+        results = []
+
+        def borrow():
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    reserved = reserve_copy(self.book.id)
+                    if reserved:
+                        Borrowing.objects.create(
+                            book_id=self.book.id,
+                            user=self.user,
+                            expected_return_date=timezone.now().date()
+                            + timezone.timedelta(days=7),
+                        )
+                results.append(reserved)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=borrow) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.book.refresh_from_db()
+        self.assertEqual(results.count(True), self.copies)
+        self.assertEqual(results.count(False), self.threads - self.copies)
+        self.assertEqual(self.book.inventory, 0)
+        self.assertEqual(Borrowing.objects.filter(book=self.book).count(), self.copies)
+
+
+class BookCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff_user = User.objects.create_user(
+            email="staff@example.com", password="pass", is_staff=True
+        )
+        self.book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=2, daily_fee="1.00"
+        )
+        self.list_url = reverse("book:book-list")
+        self.detail_url = reverse("book:book-detail", kwargs={"pk": self.book.pk})
+
+    def test_list_is_served_from_cache(self):
+        first = self.client.get(self.list_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.list_url)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+        stats = get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_book_update_invalidates_list_and_detail(self):
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+
+        self.client.force_authenticate(user=self.staff_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(self.detail_url, {"title": "New Title"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=None)
+
+        self.assertEqual(self.client.get(self.detail_url).data["title"], "New Title")
+        titles = [
+            book["title"] for book in self.client.get(self.list_url).data["results"]
+        ]
+        self.assertEqual(titles, ["New Title"])
+
+    def test_inventory_change_invalidates_detail(self):
+        self.client.get(self.detail_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_copy(self.book.id)
+
+        self.assertEqual(self.client.get(self.detail_url).data["inventory"], 1)
+
+    def test_conditional_get_is_answered_from_cache(self):
+        first = self.client.get(self.detail_url)
+        etag = first["ETag"]
+        self.assertIn("Last-Modified", first)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_copy(self.book.id)
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_list_validators_change_when_a_book_is_deleted(self):
+        Book.objects.create(title="Other", author="A", inventory=1, daily_fee="1.00")
+        etag = self.client.get(self.list_url)["ETag"]
+        self.assertEqual(
+            self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.get(title="Other").delete()
+
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_lost_version_counter_does_not_revive_stale_pages(self):
+        self.client.get(self.list_url)
+        Book.objects.filter(pk=self.book.pk).update(title="New Title")
+        # The counter is evicted while the pages keyed by it survive
+        cache.delete(VERSION_KEY)
+
+        titles = [
+            book["title"] for book in self.client.get(self.list_url).data["results"]
+        ]
+        self.assertEqual(titles, ["New Title"])
+
+    def test_late_write_of_a_stale_detail_is_orphaned(self):
+        # A reader takes the key and reads the book before a change commits
+        key = book_cache.detail_key(self.book.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_copy(self.book.id)
+        # and writes its payload after the invalidation
+        book_cache.read_through(key, lambda: {"inventory": 2})
+
+        self.assertEqual(self.client.get(self.detail_url).data["inventory"], 1)
+
+    def test_cache_stats_requires_staff(self):
+        url = reverse("book:book-cache-stats")
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("hits", response.data)
+
+
+class BookSearchTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("book:book-list")
+        self.by_title = Book.objects.create(
+            title="Dune", author="Frank Herbert", inventory=2, daily_fee="1.00"
+        )
+        self.by_author = Book.objects.create(
+            title="Children of Time",
+            author="Adrian Dune",
+            cover=Book.CoverType.HARD,
+            inventory=0,
+            daily_fee="3.00",
+        )
+        self.other = Book.objects.create(
+            title="Hyperion", author="Dan Simmons", inventory=1, daily_fee="2.00"
+        )
+
+    def titles(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book["title"] for book in response.data["results"]]
+
+    def test_search_ranks_title_matches_first(self):
+        self.assertEqual(self.titles({"search": "dune"}), ["Dune", "Children of Time"])
+
+    @skipUnless(connection.vendor == "postgresql", "Stemming needs full-text search")
+    def test_search_matches_word_stems(self):
+        self.assertEqual(self.titles({"search": "times"}), ["Children of Time"])
+
+    @mock.patch("books.search.connection", mock.Mock(vendor="sqlite"))
+    def test_search_falls_back_to_substring_match(self):
+        self.assertEqual(self.titles({"search": "dune"}), ["Dune", "Children of Time"])
+        self.assertEqual(self.titles({"search": "simm"}), ["Hyperion"])
+
+    def test_filters(self):
+        self.assertEqual(self.titles({"cover": "hard"}), ["Children of Time"])
+        self.assertEqual(self.titles({"in_stock": "true"}), ["Dune", "Hyperion"])
+        self.assertEqual(
+            self.titles({"min_daily_fee": "1.50", "max_daily_fee": "2.50"}),
+            ["Hyperion"],
+        )
+
+    def test_search_and_filters_compose_with_pagination(self):
+        response = self.client.get(self.url, {"search": "dune", "page_size": 1})
+        self.assertEqual([book["title"] for book in response.data["results"]], ["Dune"])
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [book["title"] for book in response.data["results"]],
+            ["Children of Time"],
+        )
+        self.assertIsNone(response.data["next"])
+
+        self.assertEqual(self.titles({"search": "dune", "in_stock": "true"}), ["Dune"])
+
+    def test_invalid_filter_values(self):
+        response = self.client.get(self.url, {"cover": "leather"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {"min_daily_fee": "cheap"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BookSparseFieldsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("book:book-list")
+        for title in ("Dune", "Hyperion"):
+            Book.objects.create(
+                title=title, author="Author", inventory=2, daily_fee="1.00"
+            )
+
+    def test_fields_restrict_output_and_selected_columns(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, {"fields": "id,title,inventory"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(response.data["results"][0]), ["id", "title", "inventory"]
+        )
+        sql = context.captured_queries[-1]["sql"]
+        self.assertIn('"books_book"."inventory"', sql)
+        self.assertNotIn('"books_book"."author"', sql)
+
+    def test_omit_and_compact(self):
+        response = self.client.get(
+            self.url, {"omit": "author,cover,daily_fee", "compact": "true"}
+        )
+
+        self.assertEqual(response.data["columns"], ["id", "title", "inventory"])
+        self.assertEqual(
+            [row[1:] for row in response.data["rows"]],
+            [["Dune", 2], ["Hyperion", 2]],
+        )
+        self.assertNotIn("results", response.data)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(self.url, {"fields": "id,isbn"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("fields", response.data)
+
+
+class BookAvailabilityTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="reader@example.com", password="pass"
+        )
+        self.today = timezone.now().date()
+        self.sold_out = Book.objects.create(
+            title="Dune", author="Author", inventory=0, daily_fee="1.00"
+        )
+        self.in_stock = Book.objects.create(
+            title="Hyperion", author="Author", inventory=1, daily_fee="1.00"
+        )
+        self.never_out = Book.objects.create(
+            title="Solaris", author="Author", inventory=0, daily_fee="1.00"
+        )
+        for days, status_ in (
+            (5, Borrowing.BorrowingStatus.BORROWED),
+            (3, Borrowing.BorrowingStatus.WAITING_PAYMENT),
+            # Copies back on the shelf or never taken do not count
+            (1, Borrowing.BorrowingStatus.RETURNED),
+            (1, Borrowing.BorrowingStatus.CANCELED),
+        ):
+            self.borrow(self.sold_out, days, status_)
+
+    def borrow(self, book, days, status_=Borrowing.BorrowingStatus.BORROWED):
+        return Borrowing.objects.create(
+            book=book,
+            user=self.user,
+            expected_return_date=self.today + timezone.timedelta(days=days),
+            status=status_,
+        )
+
+    def test_next_return_of_a_sold_out_book(self):
+        response = self.client.get(
+            reverse("book:book-availability", args=[self.sold_out.id])
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = (self.today + timezone.timedelta(days=3)).isoformat()
+        self.assertEqual(response.data["next_return_date"], expected)
+        self.assertEqual(response.data["available_from"], expected)
+        self.assertFalse(response.data["available"])
+
+    def test_overdue_copy_is_expected_from_today(self):
+        self.borrow(self.sold_out, -2)
+
+        response = self.client.get(
+            reverse("book:book-availability", args=[self.sold_out.id])
+        )
+
+        self.assertEqual(response.data["available_from"], self.today.isoformat())
+
+    def test_batch_in_one_query(self):
+        ids = [self.never_out.id, self.in_stock.id, 999999, self.sold_out.id]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("book:book-availability-batch"),
+                {"ids": ",".join(map(str, ids))},
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item["book"], item["available_from"]) for item in response.data],
+            [
+                (self.never_out.id, None),
+                (self.in_stock.id, self.today.isoformat()),
+                (
+                    self.sold_out.id,
+                    (self.today + timezone.timedelta(days=3)).isoformat(),
+                ),
+            ],
+        )
+
+    def test_waiting_holds_get_the_next_copies_first(self):
+        Hold.objects.create(book=self.sold_out, user=self.user, days=7)
+
+        response = self.client.get(
+            reverse("book:book-availability", args=[self.sold_out.id])
+        )
+
+        self.assertEqual(response.data["holds_waiting"], 1)
+        self.assertEqual(
+            response.data["next_return_date"],
+            (self.today + timezone.timedelta(days=3)).isoformat(),
+        )
+        self.assertEqual(
+            response.data["available_from"],
+            (self.today + timezone.timedelta(days=5)).isoformat(),
+        )
+
+        # More patrons queued than copies out
+        Hold.objects.create(
+            book=self.sold_out,
+            user=get_user_model().objects.create_user(email="other@example.com"),
+            days=7,
+        )
+        response = self.client.get(
+            reverse("book:book-availability", args=[self.sold_out.id])
+        )
+        self.assertIsNone(response.data["available_from"])
+
+    def test_unknown_book_and_invalid_ids(self):
+        response = self.client.get(reverse("book:book-availability", args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(
+            reverse("book:book-availability-batch"), {"ids": "1,x"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BookTransferTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff_user = User.objects.create(email="staff@example.com", is_staff=True)
+        self.book = Book.objects.create(
+            title="Old Title", author="Author", inventory=1, daily_fee="1.00"
+        )
+        self.import_url = reverse("book:book-import-books")
+        self.export_url = reverse("book:book-export")
+        self.client.force_authenticate(user=self.staff_user)
+
+    def upload(self, name, content):
+        return self.client.post(
+            self.import_url,
+            {"file": SimpleUploadedFile(name, content.encode("utf-8"))},
+            format="multipart",
+        )
+
+    def test_csv_import_upserts_and_reports_row_errors(self):
+        content = (
+            "id,title,author,cover,inventory,daily_fee\n"
+            f"{self.book.id},New Title,Author,HARD,5,2.50\n"
+            ",Fresh Book,Someone,SOFT,3,1.00\n"
+            ",Broken Book,Someone,SOFT,-1,1.00\n"
+            "99999,Ghost,Nobody,SOFT,1,1.00\n"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload("books.csv", content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(response.data["failed"], 2)
+        self.assertEqual([e["line"] for e in response.data["errors"]], [4, 5])
+        self.assertIn("inventory", response.data["errors"][0]["errors"])
+
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.title, self.book.inventory), ("New Title", 5))
+        self.assertTrue(Book.objects.filter(title="Fresh Book").exists())
+
+    def test_csv_import_with_byte_order_mark(self):
+        content = (
+            "\ufeffid,title,author,cover,inventory,daily_fee\n"
+            f"{self.book.id},New Title,Author,HARD,5,2.50\n"
+        )
+        response = self.upload("books.csv", content)
+
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(response.data["failed"], 0)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "New Title")
+
+    def test_unreadable_upload_is_a_bad_request(self):
+        content = (
+            "id,title,author,cover,inventory,daily_fee\n"
+            f"{self.book.id},New Title,Author,HARD,5,2.50\n"
+            ",Café,Someone,SOFT,3,1.00\n"
+        ).encode("latin-1")
+        response = self.client.post(
+            self.import_url,
+            {"file": SimpleUploadedFile("books.csv", content)},
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["file_error"]["line"], 3)
+        self.assertIn("UTF-8", response.data["file_error"]["error"])
+        # Lines before the unreadable one are imported
+        self.assertEqual(response.data["updated"], 1)
+
+        # Over the csv module's field size limit
+        response = self.upload("books.csv", f"title,author\n{'a' * 200000},A\n")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Invalid CSV", response.data["file_error"]["error"])
+
+    def test_ndjson_import_in_batches(self):
+        lines = [
+            f'{{"title": "Book {i}", "author": "A", "inventory": 1, "daily_fee": "1.00"}}'
+            for i in range(5)
+        ]
+        content = "\n".join(lines + ["not json"]) + "\n"
+        with self.settings(BOOK_TRANSFER_BATCH_SIZE=2):
+            response = self.upload("books.ndjson", content)
+
+        self.assertEqual(response.data["created"], 5)
+        self.assertEqual(response.data["errors"][0]["line"], 6)
+        self.assertEqual(Book.objects.count(), 6)
+
+    def test_export_streams_catalogue_and_round_trips(self):
+        response = self.client.get(self.export_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode("utf-8")
+        self.assertEqual(
+            content.splitlines(),
+            [
+                "id,title,author,cover,inventory,daily_fee",
+                f"{self.book.id},Old Title,Author,SOFT,1,1.00",
+            ],
+        )
+
+        response = self.upload("books.csv", content)
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(Book.objects.count(), 1)
+
+    def test_export_ndjson(self):
+        response = self.client.get(self.export_url, {"file_format": "ndjson"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        row = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(row["title"], "Old Title")
+
+    def test_staff_only(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(
+            self.client.get(self.export_url).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+        self.assertEqual(
+            self.upload("books.csv", "title\n").status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
@@ -0,0 +1,126 @@
+"""
+Bulk import and export of the book catalogue.
+
+Imports validate rows with `BookSerializer` one batch at a time and upsert
+each batch with a single `INSERT ... ON CONFLICT (id) DO UPDATE`: rows with
+an `id` update that book, rows without one create a new book. Exports
+stream the catalogue through a server-side cursor. Copies an import adds
+to a sold-out book go to its waiting holds first.
+"""
+
+from django.conf import settings
+from django.db import transaction
+
+from books.cache import invalidate_books
+from books.models import Book
+from books.serializers import BookSerializer
+from borrowings.holds import allocate_restocked_holds
+from config.streaming import UploadError, batched
+
+EXPORT_FIELDS = BookSerializer.Meta.fields
+# Columns an upsert overwrites on conflict
+UPSERT_FIELDS = [name for name in EXPORT_FIELDS if name != "id"] + ["updated_at"]
+MAX_REPORTED_ERRORS = 100
+
+
+def export_rows(queryset):
+    return (
+        queryset.order_by("id")
+        .values_list(*EXPORT_FIELDS)
+        .iterator(chunk_size=settings.BOOK_TRANSFER_BATCH_SIZE)
+    )
+
+
+def _parse_id(value):
+    if value in (None, ""):
+        return None
+    try:
+        book_id = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("A valid integer is required.")
+    if book_id < 1:
+        raise ValueError("A valid integer is required.")
+    return book_id
+
+
+def import_books(records, batch_size=None):
+    """
+    Upsert books from `(line_number, row, error)` records (see
+    `config.streaming.read_upload`).
+
+    Invalid rows are skipped and reported; valid rows of the same batch are
+    still saved. Returns counts and up to MAX_REPORTED_ERRORS row errors. A
+    file that cannot be read to the end is imported up to the unreadable
+    line, which is reported as `file_error`.
+    """
+    batch_size = batch_size or settings.BOOK_TRANSFER_BATCH_SIZE
+    report = {
+        "created": 0,
+        "updated": 0,
+        "failed": 0,
+        "errors": [],
+        "file_error": None,
+    }
+
+    def reject(line, errors):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line, "errors": errors})
+
+    def readable(records):
+        try:
+            yield from records
+        except UploadError as e:
+            report["file_error"] = {"line": e.line, "error": str(e)}
+
+    for batch in batched(readable(records), batch_size):
+        rows = []
+        for line, row, error in batch:
+            if error:
+                reject(line, {"non_field_errors": [error]})
+                continue
+            try:
+                book_id = _parse_id(row.get("id"))
+            except ValueError as e:
+                reject(line, {"id": [str(e)]})
+                continue
+            rows.append((line, book_id, row))
+
+        # Rows that name an id must update an existing book
+        ids = {book_id for _, book_id, _ in rows if book_id}
+        existing = set(Book.objects.filter(pk__in=ids).values_list("pk", flat=True))
+
+        books = []
+        seen = set()
+        for line, book_id, row in rows:
+            serializer = BookSerializer(data=row)
+            if not serializer.is_valid():
+                reject(line, serializer.errors)
+            elif book_id and book_id not in existing:
+                reject(line, {"id": [f"Book {book_id} does not exist."]})
+            elif book_id in seen:
+                # One upsert statement cannot update a row twice
+                reject(line, {"id": [f"Book {book_id} appears twice in a batch."]})
+            else:
+                if book_id:
+                    seen.add(book_id)
+                books.append(Book(pk=book_id, **serializer.validated_data))
+
+        if not books:
+            continue
+
+        with transaction.atomic():
+            Book.objects.bulk_create(
+                books,
+                update_conflicts=True,
+                unique_fields=["id"],
+                update_fields=UPSERT_FIELDS,
+            )
+            updated_ids = [book.pk for book in books if book.pk in existing]
+            invalidate_books(updated_ids)
+            allocate_restocked_holds(updated_ids)
+
+        report["updated"] += len(updated_ids)
+        report["created"] += len(books) - len(updated_ids)
+
+    return report
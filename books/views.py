@@ -1,10 +1,28 @@
-from rest_framework import viewsets
+from django.db import transaction
+from django.http import Http404
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import SAFE_METHODS, AllowAny
+from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 
+from books import cache as book_cache
+from books.availability import get_availability
+from books import transfer
 from books.models import Book
+from books.search import filter_books, search_books
+from config.conditional import get_validators, not_modified, set_validators
 from config.permissions import IsStaffUser
-from books.serializers import BookSerializer
+from config.sparse import SparseFieldsViewMixin
+from borrowings.holds import allocate_restocked_holds
+from books.serializers import (
+    BookAvailabilityRequestSerializer,
+    BookAvailabilitySerializer,
+    BookSerializer,
+)
+from config.streaming import get_file_format, read_upload, streaming_export
 
 
 @extend_schema(
@@ -23,10 +41,55 @@ from books.serializers import BookSerializer
         ),
         OpenApiParameter(
             name="search",
-            description="Search books by title or author (query parameter).",
+            description=(
+                "Full-text search over title and author; "
+                "results are ordered by relevance."
+            ),
+            required=False,
+            type=str,
+        ),
+        OpenApiParameter(
+            name="cover",
+            description="Filter by cover type (HARD or SOFT).",
+            required=False,
+            type=str,
+        ),
+        OpenApiParameter(
+            name="min_daily_fee",
+            description="Only books with a daily fee of at least this amount.",
+            required=False,
+            type=float,
+        ),
+        OpenApiParameter(
+            name="max_daily_fee",
+            description="Only books with a daily fee of at most this amount.",
+            required=False,
+            type=float,
+        ),
+        OpenApiParameter(
+            name="in_stock",
+            description="true: only books with copies available; false: sold out.",
+            required=False,
+            type=bool,
+        ),
+        OpenApiParameter(
+            name="fields",
+            description="Comma-separated fields to return, e.g. id,title,inventory.",
             required=False,
             type=str,
         ),
+        OpenApiParameter(
+            name="omit",
+            description="Comma-separated fields to leave out.",
+            required=False,
+            type=str,
+        ),
+        OpenApiParameter(
+            name="compact",
+            description="true: return the page as `columns` and `rows` of values.",
+            required=False,
+            type=bool,
+        ),
     ],
     responses={
         200: BookSerializer(many=True),
@@ -36,19 +99,202 @@ from books.serializers import BookSerializer
         404: "Not Found",
     },
 )
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for handling Books.
 
     Permissions:
     - SAFE_METHODS: AllowAny (read-only access for everyone)
     - Other methods: IsStaffUser (restricted to staff)
+
+    Filtering:
+    - `search`: full-text search over title and author, ranked by relevance.
+    - `cover`, `min_daily_fee`, `max_daily_fee`, `in_stock` filters.
+
+    Pagination:
+    - List is cursor-paginated in catalogue (`id`) order, or by relevance
+      when searching.
+
+    Sparse fieldsets:
+    - `fields` / `omit` select the returned fields (and loaded columns) of
+      list items, e.g. `fields=id,title,inventory` for the catalogue grid;
+      `compact=true` returns a columnar page.
+
+    Caching:
+    - List pages and single books are served from a read-through cache that
+      is invalidated whenever a book or its inventory changes.
+    - Responses carry ETag and Last-Modified validators; a conditional GET
+      of an unchanged page or book gets `304 Not Modified`.
+    - `cache_stats` action (staff only) reports cache hits and misses.
+
+    Availability:
+    - `availability` (per book) and `availability-batch` (`ids` query
+      param) report when the next copy of a sold-out book is expected
+      back, from an index over the expected return dates of copies out.
+
+    Holds:
+    - Copies an update or import adds to a book go to its waiting holds
+      (oldest first) before they reach the shelf.
+
+    Bulk transfer (staff only):
+    - `import`: upserts books from an uploaded CSV or NDJSON `file` in
+      batches and reports per-line errors.
+    - `export`: streams the (filtered) catalogue as CSV or NDJSON
+      (`file_format` query param); the output can be imported back.
     """
 
     queryset = Book.objects.all()
     serializer_class = BookSerializer
 
+    @property
+    def cursor_ordering(self):
+        if self.request.query_params.get("search"):
+            return ("-rank", "id")
+        return "id"
+
+    def get_queryset(self):
+        queryset = Book.objects.all()
+        if self.action not in ("list", "export"):
+            return queryset
+
+        queryset = self.select_sparse(filter_books(queryset, self.request.query_params))
+        terms = self.request.query_params.get("search")
+        if terms:
+            queryset = search_books(queryset, terms)
+        return queryset
+
     def get_permissions(self):
-        if self.action in SAFE_METHODS:
+        if self.request.method in SAFE_METHODS and self.action not in (
+            "cache_stats",
+            "export",
+        ):
             return [AllowAny()]
         return [IsStaffUser()]
+
+    def cached_conditional_get(self, key, queryset, build):
+        """
+        Serve a read-through cached payload with its ETag/Last-Modified.
+
+        The validators are computed (one aggregate query) when the cache is
+        filled and stored with the payload, so a 304 costs no queries.
+        """
+
+        def fill():
+            etag, last_modified = get_validators(self.request, queryset)
+            return {"etag": etag, "last_modified": last_modified, "data": build()}
+
+        entry = book_cache.read_through(key, fill)
+        response = not_modified(
+            self.request, entry["etag"], entry["last_modified"]
+        ) or Response(entry["data"])
+        return set_validators(response, entry["etag"], entry["last_modified"])
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_conditional_get(
+            book_cache.list_key(request),
+            self.filter_queryset(self.get_queryset()),
+            lambda: super(BookViewSet, self).list(request, *args, **kwargs).data,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        book_id = kwargs[self.lookup_field]
+        try:
+            queryset = Book.objects.filter(pk=book_id)
+        except (TypeError, ValueError):
+            raise Http404
+        return self.cached_conditional_get(
+            book_cache.detail_key(book_id),
+            queryset,
+            lambda: super(BookViewSet, self).retrieve(request, *args, **kwargs).data,
+        )
+
+    def perform_update(self, serializer):
+        # Copies added to a sold-out book go to its queue first
+        with transaction.atomic():
+            book = serializer.save()
+            allocate_restocked_holds([book.pk])
+
+    @extend_schema(responses={200: BookAvailabilitySerializer})
+    @action(detail=True, methods=["get"])
+    def availability(self, request, pk=None):
+        try:
+            availability = get_availability([int(pk)])
+        except ValueError:
+            raise Http404
+        if not availability:
+            raise Http404
+        return Response(BookAvailabilitySerializer(availability[0]).data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="ids",
+                description="Comma-separated book ids.",
+                required=True,
+                type=str,
+            )
+        ],
+        responses={200: BookAvailabilitySerializer(many=True)},
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="availability",
+        url_name="availability-batch",
+    )
+    def availability_batch(self, request):
+        params = BookAvailabilityRequestSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        availability = get_availability(params.validated_data["ids"])
+        return Response(BookAvailabilitySerializer(availability, many=True).data)
+
+    @action(detail=False, methods=["get"], url_path="cache-stats")
+    def cache_stats(self, request):
+        return Response(book_cache.get_stats())
+
+    @extend_schema(
+        summary="Import books from CSV or NDJSON",
+        request={
+            "multipart/form-data": {
+                "type": "object",
+                "properties": {"file": {"type": "string", "format": "binary"}},
+            }
+        },
+        responses={200: dict, 400: dict},
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[MultiPartParser],
+    )
+    def import_books(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "A CSV or NDJSON file is required."})
+        report = transfer.import_books(read_upload(upload))
+        if report["file_error"]:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+    @extend_schema(
+        summary="Export books as CSV or NDJSON",
+        parameters=[
+            OpenApiParameter(
+                name="file_format",
+                description="csv (default) or ndjson.",
+                required=False,
+                type=str,
+            ),
+        ],
+        responses={200: str},
+    )
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        file_format = get_file_format(request)
+        return streaming_export(
+            transfer.export_rows(self.get_queryset()),
+            transfer.EXPORT_FIELDS,
+            file_format,
+            "books",
+        )
@@ -1,6 +1,27 @@
 from django.contrib import admin
 
-from borrowings.models import Borrowing
+from borrowings.models import Borrowing, Hold
 
 
-admin.site.register(Borrowing)
+@admin.register(Borrowing)
+class BorrowingAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "book",
+        "user",
+        "status",
+        "borrow_date",
+        "expected_return_date",
+        "actual_return_date",
+    )
+    list_filter = ("status",)
+    list_select_related = ("book", "user")
+    raw_id_fields = ("book", "user")
+
+
+@admin.register(Hold)
+class HoldAdmin(admin.ModelAdmin):
+    list_display = ("id", "book", "user", "status", "created_at", "allocated_at")
+    list_filter = ("status",)
+    list_select_related = ("book", "user")
+    raw_id_fields = ("book", "user", "borrowing")
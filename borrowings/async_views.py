@@ -0,0 +1,72 @@
+"""
+Coroutine versions of the borrow and return endpoints, for ASGI servers.
+
+The Stripe call is awaited on the event loop, so one process holds many
+in-flight checkouts; database work goes through the async ORM or runs in
+the request's sync thread. Responses match `BorrowingViewSet`.
+"""
+
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import NotFound
+
+from borrowings.models import Borrowing
+from borrowings.serializers import BorrowingSerializer
+from borrowings.services import open_borrowing, return_borrowing
+from borrowings.views import checkout_status_url
+from config.async_api import async_api_view, json_response, parse_json
+from payments.services import astart_stripe_payment
+
+
+@async_api_view(["POST"])
+async def borrow(request):
+    """Async `BorrowingViewSet.create`."""
+    serializer = BorrowingSerializer(data=parse_json(request))
+    await sync_to_async(serializer.is_valid)(raise_exception=True)
+
+    borrowing, amount = await sync_to_async(open_borrowing)(
+        request.user,
+        serializer.validated_data["book"],
+        serializer.validated_data["expected_return_date"],
+    )
+    payment = await astart_stripe_payment(
+        borrowing, payment_type="PAYMENT", amount_usd=amount
+    )
+
+    return json_response(
+        {
+            "checkout_url": payment.session_url,
+            "checkout_status_url": checkout_status_url(request, payment),
+            "borrowing": BorrowingSerializer(borrowing).data,
+        },
+        status=201,
+    )
+
+
+@async_api_view(["POST"])
+async def return_book(request, pk):
+    """Async `BorrowingViewSet.return_book`."""
+    queryset = Borrowing.objects.select_related("book")
+    if not request.user.is_staff:
+        queryset = queryset.filter(user=request.user)
+    try:
+        borrowing = await queryset.aget(pk=pk)
+    except Borrowing.DoesNotExist:
+        raise NotFound()
+
+    fine_amount = await sync_to_async(return_borrowing)(borrowing)
+
+    if fine_amount > Decimal("0.00"):
+        fine_payment = await astart_stripe_payment(
+            borrowing, payment_type="FINE", amount_usd=fine_amount
+        )
+        return json_response(
+            {
+                "borrowing": BorrowingSerializer(borrowing).data,
+                "fine_payment_url": fine_payment.session_url,
+                "fine_payment_status_url": checkout_status_url(request, fine_payment),
+                "fine_amount": fine_amount,
+            }
+        )
+    return json_response(BorrowingSerializer(borrowing).data)
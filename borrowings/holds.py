@@ -0,0 +1,135 @@
+"""
+FIFO hold queue for sold-out books.
+
+Patrons queue for a book instead of polling the borrow endpoint. Every
+code path that adds copies (a return, a canceled or expired payment, a
+staff edit or import that raises the inventory) calls `allocate_holds` in
+the same transaction, so a new copy goes straight to the oldest waiting
+hold and never shows up on the shelf while someone is queued:
+
+- The head of the queue is picked with `SELECT ... FOR UPDATE SKIP
+  LOCKED`, so a hold its patron is canceling right now is passed over
+  instead of blocking the release.
+- The copy is taken with the usual conditional inventory update and the
+  holder gets a WAITING_PAYMENT borrowing. Its checkout session is
+  created by the Celery task once the transaction commits, and an unpaid
+  allocation expires like any other unpaid borrowing, handing the copy
+  to the next hold.
+- The patron's notice is recorded on the hold, where they see it in
+  their hold list, and the staff chat gets a Telegram notification.
+"""
+
+import logging
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from books.services import reserve_copy
+from borrowings.models import Borrowing, Hold
+from config.notifications.tasks import send_telegram_hold_notification
+from payments.models import Payment
+from payments.services import calculate_borrowing_fee, request_stripe_payment_session
+
+logger = logging.getLogger(__name__)
+
+
+def waiting_holds(book_id):
+    """Waiting holds of a book, oldest first (hold_queue_idx)."""
+    return Hold.objects.filter(book_id=book_id, status=Hold.HoldStatus.WAITING)
+
+
+def place_hold(user, book, days):
+    """
+    Queue `user` for `book`, whose copies are all out.
+
+    A copy released while the hold was being placed is allocated at once.
+    """
+    try:
+        with transaction.atomic():
+            hold = Hold.objects.create(book=book, user=user, days=days)
+            allocate_holds([book.id])
+    except IntegrityError:
+        raise ValidationError("You are already waiting for this book.")
+    return hold
+
+
+def cancel_hold(hold):
+    canceled = Hold.objects.filter(pk=hold.pk, status=Hold.HoldStatus.WAITING).update(
+        status=Hold.HoldStatus.CANCELED
+    )
+    if not canceled:
+        raise ValidationError("Only waiting holds can be canceled.")
+
+
+def allocate_holds(book_ids):
+    """
+    Give copies on the shelf to the oldest waiting holds of their books.
+
+    Call inside the transaction that released the copies. Returns the
+    allocated holds.
+    """
+    allocated = []
+    for book_id in sorted(set(book_ids)):
+        while True:
+            hold = (
+                waiting_holds(book_id)
+                .select_for_update(skip_locked=True)
+                .select_related("book", "user")
+                .order_by("id")
+                .first()
+            )
+            if hold is None or not reserve_copy(book_id):
+                break
+            allocate_hold(hold)
+            allocated.append(hold)
+    return allocated
+
+
+def allocate_restocked_holds(book_ids):
+    """
+    Give copies staff added to books to their waiting holds.
+
+    One query narrows `book_ids` down to the books someone is queued for.
+    Call inside the transaction that raised the inventory.
+    """
+    queued = (
+        Hold.objects.filter(book_id__in=book_ids, status=Hold.HoldStatus.WAITING)
+        .values_list("book_id", flat=True)
+        .distinct()
+    )
+    return allocate_holds(list(queued))
+
+
+def allocate_hold(hold):
+    """Turn a hold into a WAITING_PAYMENT borrowing; its copy is reserved."""
+    today = timezone.now().date()
+    borrowing = Borrowing.objects.create(
+        book=hold.book,
+        user=hold.user,
+        expected_return_date=today + timezone.timedelta(days=hold.days),
+        status=Borrowing.BorrowingStatus.WAITING_PAYMENT,
+    )
+    payment = request_stripe_payment_session(
+        borrowing,
+        payment_type=Payment.TypeType.PAYMENT,
+        amount_usd=calculate_borrowing_fee(borrowing),
+    )
+
+    hold.status = Hold.HoldStatus.ALLOCATED
+    hold.borrowing = borrowing
+    hold.allocated_at = timezone.now()
+    hold.notice = (
+        f"A copy of {hold.book.title} is reserved for you. Pay for borrowing "
+        f"{borrowing.id} to collect it."
+    )
+    hold.save(update_fields=["status", "borrowing", "allocated_at", "notice"])
+    logger.info(f"Hold id={hold.id} allocated borrowing id={borrowing.id}.")
+
+    notification = {
+        "user": hold.user.email,
+        "book": hold.book.title,
+        "borrowing_id": borrowing.id,
+        "payment_id": payment.id,
+    }
+    transaction.on_commit(lambda: send_telegram_hold_notification(notification))
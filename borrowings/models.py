@@ -25,6 +25,103 @@ class Borrowing(models.Model):
         choices=BorrowingStatus.choices,
         default=BorrowingStatus.WAITING_PAYMENT,
     )
+    # Fine accrued so far by an overdue borrowing, refreshed by the overdue sweep
+    accrued_fine = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    fine_calculated_at = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set on save; queryset updates set it explicitly
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # A user's active borrowings, newest first (list with is_active=true)
+            models.Index(
+                fields=["user", "-id"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_user_active_idx",
+            ),
+            # Conditional GET validators of a user's borrowings
+            models.Index(
+                fields=["user", "updated_at"], name="borrowing_user_updated_idx"
+            ),
+            # Overdue scans: borrowed books past their expected return date
+            models.Index(
+                fields=["expected_return_date"],
+                condition=models.Q(status="BORROWED"),
+                name="borrowing_overdue_idx",
+            ),
+            # Availability forecast: earliest expected return of a book's
+            # copies that are out
+            models.Index(
+                fields=["book", "expected_return_date"],
+                condition=models.Q(status__in=["BORROWED", "WAITING_PAYMENT"]),
+                name="borrowing_book_return_idx",
+            ),
+            # Expiry scans: unpaid borrowings, oldest first
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(status="WAITING_PAYMENT"),
+                name="borrowing_waiting_payment_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Borrowing: {self.book.title} by {self.user.email}"
+
+
+class Hold(models.Model):
+    """
+    A patron's place in the queue for a sold-out book.
+
+    Holds are served oldest first: when a copy comes back, the next
+    waiting hold is given a WAITING_PAYMENT borrowing for `days` days.
+    """
+
+    class HoldStatus(models.TextChoices):
+        WAITING = "WAITING", "Waiting"
+        ALLOCATED = "ALLOCATED", "Allocated"
+        CANCELED = "CANCELED", "Canceled"
+
+    book = models.ForeignKey(
+        "books.Book", on_delete=models.CASCADE, related_name="holds"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="holds"
+    )
+    days = models.PositiveSmallIntegerField()
+    status = models.CharField(
+        max_length=10,
+        choices=HoldStatus.choices,
+        default=HoldStatus.WAITING,
+    )
+    borrowing = models.OneToOneField(
+        Borrowing,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="hold",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    allocated_at = models.DateTimeField(null=True, blank=True)
+    # What the patron is told once a copy is allocated
+    notice = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "user"],
+                condition=models.Q(status="WAITING"),
+                name="unique_waiting_hold",
+            ),
+        ]
+        indexes = [
+            # Queue of a book, oldest first
+            models.Index(
+                fields=["book", "id"],
+                condition=models.Q(status="WAITING"),
+                name="hold_queue_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Hold({self.id}) - Book: {self.book_id} | {self.status}"
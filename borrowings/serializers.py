@@ -2,10 +2,23 @@ from django.utils import timezone
 from rest_framework import serializers
 
 from books.models import Book
-from borrowings.models import Borrowing
+from books.serializers import BookSerializer
+from borrowings.models import Borrowing, Hold
+from config.expand import ExpandableSerializerMixin
+from config.sparse import SparseFieldsSerializerMixin
+from users.serializers import UserSerializer
 
+# Upper bound on books checked out in one cart
+MAX_CART_ITEMS = 10
+# Longest borrowing a hold can ask for
+MAX_HOLD_DAYS = 90
+
+
+class BorrowingSerializer(
+    SparseFieldsSerializerMixin, ExpandableSerializerMixin, serializers.ModelSerializer
+):
+    expandable_fields = {"book": BookSerializer, "user": UserSerializer}
 
-class BorrowingSerializer(serializers.ModelSerializer):
     book = serializers.PrimaryKeyRelatedField(queryset=Book.objects.all())
     user = serializers.PrimaryKeyRelatedField(read_only=True)
 
@@ -19,8 +32,16 @@ class BorrowingSerializer(serializers.ModelSerializer):
             "expected_return_date",
             "actual_return_date",
             "status",
+            "accrued_fine",
+        )
+        read_only_fields = (
+            "id",
+            "borrow_date",
+            "user",
+            "status",
+            "actual_return_date",
+            "accrued_fine",
         )
-        read_only_fields = ("id", "borrow_date", "user", "status", "actual_return_date")
 
     def validate(self, data):
         expected_return_date = data.get("expected_return_date")
@@ -50,3 +71,72 @@ class BorrowingSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         return super().update(instance, validated_data)
+
+
+class BorrowingCartItemSerializer(serializers.Serializer):
+    book = serializers.IntegerField(min_value=1)
+    expected_return_date = serializers.DateField()
+
+
+class BorrowingCartSerializer(serializers.Serializer):
+    """A list of books to borrow and pay for in one checkout."""
+
+    items = BorrowingCartItemSerializer(
+        many=True, allow_empty=False, max_length=MAX_CART_ITEMS
+    )
+
+    def validate_items(self, items):
+        borrow_date = timezone.now().date()
+        if any(item["expected_return_date"] < borrow_date for item in items):
+            raise serializers.ValidationError(
+                "Expected return date cannot be before borrow date"
+            )
+
+        book_ids = [item["book"] for item in items]
+        if len(set(book_ids)) != len(book_ids):
+            raise serializers.ValidationError("Each book can be borrowed only once.")
+
+        # One query for the whole cart
+        books = Book.objects.in_bulk(book_ids)
+        missing = [book_id for book_id in book_ids if book_id not in books]
+        if missing:
+            raise serializers.ValidationError(f"Books not found: {missing}")
+        for item in items:
+            item["book"] = books[item["book"]]
+        return items
+
+
+class HoldSerializer(serializers.ModelSerializer):
+    """A place in a book's queue; `position` is 1 for the next holder."""
+
+    book = serializers.PrimaryKeyRelatedField(queryset=Book.objects.all())
+    days = serializers.IntegerField(min_value=1, max_value=MAX_HOLD_DAYS)
+    position = serializers.IntegerField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Hold
+        fields = (
+            "id",
+            "book",
+            "days",
+            "status",
+            "position",
+            "borrowing",
+            "created_at",
+            "allocated_at",
+            "notice",
+        )
+        read_only_fields = (
+            "id",
+            "status",
+            "position",
+            "borrowing",
+            "created_at",
+            "allocated_at",
+            "notice",
+        )
+
+    def validate_book(self, book):
+        if book.inventory > 0:
+            raise serializers.ValidationError("Book is available, borrow it instead.")
+        return book
@@ -0,0 +1,216 @@
+import logging
+from collections import Counter as Tally
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from books.models import Book
+from books.services import release_copy, reserve_copy, restock
+from borrowings.holds import allocate_holds
+from borrowings.models import Borrowing
+from payments.models import Payment
+from payments.services import calculate_borrowing_fee, calculate_fine, fine_expression
+
+logger = logging.getLogger(__name__)
+
+# Extra wait past checkout expiry for a late webhook to be applied first
+PAYMENT_EXPIRY_GRACE = timedelta(minutes=10)
+
+
+def overdue_borrowings(on_date):
+    """Borrowed books past their expected return date (borrowing_overdue_idx)."""
+    return Borrowing.objects.filter(
+        status=Borrowing.BorrowingStatus.BORROWED,
+        expected_return_date__lt=on_date,
+    )
+
+
+def sweep_overdue_borrowings(on_date=None, chunk_size=None):
+    """
+    Store the fine accrued by every overdue borrowing as of `on_date`.
+
+    Walks overdue borrowings in id-ordered chunks and updates each chunk
+    with a single UPDATE that computes the fines in the database, so no
+    rows are loaded into Python and row locks are held only per chunk.
+    Returns a summary for notifications.
+    """
+    on_date = on_date or timezone.now().date()
+    chunk_size = chunk_size or settings.OVERDUE_SWEEP_CHUNK_SIZE
+    overdue = overdue_borrowings(on_date)
+    daily_fee = Subquery(
+        Book.objects.filter(pk=OuterRef("book_id")).values("daily_fee")[:1]
+    )
+
+    last_id = 0
+    while True:
+        ids = list(
+            overdue.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        Borrowing.objects.filter(id__in=ids).update(
+            accrued_fine=fine_expression(on_date, daily_fee),
+            fine_calculated_at=on_date,
+            updated_at=timezone.now(),
+        )
+        last_id = ids[-1]
+
+    summary = overdue.aggregate(overdue=Count("id"), accrued_fines=Sum("accrued_fine"))
+    return {
+        "date": on_date.isoformat(),
+        "overdue": summary["overdue"],
+        "accrued_fines": str(summary["accrued_fines"] or Decimal("0.00")),
+    }
+
+
+def stale_borrowings(now):
+    """
+    Unpaid borrowings whose checkout session has expired
+    (borrowing_waiting_payment_idx).
+    """
+    cutoff = (
+        now
+        - timedelta(seconds=settings.BORROWING_PAYMENT_TIMEOUT)
+        - PAYMENT_EXPIRY_GRACE
+    )
+    return Borrowing.objects.filter(
+        status=Borrowing.BorrowingStatus.WAITING_PAYMENT, created_at__lt=cutoff
+    )
+
+
+def expire_stale_borrowings(now=None, batch_size=None):
+    """
+    Cancel unpaid borrowings whose expiry webhook never arrived, and their
+    open payments, and put their copies back (or give them to holds).
+
+    Works in batches of the oldest stale borrowings. Rows are locked with
+    SKIP LOCKED, so a borrowing whose webhook is being applied right now
+    is left to it. Each batch restocks its books with one grouped UPDATE.
+    Returns a summary of what was reclaimed.
+    """
+    from stats.services import record_reclaimed_copies
+
+    now = now or timezone.now()
+    batch_size = batch_size or settings.STALE_BORROWING_BATCH_SIZE
+    stale = stale_borrowings(now)
+    summary = {"expired": 0, "payments_canceled": 0, "reclaimed_copies": 0}
+
+    while True:
+        with transaction.atomic():
+            rows = list(
+                stale.select_for_update(skip_locked=True)
+                .order_by("created_at", "id")
+                .values_list("id", "book_id")[:batch_size]
+            )
+            if not rows:
+                break
+            ids = [borrowing_id for borrowing_id, _ in rows]
+            Borrowing.objects.filter(id__in=ids).update(
+                status=Borrowing.BorrowingStatus.CANCELED, updated_at=now
+            )
+            # Cart payments reach their other borrowings through items
+            open_payments = Payment.objects.filter(
+                Q(borrowing_id__in=ids) | Q(items__borrowing_id__in=ids),
+                type=Payment.TypeType.PAYMENT,
+                status__in=[
+                    Payment.StatusType.SESSION_PENDING,
+                    Payment.StatusType.PENDING,
+                ],
+            ).values("pk")
+            canceled = Payment.objects.filter(pk__in=open_payments).update(
+                status=Payment.StatusType.CANCELED
+            )
+            counts = Tally(book_id for _, book_id in rows)
+            restock(counts)
+            allocate_holds(counts)
+            record_reclaimed_copies(len(rows))
+
+        summary["expired"] += len(rows)
+        summary["payments_canceled"] += canceled
+        summary["reclaimed_copies"] += len(rows)
+
+    if summary["expired"]:
+        logger.info(f"Expired unpaid borrowings: {summary}")
+    return summary
+
+
+def open_borrowing(user, book, expected_return_date):
+    """
+    Reserve a copy of `book` and create a WAITING_PAYMENT borrowing for it.
+
+    The conditional inventory update and the insert share one transaction.
+    Returns the borrowing and its fee.
+    """
+    borrowing = Borrowing(
+        book=book,
+        expected_return_date=expected_return_date,
+        user=user,
+        status=Borrowing.BorrowingStatus.WAITING_PAYMENT,
+    )
+
+    try:
+        amount = calculate_borrowing_fee(borrowing)
+    except ValueError as e:
+        raise ValidationError(str(e))
+
+    with transaction.atomic():
+        if not reserve_copy(book.id):
+            raise ValidationError("Book inventory is empty")
+        borrowing.save()
+    return borrowing, amount
+
+
+def return_borrowing(borrowing):
+    """
+    Mark a BORROWED borrowing returned today and put its copy back into
+    inventory.
+
+    Returns the fine owed for a late return, zero when there is none.
+    `borrowing.book` must be loaded, or loadable in the calling context.
+    """
+    from stats.services import record_return
+
+    if borrowing.actual_return_date is not None:
+        raise ValidationError("Book has already been returned.")
+    if borrowing.status != Borrowing.BorrowingStatus.BORROWED:
+        raise ValidationError("Only borrowed books can be returned.")
+
+    actual_return_date = timezone.now().date()
+    with transaction.atomic():
+        # Conditional update guards against concurrent double returns and
+        # against a cancellation (whose copy is already back) in between
+        returned = Borrowing.objects.filter(
+            pk=borrowing.pk,
+            actual_return_date__isnull=True,
+            status=Borrowing.BorrowingStatus.BORROWED,
+        ).update(
+            actual_return_date=actual_return_date,
+            status=Borrowing.BorrowingStatus.RETURNED,
+            updated_at=timezone.now(),
+        )
+        if not returned:
+            raise ValidationError("Only borrowed books can be returned.")
+
+        # Restore book inventory, or hand the copy to the next hold
+        release_copy(borrowing.book_id)
+        allocate_holds([borrowing.book_id])
+        record_return(borrowing)
+
+    borrowing.actual_return_date = actual_return_date
+    borrowing.status = Borrowing.BorrowingStatus.RETURNED
+
+    try:
+        if borrowing.fine_calculated_at == actual_return_date:
+            # Already computed today by the overdue sweep
+            return borrowing.accrued_fine
+        return calculate_fine(borrowing)
+    except Exception as e:
+        logger.error(f"Fine calculation failed for borrowing id={borrowing.id}: {e}")
+        return Decimal("0.00")
@@ -0,0 +1,25 @@
+from celery import shared_task
+
+from borrowings.services import expire_stale_borrowings, sweep_overdue_borrowings
+from config.notifications.tasks import send_telegram_overdue_notification
+from stats.models import Counter
+from stats.services import set_counter
+
+
+@shared_task
+def sweep_overdue_borrowings_task():
+    """Periodic (celery-beat) refresh of accrued fines for overdue borrowings."""
+    summary = sweep_overdue_borrowings()
+    set_counter(Counter.OVERDUE_BORROWINGS, summary["overdue"])
+    if summary["overdue"]:
+        send_telegram_overdue_notification(summary)
+    return summary
+
+
+@shared_task
+def expire_stale_borrowings_task():
+    """
+    Periodic (celery-beat) release of copies held by borrowings whose
+    payment never completed and whose expiry webhook was lost.
+    """
+    return expire_stale_borrowings()
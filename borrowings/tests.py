@@ -1,16 +1,43 @@
+import asyncio
+import time
 from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
 from books.models import Book
 from users.models import User
-from borrowings.models import Borrowing
+from books.search import search_books
+from books.services import reserve_copy
+from borrowings.models import Borrowing, Hold
+from borrowings.services import (
+    expire_stale_borrowings,
+    return_borrowing,
+    sweep_overdue_borrowings,
+)
+from borrowings.tasks import sweep_overdue_borrowings_task
+from payments.fake_stripe import fake_stripe
+from payments.models import Payment, PaymentItem
+from payments.services import calculate_fine, checkout_session_params
+from payments.tasks import create_payment_checkout_session
+from stats.models import Counter
+from payments.webhooks import apply_checkout_event
 
 
+@override_settings(STRIPE_FAKE=True)
 class BorrowingsTests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.staff_user = User.objects.create_user(
             email="staff@example.com", password="pass", is_staff=True
         )
@@ -62,6 +89,7 @@ class BorrowingsTests(APITestCase):
             book=self.book,
             user=self.regular_user,
             expected_return_date=timezone.now().date() + timezone.timedelta(days=7),
+            status=Borrowing.BorrowingStatus.BORROWED,
         )
         self.book.inventory = 2
         self.book.save()
@@ -86,6 +114,7 @@ class BorrowingsTests(APITestCase):
             book=self.book,
             user=self.regular_user,
             expected_return_date=expected_return_date,
+            status=Borrowing.BorrowingStatus.BORROWED,
         )
         self.book.inventory = 2
         self.book.daily_fee = Decimal("2.00")
@@ -120,6 +149,32 @@ class BorrowingsTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("Book has already been returned", str(response.data))
 
+    def test_return_canceled_or_unpaid_borrowing_error(self):
+        self.client.force_authenticate(user=self.regular_user)
+        for status_ in (
+            Borrowing.BorrowingStatus.CANCELED,
+            Borrowing.BorrowingStatus.WAITING_PAYMENT,
+        ):
+            with self.subTest(status=status_):
+                borrowing = Borrowing.objects.create(
+                    book=self.book,
+                    user=self.regular_user,
+                    expected_return_date=timezone.now().date()
+                    + timezone.timedelta(days=7),
+                    status=status_,
+                )
+                url = reverse(
+                    "borrowing:borrowings-return-book", kwargs={"pk": borrowing.pk}
+                )
+
+                response = self.client.post(url)
+
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.book.refresh_from_db()
+                self.assertEqual(self.book.inventory, 3)
+                borrowing.refresh_from_db()
+                self.assertEqual(borrowing.status, status_)
+
     def test_get_queryset_filters_is_active(self):
         active_borrow = Borrowing.objects.create(
             book=self.book,
@@ -137,13 +192,13 @@ class BorrowingsTests(APITestCase):
 
         response = self.client.get(url, {"is_active": "true"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        borrow_ids = [borrow["id"] for borrow in response.data]
+        borrow_ids = [borrow["id"] for borrow in response.data["results"]]
         self.assertIn(active_borrow.id, borrow_ids)
         self.assertNotIn(inactive_borrow.id, borrow_ids)
 
         response = self.client.get(url, {"is_active": "false"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        borrow_ids = [borrow["id"] for borrow in response.data]
+        borrow_ids = [borrow["id"] for borrow in response.data["results"]]
         self.assertIn(inactive_borrow.id, borrow_ids)
         self.assertNotIn(active_borrow.id, borrow_ids)
 
@@ -165,7 +220,7 @@ class BorrowingsTests(APITestCase):
         url = reverse("borrowing:borrowings-list")
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        borrow_ids = [borrow["id"] for borrow in response.data]
+        borrow_ids = [borrow["id"] for borrow in response.data["results"]]
         self.assertIn(borrow_self.id, borrow_ids)
         self.assertNotIn(borrow_other.id, borrow_ids)
 
@@ -189,3 +244,810 @@ class BorrowingsTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn(str(borrow_self.id), str(response.data))
         self.assertIn(str(borrow_other.id), str(response.data))
+
+
+class BorrowingPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff_user = User.objects.create_user(
+            email="staff@example.com", password="pass", is_staff=True
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover=Book.CoverType.SOFT,
+            inventory=3,
+            daily_fee="1.50",
+        )
+        self.borrowings = [
+            Borrowing.objects.create(
+                book=self.book,
+                user=self.staff_user,
+                expected_return_date=timezone.now().date() + timezone.timedelta(days=7),
+            )
+            for _ in range(5)
+        ]
+        self.client.force_authenticate(user=self.staff_user)
+        self.url = reverse("borrowing:borrowings-list")
+
+    def test_list_is_cursor_paginated_newest_first(self):
+        response = self.client.get(self.url, {"page_size": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertIsNone(response.data["previous"])
+        ids = [borrow["id"] for borrow in response.data["results"]]
+        self.assertEqual(ids, [self.borrowings[4].id, self.borrowings[3].id])
+
+        seen = list(ids)
+        next_url = response.data["next"]
+        while next_url:
+            response = self.client.get(next_url)
+            seen += [borrow["id"] for borrow in response.data["results"]]
+            next_url = response.data["next"]
+        self.assertEqual(seen, [b.id for b in reversed(self.borrowings)])
+
+    def test_pages_are_stable_under_concurrent_inserts(self):
+        response = self.client.get(self.url, {"page_size": 2})
+        next_url = response.data["next"]
+
+        Borrowing.objects.create(
+            book=self.book,
+            user=self.staff_user,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=7),
+        )
+
+        response = self.client.get(next_url)
+        ids = [borrow["id"] for borrow in response.data["results"]]
+        self.assertEqual(ids, [self.borrowings[2].id, self.borrowings[1].id])
+
+    def test_with_count_includes_total(self):
+        response = self.client.get(self.url, {"page_size": 2, "with_count": "true"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(len(response.data["results"]), 2)
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN plans are PostgreSQL-specific")
+@override_settings(STRIPE_FAKE=True)
+class BorrowingCartTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        fake_stripe.reset()
+        self.user = User.objects.create(email="user@example.com")
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}",
+                author="Author",
+                inventory=1,
+                daily_fee="1.50",
+            )
+            for i in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("borrowing:borrowings-bulk")
+        self.return_date = (
+            timezone.now().date() + timezone.timedelta(days=2)
+        ).isoformat()
+
+    def cart(self, books):
+        return {
+            "items": [
+                {"book": book.id, "expected_return_date": self.return_date}
+                for book in books
+            ]
+        }
+
+    def test_cart_creates_borrowings_and_one_checkout(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, self.cart(self.books), format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data["borrowings"]), 3)
+        self.assertEqual(Borrowing.objects.filter(user=self.user).count(), 3)
+        for book in self.books:
+            book.refresh_from_db()
+            self.assertEqual(book.inventory, 0)
+
+        self.assertEqual(len(fake_stripe.calls), 1)
+        line_items = fake_stripe.calls[0][1]["line_items"]
+        self.assertEqual(len(line_items), 3)
+
+        payment = Payment.objects.get()
+        self.assertEqual(payment.money_to_pay, Decimal("9.00"))
+        self.assertEqual(payment.items.count(), 3)
+        # Same number of queries whatever the cart size
+        self.assertLess(len(queries), 15)
+
+    def test_sold_out_book_rolls_back_whole_cart(self):
+        Book.objects.filter(pk=self.books[2].pk).update(inventory=0)
+
+        response = self.client.post(self.url, self.cart(self.books), format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Book inventory is empty", str(response.data))
+        self.assertFalse(Borrowing.objects.exists())
+        self.assertEqual(
+            list(Book.objects.order_by("id").values_list("inventory", flat=True)),
+            [1, 1, 0],
+        )
+
+    def test_duplicate_books_are_rejected(self):
+        cart = self.cart([self.books[0], self.books[0]])
+        response = self.client.post(self.url, cart, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_checkout_cancels_whole_cart(self):
+        self.client.post(self.url, self.cart(self.books), format="json")
+        payment = Payment.objects.get()
+
+        apply_checkout_event("checkout.session.expired", payment.session_id)
+
+        self.assertEqual(
+            set(Borrowing.objects.values_list("status", flat=True)),
+            {Borrowing.BorrowingStatus.CANCELED},
+        )
+        self.assertEqual(
+            list(Book.objects.values_list("inventory", flat=True)), [1, 1, 1]
+        )
+
+
+@override_settings(STRIPE_FAKE=True)
+class AsyncBorrowingViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        fake_stripe.reset()
+        self.user = User.objects.create(email="user@example.com")
+        self.book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=5, daily_fee="2.00"
+        )
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    async def borrow(self):
+        return await self.async_client.post(
+            reverse("borrowing:async-borrow"),
+            {
+                "book": self.book.id,
+                "expected_return_date": (
+                    timezone.now().date() + timezone.timedelta(days=3)
+                ).isoformat(),
+            },
+            content_type="application/json",
+            headers=self.headers,
+        )
+
+    async def test_borrow_reserves_copy_and_opens_session(self):
+        response = await self.borrow()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertTrue(data["checkout_url"].startswith(fake_stripe.base_url))
+        self.assertEqual(data["borrowing"]["user"], self.user.id)
+        await self.book.arefresh_from_db()
+        self.assertEqual(self.book.inventory, 4)
+        payment = await Payment.objects.aget(borrowing_id=data["borrowing"]["id"])
+        self.assertEqual(payment.money_to_pay, Decimal("6.00"))
+
+    async def test_stripe_waits_overlap(self):
+        fake_stripe.latency = 0.3
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(self.borrow() for _ in range(4)))
+
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [status.HTTP_201_CREATED] * 4,
+        )
+        # Four sequential Stripe calls would take 1.2s
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+    async def test_requires_authentication(self):
+        self.headers = {}
+        response = await self.borrow()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_validation_errors_match_drf(self):
+        self.book.inventory = 0
+        await self.book.asave()
+        response = await self.borrow()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Book inventory is empty", str(response.json()))
+
+    async def test_canceled_borrowing_cannot_be_returned(self):
+        borrowing = await Borrowing.objects.acreate(
+            book=self.book,
+            user=self.user,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=2),
+            status=Borrowing.BorrowingStatus.CANCELED,
+        )
+        inventory = self.book.inventory
+        url = reverse("borrowing:async-return", kwargs={"pk": borrowing.pk})
+
+        response = await self.async_client.post(url, headers=self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        await self.book.arefresh_from_db()
+        self.assertEqual(self.book.inventory, inventory)
+
+    async def test_late_return_opens_fine_session(self):
+        borrowing = await Borrowing.objects.acreate(
+            book=self.book,
+            user=self.user,
+            expected_return_date=timezone.now().date() - timezone.timedelta(days=2),
+            status=Borrowing.BorrowingStatus.BORROWED,
+        )
+        url = reverse("borrowing:async-return", kwargs={"pk": borrowing.pk})
+
+        response = await self.async_client.post(url, headers=self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Decimal(str(response.json()["fine_amount"])), Decimal("8.00"))
+        await self.book.arefresh_from_db()
+        self.assertEqual(self.book.inventory, 6)
+
+        response = await self.async_client.post(url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_cannot_return_others_borrowing(self):
+        other = await User.objects.acreate(email="other@example.com")
+        borrowing = await Borrowing.objects.acreate(
+            book=self.book,
+            user=other,
+            expected_return_date=timezone.now().date(),
+        )
+        response = await self.async_client.post(
+            reverse("borrowing:async-return", kwargs={"pk": borrowing.pk}),
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BorrowingConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="user@example.com")
+        self.book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=3, daily_fee="1.50"
+        )
+        self.borrowing = Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=7),
+            status=Borrowing.BorrowingStatus.BORROWED,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.list_url = reverse("borrowing:borrowings-list")
+        self.detail_url = reverse(
+            "borrowing:borrowings-detail", kwargs={"pk": self.borrowing.pk}
+        )
+
+    def test_unchanged_list_costs_one_aggregate_query(self):
+        etag = self.client.get(self.list_url)["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_return_changes_validators(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+
+        self.client.post(
+            reverse(
+                "borrowing:borrowings-return-book", kwargs={"pk": self.borrowing.pk}
+            )
+        )
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], Borrowing.BorrowingStatus.RETURNED)
+        self.assertIn("Last-Modified", response)
+
+    def test_expanded_book_changes_validators(self):
+        params = {"expand": "book"}
+        etag = self.client.get(self.list_url, params)["ETag"]
+        plain_etag = self.client.get(self.list_url)["ETag"]
+        self.assertNotEqual(etag, plain_etag)
+
+        reserve_copy(self.book.id)
+
+        response = self.client.get(self.list_url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.client.get(self.list_url, HTTP_IF_NONE_MATCH=plain_etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+    def test_expanded_user_is_not_validated(self):
+        params = {"expand": "user"}
+        response = self.client.get(self.list_url, params)
+        self.assertNotIn("ETag", response)
+
+        self.user.email = "new@example.com"
+        self.user.save()
+
+        response = self.client.get(self.list_url, params, HTTP_IF_NONE_MATCH='"any"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"][0]["user"]["email"], "new@example.com"
+        )
+
+
+class QueryPlanTests(TestCase):
+    """
+    Seed a sizable dataset and assert via EXPLAIN that hot lookups are
+    served by their indexes instead of sequential scans.
+    """
+
+    users = 200
+    books = 2000
+    borrowings_per_user = 50
+
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.now().date()
+        users = User.objects.bulk_create(
+            User(email=f"user{i}@example.com", password="pass")
+            for i in range(cls.users)
+        )
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Volume {i} of the collection",
+                author=f"Author {i % 300}",
+                inventory=i % 5,
+                daily_fee="1.00",
+            )
+            for i in range(cls.books)
+        )
+        Book.objects.create(
+            title="Dune", author="Frank Herbert", inventory=1, daily_fee="1.00"
+        )
+
+        borrowings = []
+        for user_index, user in enumerate(users):
+            # The first user is a heavy reader with a long borrowing history
+            history = cls.borrowings_per_user * (40 if user_index == 0 else 1)
+            for i in range(history):
+                # Mostly returned history, a few active and a few overdue
+                active = i % 25 == 0
+                overdue = active and i % 50 == 0
+                borrowings.append(
+                    Borrowing(
+                        book=books[(user_index + i) % cls.books],
+                        user=user,
+                        expected_return_date=today
+                        + timezone.timedelta(days=-3 if overdue else 7),
+                        actual_return_date=None if active else today,
+                        status=(
+                            Borrowing.BorrowingStatus.BORROWED
+                            if active
+                            else Borrowing.BorrowingStatus.RETURNED
+                        ),
+                    )
+                )
+        borrowings = Borrowing.objects.bulk_create(borrowings)
+        Payment.objects.bulk_create(
+            Payment(
+                borrowing=borrowing,
+                money_to_pay="7.00",
+                session_id=f"cs_test_{borrowing.id}",
+                status=Payment.StatusType.PAID,
+            )
+            for borrowing in borrowings
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        cls.user = users[0]
+        cls.session_id = f"cs_test_{borrowings[-1].id}"
+
+    def assertUsesIndex(self, queryset, index_name=None):
+        plan = queryset.explain()
+        self.assertNotIn("Seq Scan", plan, plan)
+        self.assertIn("Index", plan, plan)
+        if index_name:
+            self.assertIn(index_name, plan, plan)
+
+    def test_webhook_payment_lookup_by_session_id(self):
+        self.assertUsesIndex(Payment.objects.filter(session_id=self.session_id))
+
+    def test_active_borrowings_per_user(self):
+        queryset = Borrowing.objects.filter(
+            user=self.user, actual_return_date__isnull=True
+        ).order_by("-id")[:20]
+        self.assertUsesIndex(queryset, "borrowing_user_active_idx")
+
+    def test_overdue_borrowings(self):
+        queryset = Borrowing.objects.filter(
+            status=Borrowing.BorrowingStatus.BORROWED,
+            expected_return_date__lt=timezone.now().date(),
+        )
+        self.assertUsesIndex(queryset, "borrowing_overdue_idx")
+
+    def test_payments_of_user(self):
+        queryset = Payment.objects.filter(borrowing__user=self.user).order_by("-id")
+        plan = queryset.explain()
+        self.assertNotIn("Seq Scan on borrowings_borrowing", plan, plan)
+
+    def test_book_search(self):
+        self.assertUsesIndex(
+            search_books(Book.objects.all(), "dune"), "book_search_vector_idx"
+        )
+
+
+class BorrowingQueryBudgetTests(APITestCase):
+    """List endpoints must cost a constant number of queries per page."""
+
+    def setUp(self):
+        cache.clear()
+        self.staff_user = User.objects.create_user(
+            email="staff@example.com", password="pass", is_staff=True
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=3,
+            daily_fee="1.50",
+        )
+
+    def add_borrowings(self, count):
+        for i in range(count):
+            user = User.objects.create(
+                email=f"reader{Borrowing.objects.count()}@example.com"
+            )
+            borrowing = Borrowing.objects.create(
+                book=self.book,
+                user=user,
+                expected_return_date=timezone.now().date() + timezone.timedelta(days=7),
+            )
+            Payment.objects.create(borrowing=borrowing, money_to_pay="1.00")
+
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url, params=None):
+        self.add_borrowings(2)
+        few = self.count_queries(url, params)
+        self.add_borrowings(8)
+        many = self.count_queries(url, params)
+        self.assertEqual(few, many)
+
+    def test_expanded_borrowing_list(self):
+        self.client.force_authenticate(user=self.staff_user)
+        url = reverse("borrowing:borrowings-list")
+        self.assertConstantQueries(url, {"expand": "book,user"})
+
+        response = self.client.get(url, {"expand": "book,user"})
+        borrowing = response.data["results"][0]
+        self.assertEqual(borrowing["book"]["title"], "Test Book")
+        self.assertIn("@example.com", borrowing["user"]["email"])
+        self.assertNotIn("password", borrowing["user"])
+
+    def test_sparse_fields_with_expansion(self):
+        self.client.force_authenticate(user=self.staff_user)
+        url = reverse("borrowing:borrowings-list")
+        self.assertConstantQueries(url, {"expand": "book", "fields": "id,book"})
+
+        response = self.client.get(url, {"expand": "book", "omit": "user,book"})
+        self.assertNotIn("book", response.data["results"][0])
+
+        response = self.client.get(url, {"expand": "book", "fields": "id,book"})
+        borrowing = response.data["results"][0]
+        self.assertEqual(list(borrowing), ["id", "book"])
+        self.assertEqual(borrowing["book"]["title"], "Test Book")
+
+        response = self.client.get(
+            reverse("payments:payments-list"), {"omit": "session_url"}
+        )
+        self.assertNotIn("session_url", response.data["results"][0])
+
+    def test_unknown_expand_is_rejected(self):
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.get(
+            reverse("borrowing:borrowings-list"), {"expand": "x"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expanded_payment_list(self):
+        self.client.force_authenticate(user=self.staff_user)
+        url = reverse("payments:payments-list")
+        self.assertConstantQueries(url, {"expand": "borrowing"})
+
+    def test_admin_changelists(self):
+        self.staff_user.is_superuser = True
+        self.staff_user.save()
+        self.client.force_login(self.staff_user)
+
+        self.assertConstantQueries(reverse("admin:borrowings_borrowing_changelist"))
+        self.assertConstantQueries(reverse("admin:payments_payment_changelist"))
+
+
+class OverdueSweepTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="user@example.com")
+        self.book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=3, daily_fee="1.25"
+        )
+        self.today = timezone.now().date()
+
+    def borrow(self, days_overdue, status=Borrowing.BorrowingStatus.BORROWED):
+        return Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            expected_return_date=self.today - timezone.timedelta(days=days_overdue),
+            status=status,
+        )
+
+    @mock.patch("borrowings.tasks.send_telegram_overdue_notification")
+    def test_sweep_stores_fines_in_chunks_and_notifies_once(self, notify):
+        overdue = [self.borrow(days) for days in range(1, 8)]
+        on_time = self.borrow(-3)
+        unpaid = self.borrow(5, status=Borrowing.BorrowingStatus.WAITING_PAYMENT)
+
+        with override_settings(OVERDUE_SWEEP_CHUNK_SIZE=3):
+            summary = sweep_overdue_borrowings_task()
+
+        expected_total = Decimal("0.00")
+        for borrowing in overdue:
+            borrowing.refresh_from_db()
+            borrowing.actual_return_date = self.today
+            self.assertEqual(borrowing.accrued_fine, calculate_fine(borrowing))
+            self.assertEqual(borrowing.fine_calculated_at, self.today)
+            expected_total += borrowing.accrued_fine
+
+        for borrowing in (on_time, unpaid):
+            borrowing.refresh_from_db()
+            self.assertEqual(borrowing.accrued_fine, Decimal("0.00"))
+            self.assertIsNone(borrowing.fine_calculated_at)
+
+        self.assertEqual(summary["overdue"], 7)
+        self.assertEqual(Decimal(summary["accrued_fines"]), expected_total)
+        notify.assert_called_once_with(summary)
+
+    def test_sweep_query_count_is_per_chunk_not_per_row(self):
+        for days in range(1, 11):
+            self.borrow(days)
+
+        # per chunk: select ids + update; plus the final empty select and summary
+        with self.assertNumQueries(2 * 2 + 2):
+            sweep_overdue_borrowings(chunk_size=5)
+
+
+class StaleBorrowingExpiryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="user@example.com")
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", author="Author", inventory=0, daily_fee="1.00"
+            )
+            for i in range(2)
+        ]
+        self.stale_at = timezone.now() - timezone.timedelta(days=1)
+
+    def hold(self, book, created_at=None, payment_status=Payment.StatusType.PENDING):
+        borrowing = Borrowing.objects.create(
+            book=book,
+            user=self.user,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=3),
+        )
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            created_at=created_at or self.stale_at
+        )
+        payment = Payment.objects.create(
+            borrowing=borrowing, money_to_pay="3.00", status=payment_status
+        )
+        return borrowing, payment
+
+    def test_expires_in_batches_with_one_inventory_update_each(self):
+        held = [self.hold(book) for book in (self.books[0], self.books[0])]
+        cart_borrowing, _ = self.hold(self.books[1])
+        cart_payment = held[0][1]
+        PaymentItem.objects.create(
+            payment=cart_payment, borrowing=cart_borrowing, amount="3.00"
+        )
+        fresh, fresh_payment = self.hold(self.books[1], created_at=timezone.now())
+
+        with CaptureQueriesContext(connection) as context:
+            summary = expire_stale_borrowings(batch_size=2)
+
+        self.assertEqual(
+            summary, {"expired": 3, "payments_canceled": 3, "reclaimed_copies": 3}
+        )
+        book_updates = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith('UPDATE "books_book"')
+        ]
+        self.assertEqual(len(book_updates), 2)
+
+        self.assertEqual(
+            [book.inventory for book in Book.objects.order_by("id")], [2, 1]
+        )
+        self.assertEqual(
+            Borrowing.objects.filter(status=Borrowing.BorrowingStatus.CANCELED).count(),
+            3,
+        )
+        fresh_payment.refresh_from_db()
+        self.assertEqual(fresh_payment.status, Payment.StatusType.PENDING)
+        self.assertEqual(Counter.objects.get(name=Counter.RECLAIMED_COPIES).value, 3)
+
+        self.assertEqual(expire_stale_borrowings()["expired"], 0)
+
+    def test_checkout_session_expires_before_the_hold(self):
+        borrowing, _ = self.hold(self.books[0])
+        params = checkout_session_params(borrowing, "PAYMENT", Decimal("3.00"))
+        self.assertLessEqual(
+            params["expires_at"],
+            timezone.now().timestamp() + settings.BORROWING_PAYMENT_TIMEOUT + 1,
+        )
+        self.assertNotIn(
+            "expires_at", checkout_session_params(borrowing, "FINE", Decimal("3.00"))
+        )
+
+
+@override_settings(STRIPE_FAKE=True)
+@mock.patch(
+    "payments.tasks.create_payment_checkout_session.delay",
+    side_effect=lambda payment_id: create_payment_checkout_session.apply(
+        args=[payment_id]
+    ),
+)
+@mock.patch("borrowings.holds.send_telegram_hold_notification")
+class HoldQueueTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        fake_stripe.reset()
+        self.reader = User.objects.create_user(email="reader@example.com")
+        self.holders = [
+            User.objects.create_user(email=f"holder{i}@example.com") for i in range(2)
+        ]
+        self.book = Book.objects.create(
+            title="Dune", author="Author", inventory=0, daily_fee=Decimal("1.00")
+        )
+        self.borrowing = Borrowing.objects.create(
+            book=self.book,
+            user=self.reader,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=3),
+            status=Borrowing.BorrowingStatus.BORROWED,
+        )
+        self.url = reverse("borrowing:holds-list")
+
+    def place(self, user, days=7):
+        self.client.force_authenticate(user=user)
+        return self.client.post(self.url, {"book": self.book.id, "days": days})
+
+    def test_holds_queue_in_order(self, notify, delay):
+        first = self.place(self.holders[0])
+        second = self.place(self.holders[1])
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first.data["position"], 1)
+        self.assertEqual(second.data["position"], 2)
+        self.assertEqual(second.data["status"], Hold.HoldStatus.WAITING)
+
+    def test_duplicate_or_in_stock_hold_is_rejected(self, notify, delay):
+        self.place(self.holders[0])
+        self.assertEqual(
+            self.place(self.holders[0]).status_code, status.HTTP_400_BAD_REQUEST
+        )
+
+        Book.objects.filter(pk=self.book.pk).update(inventory=1)
+        response = self.place(self.holders[1])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("borrow it instead", str(response.data))
+
+    def test_returned_copy_goes_to_the_oldest_hold(self, notify, delay):
+        self.place(self.holders[0], days=5)
+        self.place(self.holders[1])
+
+        self.client.force_authenticate(user=self.reader)
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse(
+                        "borrowing:borrowings-return-book",
+                        kwargs={"pk": self.borrowing.pk},
+                    )
+                )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            any("SKIP LOCKED" in query["sql"] for query in context.captured_queries)
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+        first, second = Hold.objects.order_by("id")
+        self.assertEqual(first.status, Hold.HoldStatus.ALLOCATED)
+        self.assertEqual(second.status, Hold.HoldStatus.WAITING)
+        allocated = first.borrowing
+        self.assertEqual(allocated.user, self.holders[0])
+        self.assertEqual(allocated.status, Borrowing.BorrowingStatus.WAITING_PAYMENT)
+        self.assertEqual(
+            allocated.expected_return_date,
+            timezone.now().date() + timezone.timedelta(days=5),
+        )
+        payment = allocated.payments.get()
+        self.assertEqual(payment.status, Payment.StatusType.PENDING)
+        self.assertEqual(payment.money_to_pay, Decimal("5.00"))
+        notify.assert_called_once()
+
+        self.client.force_authenticate(user=self.holders[1])
+        self.assertEqual(self.client.get(self.url).data["results"][0]["position"], 1)
+
+    def test_canceled_payment_hands_copy_to_next_hold(self, notify, delay):
+        self.place(self.holders[0])
+        self.place(self.holders[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            return_borrowing(self.borrowing)
+        first, second = Hold.objects.order_by("id")
+
+        payment = first.borrowing.payments.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_checkout_event("checkout.session.expired", payment.session_id)
+
+        second.refresh_from_db()
+        self.assertEqual(second.status, Hold.HoldStatus.ALLOCATED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+    def test_restocked_copies_go_to_the_queue(self, notify, delay):
+        staff = User.objects.create_user(email="staff@example.com", is_staff=True)
+        self.place(self.holders[0])
+        self.place(self.holders[1])
+
+        self.client.force_authenticate(user=staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse("book:book-detail", kwargs={"pk": self.book.pk}),
+                {"inventory": 1},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        first, second = Hold.objects.order_by("id")
+        self.assertEqual(first.status, Hold.HoldStatus.ALLOCATED)
+        self.assertIn(f"borrowing {first.borrowing_id}", first.notice)
+        self.assertEqual(second.status, Hold.HoldStatus.WAITING)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+        content = (
+            "id,title,author,cover,inventory,daily_fee\n"
+            f"{self.book.id},Dune,Author,HARD,2,1.00\n"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("book:book-import-books"),
+                {"file": SimpleUploadedFile("books.csv", content.encode("utf-8"))},
+                format="multipart",
+            )
+
+        second.refresh_from_db()
+        self.assertEqual(second.status, Hold.HoldStatus.ALLOCATED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+
+        # The patron sees the notice in their hold list
+        self.client.force_authenticate(user=self.holders[0])
+        hold = self.client.get(self.url).data["results"][0]
+        self.assertEqual(hold["notice"], first.notice)
+
+    def test_cancel_hold(self, notify, delay):
+        hold_id = self.place(self.holders[0]).data["id"]
+        url = reverse("borrowing:holds-detail", kwargs={"pk": hold_id})
+
+        self.assertEqual(
+            self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT
+        )
+        self.assertEqual(Hold.objects.get().status, Hold.HoldStatus.CANCELED)
+        self.assertEqual(
+            self.client.delete(url).status_code, status.HTTP_400_BAD_REQUEST
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            return_borrowing(self.borrowing)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
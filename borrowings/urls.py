@@ -1,11 +1,20 @@
 from django.urls import path
-from rest_framework.routers import DefaultRouter
+from rest_framework.routers import DefaultRouter, SimpleRouter
 
-from borrowings.views import BorrowingViewSet, BorrowingCreateViewSet
+from borrowings import async_views
+from borrowings.views import BorrowingViewSet, BorrowingCreateViewSet, HoldViewSet
 
 app_name = "borrowing"
 
 router = DefaultRouter()
 router.register(r"", BorrowingViewSet, basename="borrowings")
 
-urlpatterns = router.urls
+hold_router = SimpleRouter()
+hold_router.register(r"holds", HoldViewSet, basename="holds")
+
+urlpatterns = [
+    # Ahead of the router, whose detail route would match "async/" and "holds/"
+    path("async/", async_views.borrow, name="async-borrow"),
+    path("async/<int:pk>/return/", async_views.return_book, name="async-return"),
+    *hold_router.urls,
+] + router.urls
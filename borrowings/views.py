@@ -1,7 +1,9 @@
 import logging
 from decimal import Decimal
 
-from django.utils import timezone
+from django.db import transaction
+from django.db.models import Case, Count, OuterRef, Subquery, When
+from django.urls import reverse
 from rest_framework import status, mixins, viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
@@ -9,19 +11,34 @@ from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from rest_framework.viewsets import GenericViewSet
 
+from books.services import reserve_copies
+from config.conditional import ConditionalGetMixin
+from config.expand import ExpandViewMixin
 from config.permissions import IsStaffUser
-from borrowings.models import Borrowing
-from borrowings.serializers import BorrowingSerializer
-from payments.services import (
-    create_stripe_payment_session,
-    calculate_borrowing_fee,
-    calculate_fine,
+from config.sparse import SparseFieldsViewMixin
+from borrowings.holds import cancel_hold, place_hold
+from borrowings.models import Borrowing, Hold
+from borrowings.serializers import (
+    BorrowingCartSerializer,
+    BorrowingSerializer,
+    HoldSerializer,
 )
+from borrowings.services import open_borrowing, return_borrowing
+from payments.services import start_stripe_payment, calculate_borrowing_fee
 
 logger = logging.getLogger(__name__)
 
 
-class BorrowingViewSet(viewsets.ModelViewSet):
+def checkout_status_url(request, payment):
+    """URL the client polls until the payment's checkout session is ready."""
+    return request.build_absolute_uri(
+        reverse("payments:payments-checkout", kwargs={"pk": payment.pk})
+    )
+
+
+class BorrowingViewSet(
+    ConditionalGetMixin, SparseFieldsViewMixin, ExpandViewMixin, viewsets.ModelViewSet
+):
     """
     ViewSet to manage borrowings of books.
 
@@ -33,10 +50,32 @@ class BorrowingViewSet(viewsets.ModelViewSet):
     - `is_active` query param: filter active borrowings (not returned) or inactive (returned).
     - `user_id` filter is restricted to staff users only.
 
+    Expansion:
+    - `expand=book,user` nests the related objects, loaded with a join.
+
+    Pagination:
+    - List is cursor-paginated, newest borrowings first.
+
+    Sparse fieldsets:
+    - `fields` / `omit` select the returned fields (and loaded columns) of
+      list items; `compact=true` returns a columnar page.
+
+    Conditional GET:
+    - List and detail responses carry ETag and Last-Modified validators
+      from one aggregate query; unchanged resources get `304 Not Modified`.
+    - `expand=user` responses carry no validators, since users have no
+      change timestamp.
+
     Create:
-    - Checks book inventory before allowing borrowing.
-    - Decreases inventory upon borrowing creation.
-    - Calculates fee and creates Stripe payment session.
+    - Reserves a copy with a conditional inventory update and creates the
+      borrowing in the same transaction.
+    - Calculates fee and creates Stripe payment session, inline or in a
+      Celery task when STRIPE_ASYNC_CHECKOUT is on.
+
+    Custom action `bulk`:
+    - Checks out a cart of books: reserves every copy with one UPDATE,
+      inserts the borrowings with one INSERT and opens a single Stripe
+      session with a line item per book.
 
     Custom action `return_book`:
     - Marks borrowing as returned.
@@ -46,6 +85,8 @@ class BorrowingViewSet(viewsets.ModelViewSet):
 
     queryset = Borrowing.objects.all()
     serializer_class = BorrowingSerializer
+    expand_related = {"book": "book", "user": "user"}
+    conditional_related = {"book": "book"}
 
     def get_permissions(self):
         if self.request.user.is_staff:
@@ -54,7 +95,7 @@ class BorrowingViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        queryset = Borrowing.objects.all()
+        queryset = self.select_sparse(self.select_expanded(Borrowing.objects.all()))
 
         if not user.is_staff:
             # Non-staff users see only their borrowings
@@ -81,47 +122,85 @@ class BorrowingViewSet(viewsets.ModelViewSet):
         """
         Override create to:
         - Validate data.
-        - Check book inventory.
-        - Create borrowing with status WAITING_PAYMENT.
-        - Decrease book inventory.
+        - Atomically reserve a copy and create borrowing with status
+          WAITING_PAYMENT.
         - Calculate fee and create Stripe checkout session.
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        user = request.user
-        book = serializer.validated_data["book"]
+        borrowing, amount = open_borrowing(
+            request.user,
+            serializer.validated_data["book"],
+            serializer.validated_data["expected_return_date"],
+        )
 
-        if book.inventory <= 0:
-            raise ValidationError("Book inventory is empty")
+        payment = start_stripe_payment(
+            borrowing, payment_type="PAYMENT", amount_usd=amount
+        )
 
-        borrowing = Borrowing.objects.create(
-            book=book,
-            expected_return_date=serializer.validated_data["expected_return_date"],
-            user=user,
-            status=Borrowing.BorrowingStatus.WAITING_PAYMENT,
+        borrowing_data = self.get_serializer(borrowing).data
+        return Response(
+            {
+                "checkout_url": payment.session_url,
+                "checkout_status_url": checkout_status_url(request, payment),
+                "borrowing": borrowing_data,
+            },
+            status=status.HTTP_201_CREATED,
         )
 
-        # Update inventory
-        book.inventory -= 1
-        book.save()
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk",
+        serializer_class=BorrowingCartSerializer,
+    )
+    def bulk(self, request):
+        """
+        Borrow several books at once:
+        - Validates the cart and loads all books in one query.
+        - Atomically reserves one copy of each book and bulk-creates the
+          borrowings with status WAITING_PAYMENT; nothing is reserved if
+          any book is sold out.
+        - Creates one payment and Stripe checkout session for the cart.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        borrowings = [
+            Borrowing(
+                book=item["book"],
+                expected_return_date=item["expected_return_date"],
+                user=request.user,
+                status=Borrowing.BorrowingStatus.WAITING_PAYMENT,
+            )
+            for item in serializer.validated_data["items"]
+        ]
 
         try:
-            amount = calculate_borrowing_fee(borrowing)
+            fees = [calculate_borrowing_fee(borrowing) for borrowing in borrowings]
         except ValueError as e:
-            # Rollback borrowing creation if fee calculation fails
-            borrowing.delete()
             raise ValidationError(str(e))
 
-        payment = create_stripe_payment_session(
-            borrowing, payment_type="PAYMENT", amount_usd=amount
+        with transaction.atomic():
+            if not reserve_copies(borrowing.book_id for borrowing in borrowings):
+                raise ValidationError("Book inventory is empty")
+            Borrowing.objects.bulk_create(borrowings)
+
+        payment = start_stripe_payment(
+            borrowings[0],
+            payment_type="PAYMENT",
+            amount_usd=sum(fees),
+            items=list(zip(borrowings, fees)),
         )
 
-        borrowing_data = self.get_serializer(borrowing).data
         return Response(
             {
                 "checkout_url": payment.session_url,
-                "borrowing": borrowing_data,
+                "checkout_status_url": checkout_status_url(request, payment),
+                "borrowings": BorrowingSerializer(
+                    borrowings, many=True, context=self.get_serializer_context()
+                ).data,
             },
             status=status.HTTP_201_CREATED,
         )
@@ -136,36 +215,19 @@ class BorrowingViewSet(viewsets.ModelViewSet):
         - Calculates fine, if applicable, and creates Stripe fine payment session.
         """
         borrowing = self.get_object()
-
-        if borrowing.actual_return_date is not None:
-            raise ValidationError("Book has already been returned.")
-
-        actual_return_date = timezone.now().date()
-        borrowing.actual_return_date = actual_return_date
-        borrowing.status = Borrowing.BorrowingStatus.RETURNED
-        borrowing.save()
-
-        # Restore book inventory
-        book = borrowing.book
-        book.inventory += 1
-        book.save()
-
-        fine_amount = Decimal("0.00")
-        try:
-            fine_amount = calculate_fine(borrowing)
-        except Exception as e:
-            logger.error(
-                f"Fine calculation failed for borrowing id={borrowing.id}: {e}"
-            )
+        fine_amount = return_borrowing(borrowing)
 
         if fine_amount > Decimal("0.00"):
-            fine_payment = create_stripe_payment_session(
+            fine_payment = start_stripe_payment(
                 borrowing, payment_type="FINE", amount_usd=fine_amount
             )
             return Response(
                 {
                     "borrowing": self.get_serializer(borrowing).data,
                     "fine_payment_url": fine_payment.session_url,
+                    "fine_payment_status_url": checkout_status_url(
+                        request, fine_payment
+                    ),
                     "fine_amount": fine_amount,
                 }
             )
@@ -185,3 +247,61 @@ class BorrowingCreateViewSet(mixins.CreateModelMixin, GenericViewSet):
     queryset = Borrowing.objects.all()
     serializer_class = BorrowingSerializer
     permission_classes = [IsAuthenticated()]
+
+
+class HoldViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    GenericViewSet,
+):
+    """
+    FIFO queue for sold-out books.
+
+    - Create: join the queue of a book with no copy on the shelf; `days`
+      is the length of the borrowing once a copy is allocated.
+    - List / retrieve: own holds (staff see all), newest first, with the
+      queue `position` of waiting ones.
+    - Destroy: leave the queue.
+
+    When a copy comes back it goes to the oldest waiting hold, which turns
+    ALLOCATED and links a WAITING_PAYMENT borrowing; its payment is listed
+    under /api/payments/ and must be paid within BORROWING_PAYMENT_TIMEOUT.
+    """
+
+    serializer_class = HoldSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        ahead = (
+            Hold.objects.filter(
+                book=OuterRef("book"),
+                status=Hold.HoldStatus.WAITING,
+                id__lte=OuterRef("id"),
+            )
+            .order_by()
+            .values("book")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        queryset = Hold.objects.annotate(
+            position=Case(
+                When(status=Hold.HoldStatus.WAITING, then=Subquery(ahead)),
+                default=None,
+            )
+        )
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        hold = place_hold(
+            self.request.user,
+            serializer.validated_data["book"],
+            serializer.validated_data["days"],
+        )
+        serializer.instance = self.get_queryset().get(pk=hold.pk)
+
+    def perform_destroy(self, instance):
+        cancel_hold(instance)
@@ -1,3 +1,3 @@
-from celery import Celery
+from .celery import app
 
-app = Celery("library_service")
+__all__ = ("app",)
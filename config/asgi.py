@@ -2,6 +2,8 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Under ASGI the coroutine endpoints (``borrowings/async_views.py``,
+``payments/async_views.py``) wait on Stripe without holding a thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -0,0 +1,91 @@
+"""
+Helpers for the async endpoints served under ASGI.
+
+DRF views are synchronous, so the I/O-bound endpoints that also exist as
+coroutines are plain Django views. `async_api_view` gives them the same
+JWT authentication, throttling and error payloads as the DRF API.
+"""
+
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def json_response(data, status=200, headers=None):
+    return JsonResponse(
+        data, status=status, headers=headers, encoder=JSONEncoder, safe=False
+    )
+
+
+def error_response(exc):
+    """Render an APIException the way DRF's default exception handler does."""
+    data = (
+        exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    )
+    headers = {}
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        headers["WWW-Authenticate"] = 'Bearer realm="api"'
+    if getattr(exc, "wait", None):
+        headers["Retry-After"] = str(int(exc.wait))
+    return json_response(data, status=exc.status_code, headers=headers)
+
+
+def parse_json(request):
+    if not request.body:
+        return {}
+    try:
+        return json.loads(request.body)
+    except ValueError as e:
+        raise exceptions.ParseError(f"JSON parse error - {e}")
+
+
+def check_request(request, login_required, throttle=True):
+    """Authenticate and throttle with the classes DRF is configured with."""
+    request.user, request.auth = AnonymousUser(), None
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authentication_class().authenticate(request)
+        if result is not None:
+            request.user, request.auth = result
+            break
+
+    if login_required and not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+
+    if not throttle:
+        return
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttler = throttle_class()
+        if not throttler.allow_request(request, None):
+            raise exceptions.Throttled(throttler.wait())
+
+
+def async_api_view(methods, login_required=True, throttle=True):
+    """
+    Decorate a coroutine view taking JWT-authenticated JSON requests.
+
+    Authentication and throttling run in the request's sync thread;
+    APIExceptions raised by the view are returned as JSON errors.
+    `throttle=False` is for callers authenticated by other means, such as
+    signed Stripe webhooks.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                await sync_to_async(check_request)(request, login_required, throttle)
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return error_response(exc)
+
+        return csrf_exempt(require_http_methods(methods)(wrapper))
+
+    return decorator
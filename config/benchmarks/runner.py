@@ -0,0 +1,395 @@
+"""
+Benchmark runner for the API hot paths.
+
+Each scenario builds its full list of requests up front, then the runner
+replays them from `concurrency` threads, timing every request. Requests go
+either through Django's test client in this process (the default, with
+Stripe faked, Celery eager and throttling off) or over HTTP to a running
+server via httpx (`base_url`; start that server with STRIPE_FAKE=True and
+high throttle rates).
+"""
+
+import json
+import logging
+import platform
+import subprocess
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from unittest import mock
+
+import django
+import httpx
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from books.models import Book
+from config.benchmarks.seed import WORDS, bench_users
+from config.celery import app as celery_app
+from payments.models import Payment
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Call:
+    method: str
+    path: str
+    token: str = None
+    body: dict = None
+    # Opaque data handed back to the scenario with the response
+    tag: object = None
+
+
+@dataclass
+class Context:
+    tokens: dict
+    book_ids: list
+    created: deque = field(default_factory=deque)
+
+
+class InProcessTransport:
+    name = "in-process"
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def send(self, call):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = Client()
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {call.token}"} if call.token else {}
+        if call.body is None:
+            response = client.generic(call.method, call.path, **headers)
+        else:
+            response = client.generic(
+                call.method,
+                call.path,
+                json.dumps(call.body, default=str),
+                content_type="application/json",
+                **headers,
+            )
+        content = b"".join(response) if response.streaming else response.content
+        return response.status_code, content
+
+
+class HttpTransport:
+    name = "http"
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self._local = threading.local()
+
+    def send(self, call):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = httpx.Client(
+                base_url=self.base_url, timeout=30
+            )
+        headers = {"Authorization": f"Bearer {call.token}"} if call.token else {}
+        response = client.request(
+            call.method,
+            call.path,
+            content=json.dumps(call.body, default=str) if call.body else None,
+            headers={**headers, "Content-Type": "application/json"},
+        )
+        return response.status_code, response.content
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(
+        0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1)
+    )
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, duration):
+    latencies = sorted(latencies)
+    milliseconds = {
+        name: round(percentile(latencies, fraction) * 1000, 3) if latencies else None
+        for name, fraction in (
+            ("p50", 0.5),
+            ("p90", 0.9),
+            ("p95", 0.95),
+            ("p99", 0.99),
+            ("max", 1.0),
+        )
+    }
+    if latencies:
+        milliseconds["mean"] = round(sum(latencies) / len(latencies) * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "rps": round(len(latencies) / duration, 2) if duration else None,
+        "latency_ms": milliseconds,
+    }
+
+
+class Scenario:
+    """A named request mix; `calls` may depend on earlier scenarios."""
+
+    name = None
+    # Reads can be warmed up; calls of stateful scenarios are one-shot
+    stateful = False
+    ok_statuses = (200,)
+
+    def calls(self, ctx, count):
+        raise NotImplementedError
+
+    def done(self, ctx, call, status, content):
+        pass
+
+
+class BookList(Scenario):
+    name = "books_list"
+
+    def calls(self, ctx, count):
+        filters = ("", "&cover=HARD", "&in_stock=true", "&max_daily_fee=2")
+        return [
+            Call("GET", f"/api/books/books/?page_size=20{filters[i % len(filters)]}")
+            for i in range(count)
+        ]
+
+
+class BookSearch(Scenario):
+    name = "books_search"
+
+    def calls(self, ctx, count):
+        return [
+            Call("GET", f"/api/books/books/?search={WORDS[i % len(WORDS)]}")
+            for i in range(count)
+        ]
+
+
+class PaymentList(Scenario):
+    name = "payments_list"
+
+    def calls(self, ctx, count):
+        tokens = list(ctx.tokens.values())
+        return [
+            Call("GET", "/api/payments/payments/", token=tokens[i % len(tokens)])
+            for i in range(count)
+        ]
+
+
+class BorrowingCreate(Scenario):
+    name = "borrowing_create"
+    stateful = True
+    ok_statuses = (201,)
+
+    def calls(self, ctx, count):
+        tokens = list(ctx.tokens.values())
+        return_date = timezone.now().date() + timezone.timedelta(days=7)
+        return [
+            Call(
+                "POST",
+                "/api/borrowings/",
+                token=tokens[i % len(tokens)],
+                body={
+                    "book": ctx.book_ids[i * 7 % len(ctx.book_ids)],
+                    "expected_return_date": return_date,
+                },
+            )
+            for i in range(count)
+        ]
+
+    def done(self, ctx, call, status, content):
+        if status == 201:
+            borrowing_id = json.loads(content)["borrowing"]["id"]
+            ctx.created.append((borrowing_id, call.token))
+
+
+class StripeWebhook(Scenario):
+    """Completes the checkout sessions opened by `borrowing_create`."""
+
+    name = "stripe_webhook"
+    stateful = True
+
+    def calls(self, ctx, count):
+        borrowing_ids = [borrowing_id for borrowing_id, _ in ctx.created]
+        payments = Payment.objects.filter(
+            borrowing_id__in=borrowing_ids, status=Payment.StatusType.PENDING
+        ).values_list("session_id", "borrowing_id")[:count]
+        return [
+            Call(
+                "POST",
+                "/api/payments/webhook/",
+                body={
+                    "id": f"evt_bench_{uuid.uuid4().hex}",
+                    "object": "event",
+                    "type": "checkout.session.completed",
+                    "data": {
+                        "object": {
+                            "id": session_id,
+                            "object": "checkout.session",
+                            "metadata": {"borrowing_id": borrowing_id},
+                        }
+                    },
+                },
+            )
+            for session_id, borrowing_id in payments
+        ]
+
+
+class BorrowingReturn(Scenario):
+    name = "borrowing_return"
+    stateful = True
+
+    def calls(self, ctx, count):
+        calls = []
+        while ctx.created and len(calls) < count:
+            borrowing_id, token = ctx.created.popleft()
+            calls.append(
+                Call("POST", f"/api/borrowings/{borrowing_id}/return/", token=token)
+            )
+        return calls
+
+
+SCENARIOS = [
+    BookList(),
+    BookSearch(),
+    PaymentList(),
+    BorrowingCreate(),
+    StripeWebhook(),
+    BorrowingReturn(),
+]
+
+
+def build_context(users=50):
+    user_list = list(bench_users().order_by("id")[:users])
+    if not user_list:
+        raise RuntimeError("No benchmark data; run seed_benchmark_data first.")
+    return Context(
+        tokens={user.id: str(AccessToken.for_user(user)) for user in user_list},
+        book_ids=list(Book.objects.order_by("id").values_list("id", flat=True)),
+    )
+
+
+def run_scenario(transport, scenario, ctx, requests, warmup, concurrency):
+    if warmup and not scenario.stateful:
+        for call in scenario.calls(ctx, warmup):
+            transport.send(call)
+
+    calls = scenario.calls(ctx, requests)
+    lock = threading.Lock()
+    latencies = []
+    errors = 0
+
+    def execute(call):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            status, content = transport.send(call)
+        except Exception as e:
+            logger.warning(f"{scenario.name}: {call.method} {call.path} failed: {e}")
+            status, content = None, b""
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if status not in scenario.ok_statuses:
+                errors += 1
+        scenario.done(ctx, call, status, content)
+
+    def worker(share):
+        try:
+            for call in share:
+                execute(call)
+        finally:
+            # Each thread has its own database connection
+            connections.close_all()
+
+    threads = [
+        threading.Thread(target=worker, args=(calls[offset::concurrency],))
+        for offset in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(base_url=None, requests=200, warmup=20, concurrency=1, only=None):
+    """Run the scenarios and return a JSON-serialisable report."""
+    transport = HttpTransport(base_url) if base_url else InProcessTransport()
+    scenarios = [s for s in SCENARIOS if not only or s.name in only]
+
+    with ExitStack() as stack:
+        if not base_url:
+            stack.enter_context(
+                override_settings(
+                    STRIPE_FAKE=True,
+                    STRIPE_ASYNC_CHECKOUT=False,
+                    ALLOWED_HOSTS=["*"],
+                )
+            )
+            # Throttle classes are bound to views at import time
+            stack.enter_context(mock.patch.object(APIView, "throttle_classes", []))
+            eager = celery_app.conf.task_always_eager
+            celery_app.conf.task_always_eager = True
+            stack.callback(setattr, celery_app.conf, "task_always_eager", eager)
+
+        ctx = build_context()
+        results = {
+            scenario.name: run_scenario(
+                transport, scenario, ctx, requests, warmup, concurrency
+            )
+            for scenario in scenarios
+        }
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": timezone.now().isoformat(),
+            "transport": transport.name,
+            "concurrency": concurrency,
+            "requests_per_scenario": requests,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": settings.DATABASES["default"]["ENGINE"].rsplit(".", 1)[-1],
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current):
+    """Rows of (scenario, metric, baseline, current, change %) for two reports."""
+    rows = []
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        for metric, old, new in (
+            ("rps", before["rps"], result["rps"]),
+            ("p50_ms", before["latency_ms"]["p50"], result["latency_ms"]["p50"]),
+            ("p95_ms", before["latency_ms"]["p95"], result["latency_ms"]["p95"]),
+        ):
+            change = round((new - old) / old * 100, 1) if old and new else None
+            rows.append((name, metric, old, new, change))
+    return rows
@@ -0,0 +1,158 @@
+"""
+Deterministic benchmark dataset: books, users, and a year of borrowing and
+payment history, written with `bulk_create` in batches.
+
+Meant for a scratch database; `reset=True` deletes every book, borrowing
+and payment plus previously seeded users.
+"""
+
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from books.models import Book
+from borrowings.models import Borrowing
+from payments.models import Payment
+from payments.services import FINE_MULTIPLIER
+from stats.services import reconcile_stats
+from users.models import User
+
+USER_DOMAIN = "bench.example"
+PASSWORD = "bench-password"
+BATCH_SIZE = 1000
+
+WORDS = (
+    "river night garden shadow empire winter silent glass iron crown "
+    "ocean forest memory golden broken hidden lost last city storm "
+    "children secret stone fire house road star summer letter war"
+).split()
+SURNAMES = (
+    "Smith Johnson Brown Taylor Wilson Davies Evans Thomas Roberts Walker "
+    "Wright Green Hall Wood Clarke Turner Hill Moore Cooper King"
+).split()
+
+
+def bench_users():
+    return User.objects.filter(email__endswith=f"@{USER_DOMAIN}")
+
+
+@transaction.atomic
+def reset_data():
+    Payment.objects.all().delete()
+    Borrowing.objects.all().delete()
+    Book.objects.all().delete()
+    bench_users().delete()
+
+
+def seed_data(books=2000, users=200, borrowings=20000, seed=42):
+    """Create the dataset and return the number of rows of each kind."""
+    rng = random.Random(seed)
+    today = timezone.now().date()
+
+    Book.objects.bulk_create(
+        (
+            Book(
+                title=" ".join(rng.sample(WORDS, rng.randint(2, 4))).title(),
+                author=f"{rng.choice(WORDS).title()} {rng.choice(SURNAMES)}",
+                cover=rng.choice(Book.CoverType.values),
+                inventory=rng.randint(20, 60),
+                daily_fee=f"{rng.randint(50, 500) / 100:.2f}",
+            )
+            for _ in range(books)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        (
+            User(email=f"user-{i}@{USER_DOMAIN}", password=password)
+            for i in range(users)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    book_rows = list(Book.objects.values_list("id", "daily_fee"))
+    user_ids = list(bench_users().values_list("id", flat=True))
+
+    # A few heavy readers, a long tail of occasional ones
+    weights = [1 / (rank + 1) for rank in range(len(user_ids))]
+    history = []
+    for _ in range(borrowings):
+        book_id, daily_fee = rng.choice(book_rows)
+        borrow_date = today - timezone.timedelta(days=rng.randint(1, 365))
+        booked_days = rng.randint(3, 21)
+        expected = borrow_date + timezone.timedelta(days=booked_days)
+        roll = rng.random()
+        if roll < 0.05:
+            status, actual = Borrowing.BorrowingStatus.CANCELED, None
+        elif roll < 0.15 or expected >= today:
+            status, actual = Borrowing.BorrowingStatus.BORROWED, None
+        else:
+            status = Borrowing.BorrowingStatus.RETURNED
+            actual = min(today, expected + timezone.timedelta(days=rng.randint(-3, 6)))
+        history.append(
+            (
+                Borrowing(
+                    book_id=book_id,
+                    user_id=rng.choices(user_ids, weights)[0],
+                    borrow_date=(
+                        None
+                        if status == Borrowing.BorrowingStatus.CANCELED
+                        else borrow_date
+                    ),
+                    expected_return_date=expected,
+                    actual_return_date=actual,
+                    status=status,
+                ),
+                daily_fee,
+                booked_days,
+            )
+        )
+    Borrowing.objects.bulk_create(
+        (borrowing for borrowing, _, _ in history), batch_size=BATCH_SIZE
+    )
+
+    payments = []
+    for index, (borrowing, daily_fee, booked_days) in enumerate(history):
+        paid = borrowing.status != Borrowing.BorrowingStatus.CANCELED
+        payments.append(
+            Payment(
+                borrowing_id=borrowing.id,
+                type=Payment.TypeType.PAYMENT,
+                status=(
+                    Payment.StatusType.PAID if paid else Payment.StatusType.CANCELED
+                ),
+                money_to_pay=daily_fee * booked_days,
+                session_id=f"cs_bench_{index}",
+                paid_at=timezone.now() if paid else None,
+            )
+        )
+        if borrowing.actual_return_date is None:
+            continue
+        overdue = (borrowing.actual_return_date - borrowing.expected_return_date).days
+        if overdue > 0:
+            payments.append(
+                Payment(
+                    borrowing_id=borrowing.id,
+                    type=Payment.TypeType.FINE,
+                    status=Payment.StatusType.PAID,
+                    money_to_pay=daily_fee * overdue * FINE_MULTIPLIER,
+                    session_id=f"cs_bench_fine_{index}",
+                    paid_at=timezone.now(),
+                )
+            )
+    Payment.objects.bulk_create(payments, batch_size=BATCH_SIZE)
+
+    reconcile_stats()
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    return {
+        "books": books,
+        "users": users,
+        "borrowings": borrowings,
+        "payments": len(payments),
+    }
@@ -0,0 +1,115 @@
+"""
+Compare serving profiles under the same load.
+
+Each profile starts a server as a subprocess on a free local port, waits
+for /api/health/, runs the read-only benchmark scenarios against it over
+HTTP and shuts it down. The servers share this process's database and
+environment, with Stripe faked and throttling lifted.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+from django.conf import settings
+
+from config.benchmarks.runner import run_benchmarks
+
+READ_SCENARIOS = ("books_list", "books_search", "payments_list")
+
+# name -> (command, extra environment); "{port}" is filled in
+PROFILES = {
+    "runserver": (
+        [sys.executable, "manage.py", "runserver", "--noreload", "127.0.0.1:{port}"],
+        {"DB_CONN_MAX_AGE": "0"},
+    ),
+    "gunicorn-wsgi-no-persist": (
+        ["gunicorn", "-c", "gunicorn.conf.py"],
+        {
+            "DJANGO_SETTINGS_MODULE": "config.settings_production",
+            "SERVER_MODE": "wsgi",
+            "DB_CONN_MAX_AGE": "0",
+        },
+    ),
+    "gunicorn-wsgi": (
+        ["gunicorn", "-c", "gunicorn.conf.py"],
+        {
+            "DJANGO_SETTINGS_MODULE": "config.settings_production",
+            "SERVER_MODE": "wsgi",
+            "DB_CONN_MAX_AGE": "60",
+        },
+    ),
+    "gunicorn-asgi": (
+        ["gunicorn", "-c", "gunicorn.conf.py"],
+        {
+            "DJANGO_SETTINGS_MODULE": "config.settings_production",
+            "SERVER_MODE": "asgi",
+        },
+    ),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_healthy(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/api/health/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become healthy")
+
+
+def benchmark_profile(name, requests, concurrency, workers, threads):
+    command, extra_env = PROFILES[name]
+    port = free_port()
+    env = {
+        **os.environ,
+        **extra_env,
+        "STRIPE_FAKE": "True",
+        "API_THROTTLE_ANON": "1000000/minute",
+        "API_THROTTLE_USER": "1000000/minute",
+        "DJANGO_ALLOWED_HOSTS": "127.0.0.1,localhost",
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+        "WEB_CONCURRENCY": str(workers),
+        "GUNICORN_THREADS": str(threads),
+        "GUNICORN_MAX_REQUESTS": "0",
+    }
+    process = subprocess.Popen(
+        [part.format(port=port) for part in command],
+        cwd=settings.BASE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_healthy(base_url, process)
+        return run_benchmarks(
+            base_url=base_url,
+            requests=requests,
+            concurrency=concurrency,
+            only=READ_SCENARIOS,
+        )
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def benchmark_serving(profiles, requests=500, concurrency=8, workers=2, threads=4):
+    return {
+        name: benchmark_profile(name, requests, concurrency, workers, threads)
+        for name in profiles
+    }
@@ -0,0 +1,37 @@
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from config.benchmarks.runner import compare, percentile, run_benchmarks
+from config.benchmarks.seed import seed_data
+from payments.models import Payment
+
+
+class BenchmarkSuiteTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        seed_data(books=30, users=5, borrowings=100)
+
+    def test_runs_every_scenario_and_reports_percentiles(self):
+        report = run_benchmarks(requests=6, warmup=2, concurrency=2)
+
+        self.assertEqual(report["meta"]["transport"], "in-process")
+        for name, result in report["results"].items():
+            self.assertEqual(result["errors"], 0, name)
+            self.assertEqual(result["requests"], 6, name)
+            self.assertLessEqual(
+                result["latency_ms"]["p50"], result["latency_ms"]["p99"]
+            )
+        # Sessions opened by borrowing_create were completed by the webhook
+        self.assertFalse(
+            Payment.objects.filter(status=Payment.StatusType.PENDING).exists()
+        )
+
+        rows = compare(report, report)
+        self.assertTrue(rows)
+        self.assertTrue(all(change in (0.0, None) for *_, change in rows))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(values, 1.0), 100)
@@ -1,10 +1,27 @@
+import logging
 import os
+
 from celery import Celery
+from celery.signals import worker_init
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
+logger = logging.getLogger(__name__)
+
 app = Celery("library_service")
 
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+
+@worker_init.connect
+def check_shared_cache(**kwargs):
+    # Tasks invalidate the catalogue cache the web processes read
+    from config.notifications.telegram import cache_is_shared
+
+    if not cache_is_shared():
+        logger.error(
+            "The worker uses a process-local cache: catalogue invalidations and "
+            "Telegram queueing will not reach the web processes. Set CACHE_URL."
+        )
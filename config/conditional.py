@@ -0,0 +1,107 @@
+"""
+Conditional GET (ETag / Last-Modified) for list and detail endpoints.
+
+Validators come from one aggregate query, `MAX(updated_at)` and
+`COUNT(*)` over the filtered queryset, so a client whose copy is current
+gets `304 Not Modified` without the page query or serialization. The
+count makes deletions change the ETag; the full path makes every page,
+filter and `expand` variant validate separately.
+"""
+
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def get_validators(request, queryset, related=()):
+    """
+    ETag and Last-Modified (a timestamp, or None when empty) of a queryset.
+
+    `related` lists relation paths whose `updated_at` also shows in the
+    representation, e.g. the book of an expanded borrowing.
+    """
+    aggregates = {"count": Count("pk"), "updated_at": Max("updated_at")}
+    for index, path in enumerate(related):
+        aggregates[f"related_{index}"] = Max(f"{path}__updated_at")
+    values = queryset.order_by().aggregate(**aggregates)
+
+    count = values.pop("count")
+    modified = [value for value in values.values() if value is not None]
+    last_modified = max(modified).timestamp() if modified else None
+    key = "|".join(
+        [request.get_full_path(), str(count)]
+        + [value.isoformat() if value else "" for value in values.values()]
+    )
+    return quote_etag(hashlib.md5(key.encode("utf-8")).hexdigest()), last_modified
+
+
+def not_modified(request, etag, last_modified):
+    """A 304 response when the request's validators match, else None."""
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified) if last_modified is not None else None,
+    )
+
+
+def set_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet mixin answering conditional list and detail GETs with 304.
+
+    `conditional_related` maps an expandable name to the relation whose
+    `updated_at` is folded into the validators when it is expanded. A
+    response expanding a relation without one (e.g. a user) cannot be
+    validated and is served without validators.
+    """
+
+    conditional_related = {}
+
+    def get_conditional_related(self):
+        """Relations to fold into the validators, or None if one is untracked."""
+        expand = getattr(self, "get_expand", lambda: ())()
+        if any(name not in self.conditional_related for name in expand):
+            return None
+        return [self.conditional_related[name] for name in expand]
+
+    def conditional_get(self, queryset, build):
+        """Return 304 if the client's copy of `queryset` is current, else `build()`."""
+        related = self.get_conditional_related()
+        if self.request.method not in ("GET", "HEAD") or related is None:
+            return build()
+        etag, last_modified = get_validators(self.request, queryset, related)
+        response = not_modified(self.request, etag, last_modified)
+        if response is None:
+            response = build()
+            if response.status_code != 200:
+                return response
+        return set_validators(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_get(
+            self.filter_queryset(self.get_queryset()),
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        def build():
+            return super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            # Malformed lookup value: let `get_object` answer 404
+            return build()
+        return self.conditional_get(queryset, build)
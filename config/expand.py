@@ -0,0 +1,63 @@
+from rest_framework.exceptions import ValidationError
+
+
+class ExpandableSerializerMixin:
+    """
+    Serializer mixin replacing related primary keys with nested objects.
+
+    `expandable_fields` maps a field name to the serializer used when that
+    name is listed in `context["expand"]`. The related rows must already be
+    loaded (see `ExpandViewMixin`) to keep the query count constant.
+    """
+
+    expandable_fields = {}
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for name in self.context.get("expand", ()):
+            serializer_class = self.expandable_fields.get(name)
+            # Skipped when a sparse fieldset left the field out
+            if serializer_class is not None and name in data:
+                data[name] = serializer_class(
+                    getattr(instance, name), context=self.context
+                ).data
+        return data
+
+
+class ExpandViewMixin:
+    """
+    ViewSet mixin handling the `?expand=a,b` query param.
+
+    `expand_related` maps each expandable name to the `select_related`
+    path loaded for it, so expanded lists cost a single joined query.
+    """
+
+    expand_query_param = "expand"
+    expand_related = {}
+
+    def get_expand(self):
+        if not hasattr(self, "_expand"):
+            value = self.request.query_params.get(self.expand_query_param, "")
+            names = [name.strip() for name in value.split(",") if name.strip()]
+            unknown = set(names) - set(self.expand_related)
+            if unknown:
+                raise ValidationError(
+                    {
+                        self.expand_query_param: (
+                            f"Cannot expand {sorted(unknown)}; "
+                            f"choose from {sorted(self.expand_related)}."
+                        )
+                    }
+                )
+            self._expand = tuple(names)
+        return self._expand
+
+    def select_expanded(self, queryset):
+        related = [self.expand_related[name] for name in self.get_expand()]
+        return queryset.select_related(*related) if related else queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request is not None:
+            context["expand"] = self.get_expand()
+        return context
@@ -0,0 +1,19 @@
+"""Serializer fields shared by the apps."""
+
+from rest_framework import serializers
+
+
+class CommaSeparatedListField(serializers.ListField):
+    """A ListField whose query string values may be comma-separated."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [data]
+        if isinstance(data, list):
+            data = [
+                item
+                for value in data
+                for item in (value.split(",") if isinstance(value, str) else [value])
+                if item != ""
+            ]
+        return super().to_internal_value(data)
@@ -0,0 +1,13 @@
+from django.db import connection
+from django.db.utils import DatabaseError
+from django.http import JsonResponse
+
+
+def health(request):
+    """Liveness/readiness probe: 200 when the database answers, 503 otherwise."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except DatabaseError:
+        return JsonResponse({"status": "unavailable"}, status=503)
+    return JsonResponse({"status": "ok"})
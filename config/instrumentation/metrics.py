@@ -0,0 +1,164 @@
+"""
+In-process Prometheus metrics.
+
+Each process (web worker, Celery worker) keeps its own counters and
+histograms, as the Prometheus client does without multiprocess mode;
+scrape every process, or aggregate them with PromQL. Nothing is recorded
+unless METRICS_ENABLED is set.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, labels)} {value}"
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Counter):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket counts, then sum and count
+                state = self._values[labels] = [0] * len(self.buckets) + [0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {labels: list(state) for labels, state in self._values.items()}
+        names = self.labels + ("le",)
+        for labels, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket"
+                    f"{_format_labels(names, labels + (bound,))} {cumulative}"
+                )
+            yield (
+                f"{self.name}_bucket{_format_labels(names, labels + ('+Inf',))} "
+                f"{state[-1]}"
+            )
+            label_text = _format_labels(self.labels, labels)
+            yield f"{self.name}_sum{label_text} {state[-2]}"
+            yield f"{self.name}_count{label_text} {state[-1]}"
+
+
+REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP responses by view and status.",
+    ("view", "method", "status"),
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by view.", ("view", "method")
+)
+DB_QUERIES = Histogram(
+    "db_queries_per_request",
+    "SQL queries run per request.",
+    ("view",),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+DB_QUERY_TIME = Counter(
+    "db_query_seconds_total", "Time spent in SQL queries by view.", ("view",)
+)
+EXTERNAL_LATENCY = Histogram(
+    "external_call_duration_seconds",
+    "Outbound call latency by service and operation.",
+    ("service", "operation"),
+)
+EXTERNAL_ERRORS = Counter(
+    "external_call_errors_total",
+    "Outbound calls that raised, by service and operation.",
+    ("service", "operation"),
+)
+
+REGISTRY = (
+    REQUESTS,
+    REQUEST_LATENCY,
+    DB_QUERIES,
+    DB_QUERY_TIME,
+    EXTERNAL_LATENCY,
+    EXTERNAL_ERRORS,
+)
+
+
+@contextmanager
+def timed_call(service, operation):
+    """Record the latency (and failure) of an outbound call."""
+    if not settings.METRICS_ENABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EXTERNAL_ERRORS.inc(service, operation)
+        raise
+    finally:
+        EXTERNAL_LATENCY.observe(time.perf_counter() - start, service, operation)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    for metric in REGISTRY:
+        metric.reset()
@@ -0,0 +1,92 @@
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from config.instrumentation import metrics
+
+
+class QueryTimer:
+    """`execute_wrapper` hook counting queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+@contextmanager
+def timed_queries(timer):
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        yield
+
+
+def open_timed_queries(timer):
+    """Enter `timed_queries` in this thread; close the stack in it as well."""
+    stack = ExitStack()
+    stack.enter_context(timed_queries(timer))
+    return stack
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status and SQL usage of every request by view name.
+
+    Removed from the middleware chain at startup when METRICS_ENABLED is
+    off, so it costs nothing then. Async-capable, so under ASGI it does
+    not push coroutine views onto a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with timed_queries(timer):
+            response = self.get_response(request)
+        self.record(request, response, timer, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        # Connections are per thread and the ORM runs in the request's
+        # thread-sensitive executor, so the wrappers go on its connections
+        stack = await sync_to_async(open_timed_queries)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.record(request, response, timer, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, timer, duration):
+        match = request.resolver_match
+        # Route names keep label cardinality bounded, unlike raw paths
+        view = match.view_name if match else "unmatched"
+        metrics.REQUESTS.inc(view, request.method, str(response.status_code))
+        metrics.REQUEST_LATENCY.observe(duration, view, request.method)
+        metrics.DB_QUERIES.observe(timer.count, view)
+        metrics.DB_QUERY_TIME.inc(view, amount=timer.duration)
@@ -0,0 +1,104 @@
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from books.models import Book
+from config.instrumentation import metrics
+from users.models import User
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN="scrape-token")
+class MetricsMiddlewareTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        Book.objects.create(
+            title="Test Book", author="Test Author", inventory=1, daily_fee="1.00"
+        )
+        # A fresh client builds its middleware chain under the overridden settings
+        self.client = APIClient()
+        self.url = reverse("metrics")
+
+    def scrape(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="Bearer scrape-token")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        return response.content.decode("utf-8")
+
+    def test_records_latency_status_and_queries_per_view(self):
+        self.client.get(reverse("book:book-list"))
+
+        text = self.scrape()
+        self.assertIn(
+            'http_requests_total{view="book:book-list",method="GET",status="200"} 1',
+            text,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{view="book:book-list",method="GET"} 1',
+            text,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_bucket{view="book:book-list",method="GET",le="+Inf"} 1',
+            text,
+        )
+        self.assertIn('db_queries_per_request_count{view="book:book-list"} 1', text)
+
+    def test_outbound_calls_are_timed(self):
+        with self.assertRaises(ValueError):
+            with metrics.timed_call("stripe", "checkout.session.create"):
+                raise ValueError("boom")
+
+        text = self.scrape()
+        self.assertIn(
+            'external_call_errors_total{service="stripe",operation="checkout.session.create"} 1',
+            text,
+        )
+
+    def test_scrapes_are_not_throttled(self):
+        anon_rate = int(
+            settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]["anon"].split("/")[0]
+        )
+        for _ in range(anon_rate + 1):
+            self.scrape()
+
+    def test_requires_token_or_staff(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(
+            user=User.objects.create(email="staff@example.com", is_staff=True)
+        )
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    async def test_records_async_views(self):
+        response = await self.async_client.post(
+            reverse("payments:async-stripe-webhook"),
+            "not json",
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertIn(
+            'http_requests_total{view="payments:async-stripe-webhook",method="POST",status="400"} 1',
+            metrics.render(),
+        )
+
+        await self.async_client.get(reverse("book:book-list"))
+        queries = re.search(
+            r'db_queries_per_request_sum\{view="book:book-list"\} (\S+)',
+            metrics.render(),
+        )
+        self.assertGreater(float(queries.group(1)), 0)
+
+
+class DisabledMetricsTests(SimpleTestCase):
+    def test_nothing_recorded_when_disabled(self):
+        metrics.reset()
+        with metrics.timed_call("telegram", "sendMessage"):
+            pass
+        self.assertNotIn("telegram", metrics.render())
@@ -0,0 +1,51 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.permissions import BasePermission
+from rest_framework.renderers import BaseRenderer
+from rest_framework.views import APIView
+
+from config.instrumentation import metrics
+from config.permissions import IsStaffUser
+
+
+class HasMetricsToken(BasePermission):
+    """Lets a scraper in with `Authorization: Bearer <METRICS_TOKEN>`."""
+
+    def has_permission(self, request, view):
+        token = settings.METRICS_TOKEN
+        header = request.META.get("HTTP_AUTHORIZATION", "")
+        return bool(token) and hmac.compare_digest(header, f"Bearer {token}")
+
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = "text/plain"
+    format = "prometheus"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data if isinstance(data, str) else str(data)
+
+
+class PrometheusMetricsView(APIView):
+    """
+    Request, SQL and outbound-call metrics of this process in Prometheus
+    text format. Open to staff users and to scrapers holding METRICS_TOKEN.
+    """
+
+    # The scrape token is not a JWT, so skip authentication for it
+    permission_classes = [HasMetricsToken | IsStaffUser]
+    renderer_classes = [PrometheusRenderer]
+    # Token scrapers count as anonymous; the anon rate would lock them out
+    throttle_classes = []
+
+    def get_authenticators(self):
+        if HasMetricsToken().has_permission(self.request, self):
+            return []
+        return super().get_authenticators()
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
@@ -1,27 +1,97 @@
-# payments/tasks.py або notifications/tasks.py
+import logging
 
-from celery import shared_task
 import requests
+from celery import shared_task
 from django.conf import settings
 
+from config.notifications import telegram
+
+logger = logging.getLogger(__name__)
+
+
+def queue_telegram_message(message):
+    """
+    Queue a message for Telegram.
+
+    Messages queued within TELEGRAM_COALESCE_WINDOW seconds are sent
+    together by a single flush. A process-local cache cannot hold the queue
+    for the flush task running in another process, so each message is then
+    delivered on its own.
+    """
+    if not telegram.cache_is_shared():
+        logger.error(
+            "The cache is process-local, Telegram messages are not coalesced. "
+            "Set CACHE_URL for every web and worker process."
+        )
+        deliver_telegram_message.delay(message)
+        return
+    if telegram.push(message):
+        flush_telegram_messages.apply_async(countdown=settings.TELEGRAM_COALESCE_WINDOW)
+
 
 @shared_task
-def send_telegram_payment_notification(data: dict):
+def flush_telegram_messages():
+    for text in telegram.coalesce(telegram.drain()):
+        deliver_telegram_message.delay(text)
+    # Messages behind a missing one wait for the next flush
+    if telegram.pending() and telegram.claim_flush():
+        flush_telegram_messages.apply_async(countdown=settings.TELEGRAM_COALESCE_WINDOW)
+
+
+@shared_task(bind=True, max_retries=settings.TELEGRAM_MAX_RETRIES)
+def deliver_telegram_message(self, message):
+    if not settings.TELEGRAM_BOT_TOKEN:
+        logger.warning("TELEGRAM_BOT_TOKEN is not set, dropping notification.")
+        return
+
     try:
-        message = (
-            f"💸 *Payment success*\n"
-            f"User: `{data['user']}`\n"
-            f"Type: `{data['type']}`\n"
-            f"Sum: `${data['amount']}`\n"
-            f"Borrow ID: `{data['borrowing_id']}`\n"
-            f"Book: *{data['book']}*"
-        )
-        url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-        payload = {
-            "chat_id": settings.TELEGRAM_CHAT_ID,
-            "text": message,
-            "parse_mode": "Markdown",
-        }
-        requests.post(url, data=payload)
-    except Exception as e:
-        print(f"[Telegram Celery task error]: {e}")
+        telegram.send_message(message)
+    except telegram.TelegramRateLimited as exc:
+        telegram.record("rate_limited")
+        countdown = exc.retry_after
+    except requests.RequestException as exc:
+        logger.warning(f"Telegram delivery failed: {exc}")
+        countdown = settings.TELEGRAM_RETRY_BACKOFF * 2**self.request.retries
+    else:
+        telegram.record("sent")
+        return
+
+    if self.request.retries >= self.max_retries:
+        telegram.record("failed")
+        logger.error("Telegram delivery failed, giving up after retries.")
+        return
+    telegram.record("retried")
+    raise self.retry(countdown=countdown)
+
+
+def send_telegram_payment_notification(data: dict):
+    message = (
+        f"💸 *Payment success*\n"
+        f"User: `{data['user']}`\n"
+        f"Type: `{data['type']}`\n"
+        f"Sum: `${data['amount']}`\n"
+        f"Borrow ID: `{data['borrowing_id']}`\n"
+        f"Book: *{data['book']}*"
+    )
+    queue_telegram_message(message)
+
+
+def send_telegram_overdue_notification(data: dict):
+    message = (
+        f"⏰ *Overdue borrowings*\n"
+        f"Date: `{data['date']}`\n"
+        f"Overdue: `{data['overdue']}`\n"
+        f"Accrued fines: `${data['accrued_fines']}`"
+    )
+    queue_telegram_message(message)
+
+
+def send_telegram_hold_notification(data: dict):
+    message = (
+        f"📚 *Hold allocated*\n"
+        f"User: `{data['user']}`\n"
+        f"Book: *{data['book']}*\n"
+        f"Borrow ID: `{data['borrowing_id']}`\n"
+        f"Payment ID: `{data['payment_id']}`"
+    )
+    queue_telegram_message(message)
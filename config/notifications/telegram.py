@@ -0,0 +1,236 @@
+"""
+Telegram delivery primitives shared by the notification tasks.
+
+- One pooled `requests.Session` per worker process (keep-alive, bounded pool).
+- A per-process token bucket keeps us under Telegram's rate limits.
+- Messages are queued in the cache and coalesced by a delayed flush task.
+- Delivery counters are kept in the cache so every worker reports into them.
+
+Both need a cache shared by the web and worker processes (`CACHE_URL`);
+with a process-local cache messages are sent one by one instead.
+"""
+
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from requests.adapters import HTTPAdapter
+
+from config.instrumentation.metrics import timed_call
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+QUEUE_HEAD_KEY = "telegram:queue:head"
+QUEUE_TAIL_KEY = "telegram:queue:tail"
+FLUSH_SCHEDULED_KEY = "telegram:queue:flush-scheduled"
+DRAIN_LOCK_KEY = "telegram:queue:drain-lock"
+# (position, first seen) of the missing message the drain is waiting for
+QUEUE_GAP_KEY = "telegram:queue:gap"
+METRICS = ("queued", "sent", "failed", "retried", "rate_limited")
+
+
+class TelegramRateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Telegram rate limit hit, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `capacity`."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def acquire(self):
+        """Take a token, sleeping until one is available. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+
+_session = None
+_bucket = None
+
+
+def get_session():
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=settings.TELEGRAM_POOL_SIZE
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
+
+def get_bucket():
+    global _bucket
+    if _bucket is None:
+        _bucket = TokenBucket(
+            settings.TELEGRAM_RATE_LIMIT, settings.TELEGRAM_RATE_BURST
+        )
+    return _bucket
+
+
+def cache_is_shared():
+    """False when the cache lives in this process only and no worker sees it."""
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+
+def record(metric, amount=1):
+    key = f"telegram:metrics:{metric}"
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, amount)
+
+
+def pending():
+    return (cache.get(QUEUE_TAIL_KEY) or 0) - (cache.get(QUEUE_HEAD_KEY) or 0)
+
+
+def get_metrics():
+    values = cache.get_many([f"telegram:metrics:{metric}" for metric in METRICS])
+    metrics = {
+        metric: values.get(f"telegram:metrics:{metric}", 0) for metric in METRICS
+    }
+    metrics["pending"] = pending()
+    return metrics
+
+
+def send_message(message):
+    """POST one message through the pooled session, honouring the rate limit."""
+    get_bucket().acquire()
+    url = f"{settings.TELEGRAM_API_URL}/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
+    payload = {
+        "chat_id": settings.TELEGRAM_CHAT_ID,
+        "text": message,
+        "parse_mode": "Markdown",
+    }
+    with timed_call("telegram", "sendMessage"):
+        response = get_session().post(
+            url, data=payload, timeout=settings.TELEGRAM_TIMEOUT
+        )
+    if response.status_code == 429:
+        retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+        raise TelegramRateLimited(retry_after)
+    response.raise_for_status()
+
+
+def claim_flush():
+    """True when no flush is pending for the current window yet."""
+    # Expires on its own if the scheduled flush is lost
+    return cache.add(
+        FLUSH_SCHEDULED_KEY, True, timeout=settings.TELEGRAM_COALESCE_WINDOW * 10
+    )
+
+
+def push(message):
+    """
+    Append a message to the coalescing queue.
+
+    Returns True when the caller should schedule a flush (see `claim_flush`).
+    """
+    cache.add(QUEUE_TAIL_KEY, 0, timeout=None)
+    position = cache.incr(QUEUE_TAIL_KEY)
+    cache.set(f"telegram:queue:{position}", message, timeout=None)
+    record("queued")
+    return claim_flush()
+
+
+def _gap_expired(position):
+    """Whether the message at `position` has been missing for too long."""
+    now = time.time()
+    gap = cache.get(QUEUE_GAP_KEY)
+    if gap is None or gap[0] != position:
+        cache.set(QUEUE_GAP_KEY, (position, now), timeout=None)
+        return False
+    if now - gap[1] < settings.TELEGRAM_QUEUE_GAP_TIMEOUT:
+        return False
+    logger.error(f"Telegram queue message {position} never arrived, skipping it.")
+    return True
+
+
+def drain():
+    """
+    Pop queued messages, oldest first, up to the first missing one.
+
+    A position whose message is not stored (a concurrent `push` between
+    its increment and its write, or an evicted key) stops the drain, and
+    the flush task retries it. Once it has been missing for
+    TELEGRAM_QUEUE_GAP_TIMEOUT seconds it is skipped.
+    """
+    if not cache.add(DRAIN_LOCK_KEY, True, timeout=60):
+        return []
+    try:
+        cache.delete(FLUSH_SCHEDULED_KEY)
+        head = cache.get(QUEUE_HEAD_KEY) or 0
+        tail = cache.get(QUEUE_TAIL_KEY) or 0
+        keys = [f"telegram:queue:{position}" for position in range(head + 1, tail + 1)]
+        values = cache.get_many(keys)
+
+        drained = 0
+        for key in keys:
+            if key not in values and not _gap_expired(head + drained + 1):
+                break
+            drained += 1
+        if not drained:
+            return []
+
+        keys = keys[:drained]
+        cache.set(QUEUE_HEAD_KEY, head + drained, timeout=None)
+        cache.delete_many(keys)
+        return [values[key] for key in keys if key in values]
+    finally:
+        cache.delete(DRAIN_LOCK_KEY)
+
+
+def coalesce(messages):
+    """Join messages into as few Telegram-sized texts as possible."""
+    separator = "\n\n"
+    texts = []
+    current = ""
+    for message in messages:
+        message = message[:MAX_MESSAGE_LENGTH]
+        if (
+            current
+            and len(current) + len(separator) + len(message) > MAX_MESSAGE_LENGTH
+        ):
+            texts.append(current)
+            current = message
+        else:
+            current = f"{current}{separator}{message}" if current else message
+    if current:
+        texts.append(current)
+    return texts
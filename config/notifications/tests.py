@@ -0,0 +1,216 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from config.notifications import telegram
+from config.notifications.tasks import (
+    deliver_telegram_message,
+    flush_telegram_messages,
+    queue_telegram_message,
+)
+from users.models import User
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        body = parse_qs(self.rfile.read(length).decode("utf-8"))
+        server = self.server
+        server.requests.append(
+            {"path": self.path, "text": body["text"][0], "client": self.client_address}
+        )
+        status_code, payload = (
+            server.responses.pop(0) if server.responses else (200, {"ok": True})
+        )
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeTelegramServer:
+    """Local HTTP stand-in for the Telegram Bot API."""
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTelegramHandler)
+        # Queued (status, payload) responses; 200 once exhausted
+        self.server.responses = self.responses = []
+        self.server.requests = self.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TelegramPipelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        telegram._session = None
+        telegram._bucket = None
+        self.fake = FakeTelegramServer()
+        self.fake.start()
+        self.addCleanup(self.fake.stop)
+        self.requests = self.fake.requests
+        self.responses = self.fake.responses
+
+        settings_override = override_settings(
+            TELEGRAM_API_URL=self.fake.url,
+            TELEGRAM_BOT_TOKEN="token",
+            TELEGRAM_CHAT_ID="chat",
+            TELEGRAM_RATE_LIMIT=1000,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    @mock.patch("config.notifications.telegram.cache_is_shared", return_value=True)
+    @mock.patch("config.notifications.tasks.flush_telegram_messages.apply_async")
+    @mock.patch(
+        "config.notifications.tasks.deliver_telegram_message.delay",
+        side_effect=lambda message: deliver_telegram_message.apply(args=[message]),
+    )
+    def test_messages_in_one_window_are_sent_together(
+        self, deliver, schedule_flush, shared
+    ):
+        for i in range(3):
+            queue_telegram_message(f"event {i}")
+        schedule_flush.assert_called_once()
+
+        flush_telegram_messages.apply()
+
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.requests[0]["path"], "/bottoken/sendMessage")
+        self.assertEqual(self.requests[0]["text"], "event 0\n\nevent 1\n\nevent 2")
+        self.assertEqual(telegram.get_metrics()["pending"], 0)
+
+        queue_telegram_message("next window")
+        self.assertEqual(schedule_flush.call_count, 2)
+
+    @mock.patch("config.notifications.tasks.flush_telegram_messages.apply_async")
+    @mock.patch("config.notifications.tasks.deliver_telegram_message.delay")
+    def test_process_local_cache_is_not_used_as_queue(self, deliver, schedule_flush):
+        # The test settings use LocMemCache, as a worker without CACHE_URL does
+        with self.assertLogs("config.notifications.tasks", "ERROR"):
+            queue_telegram_message("event")
+
+        deliver.assert_called_once_with("event")
+        schedule_flush.assert_not_called()
+        self.assertEqual(telegram.get_metrics()["pending"], 0)
+
+    def test_failed_delivery_is_retried(self):
+        self.responses.append((500, {"ok": False}))
+        self.responses.append((429, {"ok": False, "parameters": {"retry_after": 3}}))
+
+        deliver_telegram_message.apply(args=["hello"])
+
+        self.assertEqual(len(self.requests), 3)
+        metrics = telegram.get_metrics()
+        self.assertEqual(metrics["sent"], 1)
+        self.assertEqual(metrics["retried"], 2)
+        self.assertEqual(metrics["rate_limited"], 1)
+
+    def test_gives_up_after_max_retries(self):
+        retries = deliver_telegram_message.max_retries
+        self.responses.extend([(500, {"ok": False})] * (retries + 1))
+
+        deliver_telegram_message.apply(args=["hello"])
+
+        self.assertEqual(len(self.requests), retries + 1)
+        self.assertEqual(telegram.get_metrics()["failed"], 1)
+
+    def test_connection_is_reused(self):
+        telegram.send_message("first")
+        telegram.send_message("second")
+
+        self.assertEqual(self.requests[0]["client"], self.requests[1]["client"])
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_waits_for_refill_once_burst_is_spent(self):
+        now = [0.0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        bucket = telegram.TokenBucket(
+            rate=2, capacity=2, clock=lambda: now[0], sleep=sleep
+        )
+
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertAlmostEqual(bucket.acquire(), 0.5)
+        self.assertAlmostEqual(now[0], 0.5)
+
+
+class TelegramQueueTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(3):
+            telegram.push(f"event {i}")
+        # The second push took its position but its write is not visible yet
+        self.missing = cache.get("telegram:queue:2")
+        cache.delete("telegram:queue:2")
+
+    def test_drain_stops_at_a_missing_message(self):
+        self.assertEqual(telegram.drain(), ["event 0"])
+        self.assertEqual(telegram.pending(), 2)
+
+        cache.set("telegram:queue:2", self.missing, timeout=None)
+        self.assertEqual(telegram.drain(), ["event 1", "event 2"])
+        self.assertEqual(telegram.pending(), 0)
+
+    @override_settings(TELEGRAM_QUEUE_GAP_TIMEOUT=0)
+    def test_message_missing_for_too_long_is_skipped(self):
+        self.assertEqual(telegram.drain(), ["event 0"])
+
+        with self.assertLogs("config.notifications.telegram", "ERROR"):
+            self.assertEqual(telegram.drain(), ["event 2"])
+        self.assertEqual(telegram.pending(), 0)
+
+    @mock.patch("config.notifications.tasks.flush_telegram_messages.apply_async")
+    @mock.patch("config.notifications.tasks.deliver_telegram_message.delay")
+    def test_flush_is_rescheduled_behind_a_missing_message(
+        self, deliver, schedule_flush
+    ):
+        flush_telegram_messages.apply()
+
+        deliver.assert_called_once_with("event 0")
+        schedule_flush.assert_called_once()
+
+
+class CoalesceTests(SimpleTestCase):
+    def test_splits_at_telegram_message_limit(self):
+        messages = ["a" * 3000, "b" * 3000, "c" * 10]
+        self.assertEqual(
+            telegram.coalesce(messages), ["a" * 3000, "b" * 3000 + "\n\n" + "c" * 10]
+        )
+
+
+class TelegramMetricsViewTests(APITestCase):
+    def test_staff_only(self):
+        url = reverse("notification-metrics")
+        user = User.objects.create(email="user@example.com")
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("sent", response.data)
@@ -0,0 +1,19 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from config.notifications import telegram
+from config.permissions import IsStaffUser
+
+
+class TelegramMetricsView(APIView):
+    """
+    Telegram delivery metrics (staff only).
+
+    Counts of queued, sent, failed, retried and rate-limited messages,
+    plus the number of messages waiting for the next flush.
+    """
+
+    permission_classes = [IsStaffUser]
+
+    def get(self, request):
+        return Response(telegram.get_metrics())
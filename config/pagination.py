@@ -0,0 +1,71 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination shared by the list endpoints.
+
+    - Pages are selected with `WHERE <key> > <position> ORDER BY <key> LIMIT n`
+      on an indexed, unique key, so there are no OFFSET scans and pages stay
+      stable while rows are inserted concurrently.
+    - The key defaults to `-id` (newest first); a view may override it by
+      declaring a `cursor_ordering` attribute.
+    - The default page size is `REST_FRAMEWORK["PAGE_SIZE"]`; the `page_size`
+      query param changes it per request (capped by `max_page_size`).
+    - `with_count=true` opts into a `count` of all matching rows; it is
+      omitted by default to avoid a `COUNT(*)` on every request.
+    """
+
+    ordering = "-id"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    count_query_param = "with_count"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if self.count_requested(request):
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def count_requested(self, request):
+        value = request.query_params.get(self.count_query_param, "")
+        return value.lower() in ["true", "1"]
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, "cursor_ordering", None)
+        if ordering:
+            return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        return super().get_ordering(request, queryset, view)
+
+    def get_paginated_response(self, data):
+        payload = {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+        if self.count is not None:
+            payload = {"count": self.count, **payload}
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count"] = {
+            "type": "integer",
+            "example": 123,
+            "description": f"Only present when `{self.count_query_param}=true`.",
+        }
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append(
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Include the total number of matching rows.",
+                "schema": {"type": "boolean"},
+            }
+        )
+        return parameters
@@ -14,6 +14,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "drf_spectacular",
     "rest_framework",
     # Custom Apps
@@ -50,9 +52,12 @@ INSTALLED_APPS = [
     "books",
     "borrowings",
     "payments",
+    "stats",
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the chain
+    "config.instrumentation.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -94,10 +99,39 @@ DATABASES = {
         "HOST": os.getenv("POSTGRES_HOST", "db"),
         # "HOST": "localhost",
         "PORT": os.getenv("POSTGRES_PORT", "5432"),
+        # Seconds to keep a connection open across requests (0: per request)
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "0")),
+        # Ping a reused connection before a request so a dropped one is replaced
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
 
+# Cache
+# Redis (the Celery broker instance) when CACHE_URL is set, in-memory otherwise
+
+CACHE_URL = os.getenv("CACHE_URL")
+
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+BOOK_CACHE_TIMEOUT = int(os.getenv("BOOK_CACHE_TIMEOUT", "300"))
+
+# Rows per upsert / server-side cursor fetch for book import and export
+BOOK_TRANSFER_BATCH_SIZE = int(os.getenv("BOOK_TRANSFER_BATCH_SIZE", "1000"))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -147,10 +181,15 @@ REST_FRAMEWORK = {
         "rest_framework.throttling.AnonRateThrottle",
         "rest_framework.throttling.UserRateThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"anon": "10/day", "user": "30/day"},
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": os.getenv("API_THROTTLE_ANON", "10/day"),
+        "user": os.getenv("API_THROTTLE_USER", "30/day"),
+    },
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
+    "DEFAULT_PAGINATION_CLASS": "config.pagination.KeysetCursorPagination",
+    "PAGE_SIZE": int(os.getenv("API_PAGE_SIZE", "20")),
 }
 
 SIMPLE_JWT = {
@@ -161,13 +200,77 @@ SIMPLE_JWT = {
 
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+STRIPE_SUCCESS_URL = os.getenv("STRIPE_SUCCESS_URL", "http://localhost:8000/success/")
+STRIPE_CANCEL_URL = os.getenv("STRIPE_CANCEL_URL", "http://localhost:8000/cancel/")
+
+# Use the in-memory Stripe stand-in (payments/fake_stripe.py) instead of the API
+STRIPE_FAKE = os.getenv("STRIPE_FAKE", "False").lower() in ("true", "1")
+# Create checkout sessions in a Celery task instead of on the request thread
+STRIPE_ASYNC_CHECKOUT = os.getenv("STRIPE_ASYNC_CHECKOUT", "False").lower() in (
+    "true",
+    "1",
+)
+STRIPE_SESSION_MAX_RETRIES = int(os.getenv("STRIPE_SESSION_MAX_RETRIES", "5"))
+STRIPE_SESSION_RETRY_BACKOFF = int(os.getenv("STRIPE_SESSION_RETRY_BACKOFF", "2"))
+# Stripe events per reconciliation page (Stripe allows up to 100)
+STRIPE_RECONCILE_PAGE_SIZE = int(os.getenv("STRIPE_RECONCILE_PAGE_SIZE", "100"))
+# Seconds of history the first reconciliation run reads, and seconds before
+# the high-water mark every later run re-reads
+STRIPE_RECONCILE_LOOKBACK = int(os.getenv("STRIPE_RECONCILE_LOOKBACK", "86400"))
+STRIPE_RECONCILE_OVERLAP = int(os.getenv("STRIPE_RECONCILE_OVERLAP", "300"))
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", "5"))
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "4"))
+# Notifications queued within this many seconds are sent as one message
+TELEGRAM_COALESCE_WINDOW = int(os.getenv("TELEGRAM_COALESCE_WINDOW", "5"))
+# A queued message still missing after this many seconds is skipped
+TELEGRAM_QUEUE_GAP_TIMEOUT = int(os.getenv("TELEGRAM_QUEUE_GAP_TIMEOUT", "60"))
+# Token bucket: sustained messages per second and burst size, per worker
+TELEGRAM_RATE_LIMIT = float(os.getenv("TELEGRAM_RATE_LIMIT", "1"))
+TELEGRAM_RATE_BURST = int(os.getenv("TELEGRAM_RATE_BURST", "3"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "5"))
+TELEGRAM_RETRY_BACKOFF = int(os.getenv("TELEGRAM_RETRY_BACKOFF", "2"))
 
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 broker_connection_retry_on_startup = True
 
+CELERY_BEAT_SCHEDULE = {
+    "sweep-overdue-borrowings": {
+        "task": "borrowings.tasks.sweep_overdue_borrowings_task",
+        "schedule": crontab(hour=1, minute=0),
+    },
+    "reconcile-stats": {
+        "task": "stats.tasks.reconcile_stats_task",
+        "schedule": crontab(minute=30),
+    },
+    "expire-stale-borrowings": {
+        "task": "borrowings.tasks.expire_stale_borrowings_task",
+        "schedule": crontab(minute="*/10"),
+    },
+    "reconcile-stripe-events": {
+        "task": "payments.tasks.reconcile_stripe_events_task",
+        "schedule": crontab(minute="*/5"),
+    },
+}
+
+OVERDUE_SWEEP_CHUNK_SIZE = int(os.getenv("OVERDUE_SWEEP_CHUNK_SIZE", "1000"))
+# Seconds a new borrowing holds its copy while unpaid; its Stripe checkout
+# session expires then (Stripe accepts 1800 to 86400)
+BORROWING_PAYMENT_TIMEOUT = int(os.getenv("BORROWING_PAYMENT_TIMEOUT", "3600"))
+STALE_BORROWING_BATCH_SIZE = int(os.getenv("STALE_BORROWING_BATCH_SIZE", "500"))
+
+# Request / SQL / outbound-call metrics, exposed at /api/metrics/
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "False").lower() in ("true", "1")
+# Bearer token for Prometheus scrapers; staff JWTs work as well
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Rows fetched per server-side cursor round trip by the finance export
+FINANCE_EXPORT_CHUNK_SIZE = int(os.getenv("FINANCE_EXPORT_CHUNK_SIZE", "2000"))
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Library Service API",
     "DESCRIPTION": "Documentation for API for library management, loans, payments.",
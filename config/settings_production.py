@@ -0,0 +1,37 @@
+"""
+Production profile, on top of the base settings:
+
+    DJANGO_SETTINGS_MODULE=config.settings_production gunicorn -c gunicorn.conf.py
+
+DEBUG is off and database connections persist across requests (with a
+health check on reuse). Under SERVER_MODE=asgi connections default back to
+per-request, as Django recommends for async serving; put a pooler such as
+PgBouncer in front of Postgres there.
+"""
+
+import os
+
+from config.settings import *  # noqa: F401,F403
+from config.settings import BASE_DIR, DATABASES
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.getenv("DJANGO_ALLOWED_HOSTS", "localhost,127.0.0.1").split(",")
+
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+DATABASES = {
+    **DATABASES,
+    "default": {
+        **DATABASES["default"],
+        "CONN_MAX_AGE": int(
+            os.getenv("DB_CONN_MAX_AGE", "0" if SERVER_MODE == "asgi" else "60")
+        ),
+    },
+}
+
+STATIC_ROOT = BASE_DIR / "static"
+
+# TLS is terminated by the reverse proxy in front of gunicorn
+SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
+SESSION_COOKIE_SECURE = os.getenv("SECURE_COOKIES", "True").lower() in ("true", "1")
+CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
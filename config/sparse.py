@@ -0,0 +1,112 @@
+"""
+Sparse fieldsets and the compact (columnar) list format.
+
+- `?fields=a,b` keeps only the listed fields, `?omit=a,b` drops fields.
+  The model columns behind dropped fields are deferred with `.only()`.
+- `?compact=true` returns list pages as `columns` plus `rows` of values
+  instead of one object per row, so field names are sent once.
+"""
+
+from rest_framework.exceptions import ValidationError
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Serializer mixin taking `fields` / `omit` keyword arguments.
+
+    They apply to this serializer only, not to nested or expanded ones.
+    With `many=True` every child gets them.
+    """
+
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in omit or ():
+            self.fields.pop(name, None)
+
+
+def _parse_names(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class SparseFieldsViewMixin:
+    """
+    ViewSet mixin handling `?fields=`, `?omit=` and `?compact=` on lists.
+
+    The serializer must use `SparseFieldsSerializerMixin`; `get_queryset`
+    should pass its queryset through `select_sparse`. Expanded relations
+    (see `ExpandViewMixin`) keep their foreign key column.
+    """
+
+    fields_query_param = "fields"
+    omit_query_param = "omit"
+    compact_query_param = "compact"
+    sparse_actions = ("list",)
+
+    def get_sparse_fields(self):
+        """The serializer fields kept for this request, or None for all."""
+        if not hasattr(self, "_sparse_fields"):
+            self._sparse_fields = None
+            params = self.request.query_params
+            if self.action in self.sparse_actions and (
+                self.fields_query_param in params or self.omit_query_param in params
+            ):
+                available = list(self.get_serializer_class()().fields)
+                requested = {}
+                for param in (self.fields_query_param, self.omit_query_param):
+                    names = _parse_names(params.get(param, ""))
+                    unknown = set(names) - set(available)
+                    if unknown:
+                        raise ValidationError(
+                            {
+                                param: (
+                                    f"Unknown fields {sorted(unknown)}; "
+                                    f"choose from {available}."
+                                )
+                            }
+                        )
+                    requested[param] = names
+                fields = requested[self.fields_query_param] or available
+                omit = requested[self.omit_query_param]
+                self._sparse_fields = [
+                    name for name in available if name in fields and name not in omit
+                ]
+        return self._sparse_fields
+
+    def select_sparse(self, queryset):
+        """Defer the columns of fields left out of the response."""
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset
+        model = queryset.model
+        concrete = {field.name for field in model._meta.concrete_fields}
+        expanded = [
+            self.expand_related[name].split("__")[0]
+            for name in getattr(self, "get_expand", lambda: ())()
+        ]
+        columns = {model._meta.pk.name, *expanded}
+        columns.update(name for name in fields if name in concrete)
+        return queryset.only(*columns)
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            kwargs.setdefault("fields", fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def compact_requested(self):
+        value = self.request.query_params.get(self.compact_query_param, "")
+        return self.action in self.sparse_actions and value.lower() in ["true", "1"]
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.compact_requested():
+            results = response.data.pop("results")
+            columns = self.get_sparse_fields() or list(
+                self.get_serializer_class()().fields
+            )
+            response.data["columns"] = columns
+            response.data["rows"] = [[row[name] for name in columns] for row in results]
+        return response
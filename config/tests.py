@@ -0,0 +1,31 @@
+import importlib
+import os
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+
+class HealthCheckTests(TestCase):
+    def test_reports_database_ok(self):
+        response = self.client.get(reverse("health"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "ok"})
+
+
+class ProductionSettingsTests(SimpleTestCase):
+    def load(self, **env):
+        with mock.patch.dict(os.environ, env):
+            import config.settings_production as production
+
+            return importlib.reload(production)
+
+    def test_debug_off_and_persistent_connections(self):
+        production = self.load(SERVER_MODE="wsgi")
+        self.assertFalse(production.DEBUG)
+        self.assertEqual(production.DATABASES["default"]["CONN_MAX_AGE"], 60)
+        self.assertTrue(production.DATABASES["default"]["CONN_HEALTH_CHECKS"])
+
+    def test_asgi_defaults_to_per_request_connections(self):
+        production = self.load(SERVER_MODE="asgi")
+        self.assertEqual(production.DATABASES["default"]["CONN_MAX_AGE"], 0)
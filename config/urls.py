@@ -23,6 +23,10 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
 )
 
+from config.health import health
+from config.instrumentation.views import PrometheusMetricsView
+from config.notifications.views import TelegramMetricsView
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -30,6 +34,14 @@ urlpatterns = [
     path("api/books/", include("books.urls", namespace="book")),
     path("api/borrowings/", include("borrowings.urls", namespace="borrowing")),
     path("api/payments/", include("payments.urls", namespace="payments")),
+    path("api/stats/", include("stats.urls", namespace="stats")),
+    path(
+        "api/notifications/metrics/",
+        TelegramMetricsView.as_view(),
+        name="notification-metrics",
+    ),
+    path("api/metrics/", PrometheusMetricsView.as_view(), name="metrics"),
+    path("api/health/", health, name="health"),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/docs/swagger/",
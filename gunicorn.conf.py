@@ -0,0 +1,33 @@
+"""
+Gunicorn settings for the production profile (`gunicorn -c gunicorn.conf.py`).
+
+SERVER_MODE=wsgi (default) serves config.wsgi with threaded workers;
+SERVER_MODE=asgi serves config.asgi with uvicorn workers. Worker and thread
+counts are tunable through the environment.
+"""
+
+import multiprocessing
+import os
+
+server_mode = os.getenv("SERVER_MODE", "wsgi")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+if server_mode == "asgi":
+    wsgi_app = "config.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "config.wsgi:application"
+    worker_class = "gthread"
+    # Each thread keeps its own persistent database connection
+    threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+accesslog = "-"
+errorlog = "-"
@@ -1,3 +1,33 @@
 from django.contrib import admin
 
-# Register your models here.
+from payments.models import Payment, PaymentItem, StripeEvent, StripeSyncState
+
+
+class PaymentItemInline(admin.TabularInline):
+    model = PaymentItem
+    raw_id_fields = ("borrowing",)
+    extra = 0
+
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    inlines = (PaymentItemInline,)
+    list_display = ("id", "borrowing", "type", "status", "money_to_pay")
+    list_filter = ("status", "type")
+    # Borrowing.__str__ reads the book title and user email
+    list_select_related = ("borrowing__book", "borrowing__user")
+    raw_id_fields = ("borrowing",)
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "type", "status", "borrowing_id", "received_at")
+    list_filter = ("status", "type")
+    search_fields = ("event_id", "session_id")
+    readonly_fields = ("payload", "received_at", "processed_at")
+
+
+@admin.register(StripeSyncState)
+class StripeSyncStateAdmin(admin.ModelAdmin):
+    # Editable so the reconciliation job can be rewound
+    list_display = ("name", "high_water", "updated_at")
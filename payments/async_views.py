@@ -0,0 +1,74 @@
+"""
+Coroutine versions of the Stripe-facing payment endpoints, for ASGI servers.
+
+Stripe calls are awaited through the SDK's httpx client, so waiting on
+Stripe does not hold a worker thread.
+"""
+
+import json
+import logging
+
+import stripe
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.exceptions import APIException, NotFound
+
+from config.async_api import async_api_view, json_response
+from .models import Payment
+from .serializers import PaymentSerializer
+from .services import aretrieve_checkout_session, get_stripe
+from .webhooks import accept_stripe_event, apply_checkout_session
+
+logger = logging.getLogger(__name__)
+
+
+class StripeUnavailable(APIException):
+    status_code = 503
+    default_detail = "Stripe is unavailable, try again later."
+    default_code = "stripe_unavailable"
+
+
+# Signed by Stripe, which cannot authenticate as a user: not throttled
+@async_api_view(["POST"], login_required=False, throttle=False)
+async def stripe_webhook(request):
+    """Async `payments.views.stripe_webhook`."""
+    payload = request.body
+    try:
+        event = get_stripe().Webhook.construct_event(
+            payload,
+            request.META.get("HTTP_STRIPE_SIGNATURE"),
+            settings.STRIPE_WEBHOOK_SECRET,
+        )
+    except (ValueError, stripe.error.SignatureVerificationError) as e:
+        logger.warning(f"Stripe webhook verification failed: {e}")
+        return HttpResponse(status=400)
+
+    await sync_to_async(accept_stripe_event)(event, json.loads(payload))
+    return HttpResponse(status=200)
+
+
+@async_api_view(["POST"])
+async def refresh_payment(request, pk):
+    """
+    Fetch a pending payment's checkout session from Stripe and apply its
+    outcome, for when the webhook is late or was lost. Returns the payment.
+    """
+    queryset = Payment.objects.all()
+    if not request.user.is_staff:
+        queryset = queryset.filter(borrowing__user=request.user)
+    try:
+        payment = await queryset.aget(pk=pk)
+    except Payment.DoesNotExist:
+        raise NotFound()
+
+    if payment.status == Payment.StatusType.PENDING and payment.session_id:
+        try:
+            session = await aretrieve_checkout_session(payment.session_id)
+        except stripe.error.StripeError as e:
+            logger.warning(f"Stripe session refresh failed for payment id={pk}: {e}")
+            raise StripeUnavailable()
+        if await sync_to_async(apply_checkout_session)(session):
+            await payment.arefresh_from_db()
+
+    return json_response(PaymentSerializer(payment).data)
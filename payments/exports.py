@@ -0,0 +1,140 @@
+"""
+Finance exports of payments and borrowings.
+
+Rows come straight from `values_list(...).iterator()`, which reads through a
+server-side cursor on PostgreSQL in FINANCE_EXPORT_CHUNK_SIZE batches, so
+neither the API endpoint nor the management command holds the history in
+memory.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from borrowings.models import Borrowing
+from .models import Payment
+
+PAYMENT_FIELDS = (
+    "id",
+    "created_at",
+    "type",
+    "status",
+    "money_to_pay",
+    "session_id",
+    "borrowing_id",
+    "borrowing__user__email",
+)
+BORROWING_FIELDS = (
+    "id",
+    "borrow_date",
+    "expected_return_date",
+    "actual_return_date",
+    "status",
+    "accrued_fine",
+    "book_id",
+    "book__title",
+    "user__email",
+)
+
+
+def _parse_date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise ValidationError({name: "Use the YYYY-MM-DD format."})
+    return date
+
+
+def _parse_choice(params, name, choices):
+    value = params.get(name)
+    if not value:
+        return None
+    if value.upper() not in choices:
+        raise ValidationError({name: f"Must be one of {list(choices)}."})
+    return value.upper()
+
+
+def _start_of_day(date):
+    """Midnight of `date` in the current time zone, as an aware datetime."""
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def payment_queryset(params):
+    """
+    Payments filtered by `date_from` / `date_to` (creation date, inclusive),
+    `status` and `type`.
+    """
+    queryset = Payment.objects.all()
+    # Plain timestamp bounds, so payment_created_at_idx serves the range
+    # (a `created_at__date` lookup casts the column and cannot use it)
+    date_from = _parse_date(params, "date_from")
+    if date_from:
+        queryset = queryset.filter(created_at__gte=_start_of_day(date_from))
+    date_to = _parse_date(params, "date_to")
+    if date_to:
+        queryset = queryset.filter(
+            created_at__lt=_start_of_day(date_to + timedelta(days=1))
+        )
+    status = _parse_choice(params, "status", Payment.StatusType.values)
+    if status:
+        queryset = queryset.filter(status=status)
+    payment_type = _parse_choice(params, "type", Payment.TypeType.values)
+    if payment_type:
+        queryset = queryset.filter(type=payment_type)
+    return queryset
+
+
+def payment_rows(params):
+    """Rows of `payment_queryset`, oldest first."""
+    return (
+        payment_queryset(params)
+        .order_by("id")
+        .values_list(*PAYMENT_FIELDS)
+        .iterator(chunk_size=settings.FINANCE_EXPORT_CHUNK_SIZE)
+    )
+
+
+def borrowing_rows(params):
+    """
+    Borrowings filtered by `date_from` / `date_to` (borrow date, inclusive)
+    and `status`, oldest first.
+    """
+    queryset = Borrowing.objects.all()
+    date_from = _parse_date(params, "date_from")
+    if date_from:
+        queryset = queryset.filter(borrow_date__gte=date_from)
+    date_to = _parse_date(params, "date_to")
+    if date_to:
+        queryset = queryset.filter(borrow_date__lte=date_to)
+    status = _parse_choice(params, "status", Borrowing.BorrowingStatus.values)
+    if status:
+        queryset = queryset.filter(status=status)
+
+    return (
+        queryset.order_by("id")
+        .values_list(*BORROWING_FIELDS)
+        .iterator(chunk_size=settings.FINANCE_EXPORT_CHUNK_SIZE)
+    )
+
+
+DATASETS = {
+    "payments": (payment_rows, PAYMENT_FIELDS),
+    "borrowings": (borrowing_rows, BORROWING_FIELDS),
+}
+
+
+def export_dataset(params):
+    """Return `(dataset, rows, fields)` for the `dataset` param (payments by default)."""
+    dataset = params.get("dataset") or "payments"
+    if dataset not in DATASETS:
+        raise ValidationError({"dataset": f"Must be one of {list(DATASETS)}."})
+    rows, fields = DATASETS[dataset]
+    return dataset, rows(params), fields
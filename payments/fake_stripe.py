@@ -0,0 +1,212 @@
+"""
+In-memory stand-in for the parts of the `stripe` SDK used by the payments app.
+
+Enabled with `STRIPE_FAKE=True` so the checkout flow (session creation,
+webhooks) can run offline in tests, local development and benchmarks.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+
+import stripe
+
+
+class FakeStripeObject(dict):
+    """Dict with attribute access, like `stripe.StripeObject`."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def _wrap(value):
+    if isinstance(value, dict):
+        return FakeStripeObject({key: _wrap(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_wrap(item) for item in value]
+    return value
+
+
+class _CheckoutSessions:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def create(self, **params):
+        self._backend.calls.append(("checkout.Session.create", params))
+        time.sleep(self._backend.latency)
+        self._backend.raise_if_failing()
+        return self._open(params)
+
+    async def create_async(self, **params):
+        self._backend.calls.append(("checkout.Session.create", params))
+        await asyncio.sleep(self._backend.latency)
+        self._backend.raise_if_failing()
+        return self._open(params)
+
+    def _open(self, params):
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        session = _wrap(
+            {
+                "id": session_id,
+                "object": "checkout.session",
+                "url": f"{self._backend.base_url}/pay/{session_id}",
+                "status": "open",
+                "payment_status": "unpaid",
+                "amount_total": sum(
+                    item["price_data"]["unit_amount"] * item.get("quantity", 1)
+                    for item in params.get("line_items", [])
+                ),
+                "metadata": params.get("metadata", {}),
+            }
+        )
+        self._backend.sessions[session_id] = session
+        return session
+
+    def retrieve(self, session_id, **params):
+        time.sleep(self._backend.latency)
+        return self._get(session_id)
+
+    async def retrieve_async(self, session_id, **params):
+        await asyncio.sleep(self._backend.latency)
+        return self._get(session_id)
+
+    def _get(self, session_id):
+        self._backend.raise_if_failing()
+        try:
+            return self._backend.sessions[session_id]
+        except KeyError:
+            raise stripe.error.InvalidRequestError(
+                f"No such checkout.session: '{session_id}'", "id"
+            )
+
+
+class _Events:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def list(self, **params):
+        """Events newest first, filtered like `stripe.Event.list`."""
+        self._backend.calls.append(("Event.list", params))
+        time.sleep(self._backend.latency)
+        self._backend.raise_if_failing()
+
+        types = params.get("types") or (
+            [params["type"]] if params.get("type") else None
+        )
+        created = params.get("created") or {}
+        checks = {
+            "gt": lambda value, bound: value > bound,
+            "gte": lambda value, bound: value >= bound,
+            "lt": lambda value, bound: value < bound,
+            "lte": lambda value, bound: value <= bound,
+        }
+        events = [
+            event
+            for event in reversed(self._backend.events)
+            if (types is None or event.type in types)
+            and all(checks[op](event.created, bound) for op, bound in created.items())
+        ]
+        events.sort(key=lambda event: event.created, reverse=True)
+
+        starting_after = params.get("starting_after")
+        if starting_after:
+            ids = [event.id for event in events]
+            events = events[ids.index(starting_after) + 1 :]
+        limit = params.get("limit", 10)
+        return _wrap(
+            {
+                "object": "list",
+                "data": events[:limit],
+                "has_more": len(events) > limit,
+            }
+        )
+
+
+class _Checkout:
+    def __init__(self, backend):
+        self.Session = _CheckoutSessions(backend)
+
+
+class _Webhook:
+    @staticmethod
+    def construct_event(payload, sig_header, secret):
+        """Parse the event without verifying the signature."""
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8")
+        return _wrap(json.loads(payload))
+
+
+class FakeStripe:
+    """
+    Module-like object exposing `checkout.Session`, `Event`, `Webhook` and
+    `error`.
+
+    - `fail_next(n, exc)` makes the next `n` API calls raise `exc`.
+    - `calls` records every API call with its parameters.
+    - `latency` adds a simulated network wait (seconds) to every API call;
+      the `*_async` methods wait without blocking the event loop.
+    - `build_event(type, session)` returns a webhook payload for a session.
+    - `complete_session(id)` / `expire_session(id)` settle a session the way
+      a customer or Stripe would, and log the event `Event.list` returns.
+    """
+
+    error = stripe.error
+    base_url = "https://checkout.stripe.test"
+
+    def __init__(self):
+        self.checkout = _Checkout(self)
+        self.Event = _Events(self)
+        self.Webhook = _Webhook
+        self.reset()
+
+    def reset(self):
+        self.latency = 0
+        self.sessions = {}
+        self.events = []
+        self.calls = []
+        self._failures = []
+
+    def fail_next(self, times=1, exc=None):
+        exc = exc or stripe.error.APIConnectionError("Fake Stripe is unreachable")
+        self._failures.extend([exc] * times)
+
+    def raise_if_failing(self):
+        if self._failures:
+            raise self._failures.pop(0)
+
+    def _event(self, event_type, session, event_id=None):
+        return {
+            "id": event_id or f"evt_test_{uuid.uuid4().hex}",
+            "object": "event",
+            "type": event_type,
+            "created": int(time.time()),
+            "data": {"object": dict(session)},
+        }
+
+    def build_event(self, event_type, session, event_id=None):
+        return json.dumps(self._event(event_type, session, event_id))
+
+    def _settle(self, session_id, event_type, **state):
+        session = self.sessions[session_id]
+        session.update(state)
+        event = _wrap(self._event(event_type, session))
+        self.events.append(event)
+        return event
+
+    def complete_session(self, session_id):
+        return self._settle(
+            session_id,
+            "checkout.session.completed",
+            status="complete",
+            payment_status="paid",
+        )
+
+    def expire_session(self, session_id):
+        return self._settle(session_id, "checkout.session.expired", status="expired")
+
+
+fake_stripe = FakeStripe()
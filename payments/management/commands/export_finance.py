@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from config.streaming import csv_lines, ndjson_lines
+from payments.exports import DATASETS, export_dataset
+
+
+class Command(BaseCommand):
+    help = "Streams payments or borrowings as CSV or NDJSON for reconciliation"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=list(DATASETS))
+        parser.add_argument("--file-format", choices=["csv", "ndjson"], default="csv")
+        parser.add_argument("--date-from", help="Inclusive start, YYYY-MM-DD")
+        parser.add_argument("--date-to", help="Inclusive end, YYYY-MM-DD")
+        parser.add_argument("--status")
+        parser.add_argument("--type", help="Payment type (payments only)")
+        parser.add_argument(
+            "--output", help="File to write to instead of standard output"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            dataset, rows, fields = export_dataset(options)
+        except ValidationError as e:
+            raise CommandError(e.detail)
+
+        encode = csv_lines if options["file_format"] == "csv" else ndjson_lines
+        lines = encode(rows, fields)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as out:
+                count = self.write_lines(lines, out.write)
+        else:
+            count = self.write_lines(
+                lines, lambda line: self.stdout.write(line, ending="")
+            )
+
+        if options["file_format"] == "csv":
+            count -= 1  # header
+        self.stderr.write(f"Exported {count} {dataset}.")
+
+    def write_lines(self, lines, write):
+        count = 0
+        for line in lines:
+            write(line)
+            count += 1
+        return count
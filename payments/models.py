@@ -4,15 +4,19 @@ from django.db import models
 class Payment(models.Model):
 
     class StatusType(models.TextChoices):
+        SESSION_PENDING = "SESSION_PENDING", "Session pending"
         PENDING = "PENDING", "Pending"
         PAID = "PAID", "Paid"
+        CANCELED = "CANCELED", "Canceled"
+        # Paid after its checkout was canceled and its copies were gone
+        REFUND_DUE = "REFUND_DUE", "Refund due"
 
     class TypeType(models.TextChoices):
         PAYMENT = "PAYMENT", "Payment"
         FINE = "FINE", "Fine"
 
     status = models.CharField(
-        max_length=10,
+        max_length=20,
         choices=StatusType.choices,
         default=StatusType.PENDING,
     )
@@ -27,8 +31,103 @@ class Payment(models.Model):
         related_name="payments",
     )
     session_url = models.URLField(blank=True, null=True)
-    session_id = models.CharField(max_length=255, blank=True, null=True)
+    # Unique index: every Stripe webhook looks the payment up by session id
+    session_id = models.CharField(max_length=255, blank=True, null=True, unique=True)
     money_to_pay = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    paid_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Date-range scans of the finance export
+            models.Index(fields=["created_at"], name="payment_created_at_idx"),
+        ]
 
     def __str__(self):
         return f"Payment({self.id}) - Status: {self.status} | Type: {self.type}"
+
+
+class PaymentItem(models.Model):
+    """
+    One borrowing paid for by a cart payment, with its line amount.
+
+    Cart payments point `Payment.borrowing` at the first borrowing of the
+    cart and list every borrowing, that one included, as items.
+    """
+
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name="items")
+    borrowing = models.ForeignKey(
+        "borrowings.Borrowing",
+        on_delete=models.CASCADE,
+        related_name="payment_items",
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["payment", "borrowing"], name="unique_payment_item"
+            ),
+        ]
+
+    def __str__(self):
+        return f"PaymentItem({self.id}) - Payment: {self.payment_id} | Amount: {self.amount}"
+
+
+class StripeEvent(models.Model):
+    """
+    Durable log of Stripe webhook deliveries, keyed by Stripe event id.
+
+    The webhook only records events; a Celery worker applies them in order
+    per borrowing, so retried or duplicate deliveries are processed once.
+    """
+
+    class StatusType(models.TextChoices):
+        RECEIVED = "RECEIVED", "Received"
+        PROCESSED = "PROCESSED", "Processed"
+        IGNORED = "IGNORED", "Ignored"
+        FAILED = "FAILED", "Failed"
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    session_id = models.CharField(max_length=255, blank=True, null=True)
+    # From session metadata; not a foreign key so unknown ids are still logged
+    borrowing_id = models.BigIntegerField(blank=True, null=True)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=10,
+        choices=StatusType.choices,
+        default=StatusType.RECEIVED,
+    )
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Pending events of a borrowing, oldest first
+            models.Index(
+                fields=["borrowing_id", "id"],
+                condition=models.Q(status="RECEIVED"),
+                name="stripe_event_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"StripeEvent({self.event_id}) - {self.type} | {self.status}"
+
+
+class StripeSyncState(models.Model):
+    """
+    High-water mark of a Stripe list the reconciliation job pages through:
+    the creation time of the newest object already applied.
+    """
+
+    EVENTS = "events"
+
+    name = models.CharField(max_length=50, primary_key=True)
+    high_water = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"StripeSyncState({self.name}) - {self.high_water}"
@@ -0,0 +1,70 @@
+"""
+Fee and fine quotes for many books and dates at once.
+
+Both prices are `daily_fee × days × multiplier`. The day offsets of the
+requested dates are computed once, each book's fee scales that vector,
+and the fees of all books come from a single query. The arithmetic stays
+in Decimal so a quote matches the charged amount to the cent;
+`calculate_borrowing_fee` and `calculate_fine` are the one-cell case.
+"""
+
+from decimal import Decimal
+
+from books.models import Book
+
+CENT = Decimal("0.01")
+FINE_MULTIPLIER = Decimal("2")
+
+# Upper bounds of one quote request
+MAX_QUOTE_BOOKS = 100
+MAX_QUOTE_DATES = 31
+
+
+def day_offsets(start_date, dates):
+    return [(date - start_date).days for date in dates]
+
+
+def fee_row(daily_fee, start_date, return_dates):
+    """
+    Borrowing fee from `start_date` to each return date, or None where the
+    return date is not after the start.
+    """
+    return [
+        (daily_fee * days).quantize(CENT) if days > 0 else None
+        for days in day_offsets(start_date, return_dates)
+    ]
+
+
+def fine_row(daily_fee, expected_return_date, return_dates):
+    """Fine of a borrowing due on `expected_return_date` returned on each date."""
+    daily_fine = daily_fee * FINE_MULTIPLIER
+    return [
+        (daily_fine * days).quantize(CENT) if days > 0 else Decimal("0.00")
+        for days in day_offsets(expected_return_date, return_dates)
+    ]
+
+
+def load_daily_fees(book_ids):
+    """{book id: daily fee} of the existing books among `book_ids`."""
+    return dict(Book.objects.filter(pk__in=book_ids).values_list("pk", "daily_fee"))
+
+
+def quote(book_ids, dates, start_date):
+    """
+    Fees and projected fines of several books for several dates.
+
+    For each book, `fees[i]` is the fee of a borrowing from `start_date`
+    returned on `dates[i]`, and `fines[i]` the fine of a borrowing due on
+    `start_date` returned on `dates[i]`. Unknown books are left out.
+    """
+    daily_fees = load_daily_fees(book_ids)
+    return [
+        {
+            "book": book_id,
+            "daily_fee": daily_fees[book_id],
+            "fees": fee_row(daily_fees[book_id], start_date, dates),
+            "fines": fine_row(daily_fees[book_id], start_date, dates),
+        }
+        for book_id in dict.fromkeys(book_ids)
+        if book_id in daily_fees
+    ]
@@ -0,0 +1,145 @@
+"""
+Reconciliation of payments with Stripe's event log.
+
+Payments normally change state when `stripe_webhook` receives a push. If
+our endpoint is down, Stripe's retries can run out and payments stay
+PENDING with copies held. This job pages through `Event.list` from a
+stored high-water mark and applies the checkout events the webhook missed:
+
+- One `session_id IN (...)` query per page finds the open payments.
+- Each page is applied in one transaction, with a savepoint per event so
+  a bad event cannot roll back the rest.
+- Applied events are logged as StripeEvent rows, so a late webhook
+  delivery of the same event is dropped as a duplicate.
+- The mark only moves forward once a whole run succeeded, and each run
+  re-reads a short overlap before it, so nothing is skipped. It stops at
+  the oldest event that failed to apply, so the next run retries it.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from config.instrumentation.metrics import timed_call
+from .models import Payment, StripeEvent, StripeSyncState
+from .services import get_stripe
+from .webhooks import apply_payment_event
+
+logger = logging.getLogger(__name__)
+
+RECONCILED_EVENT_TYPES = (
+    "checkout.session.completed",
+    "checkout.session.expired",
+)
+
+
+def list_events(since, starting_after=None, page_size=None):
+    """One page of checkout events created at or after `since`, newest first."""
+    params = {
+        "types": list(RECONCILED_EVENT_TYPES),
+        "created": {"gte": int(since.timestamp())},
+        "limit": page_size or settings.STRIPE_RECONCILE_PAGE_SIZE,
+    }
+    if starting_after:
+        params["starting_after"] = starting_after
+    with timed_call("stripe", "event.list"):
+        return get_stripe().Event.list(**params)
+
+
+def apply_events_page(events):
+    """
+    Apply a page of Stripe events to their open payments.
+
+    Returns the number of events applied and the events that failed;
+    events whose payment is unknown or already settled are skipped.
+    """
+    # Newest event of each session wins
+    sessions = {event.data.object.id: event for event in reversed(events)}
+    payments = Payment.objects.select_related("borrowing__user").filter(
+        session_id__in=sessions, status=Payment.StatusType.PENDING
+    )
+
+    applied = []
+    failed = []
+    with transaction.atomic():
+        for payment in payments:
+            event = sessions[payment.session_id]
+            try:
+                with transaction.atomic():
+                    apply_payment_event(event.type, payment)
+            except Exception:
+                logger.exception(f"Reconciling Stripe event {event.id} failed.")
+                failed.append(event)
+                continue
+            applied.append((event, payment))
+
+        StripeEvent.objects.bulk_create(
+            [
+                StripeEvent(
+                    event_id=event.id,
+                    type=event.type,
+                    session_id=payment.session_id,
+                    borrowing_id=payment.borrowing_id,
+                    payload=event,
+                    status=StripeEvent.StatusType.PROCESSED,
+                    processed_at=timezone.now(),
+                )
+                for event, payment in applied
+            ],
+            ignore_conflicts=True,
+        )
+    return len(applied), failed
+
+
+def reconcile_stripe_events(page_size=None):
+    """
+    Apply checkout events created since the stored high-water mark.
+
+    Returns counts of the events seen, applied and failed and the pages
+    fetched.
+    """
+    state, _ = StripeSyncState.objects.get_or_create(
+        name=StripeSyncState.EVENTS,
+        defaults={
+            "high_water": timezone.now()
+            - timedelta(seconds=settings.STRIPE_RECONCILE_LOOKBACK)
+        },
+    )
+    since = state.high_water - timedelta(seconds=settings.STRIPE_RECONCILE_OVERLAP)
+
+    summary = {"events": 0, "applied": 0, "failed": 0, "pages": 0}
+    newest = None
+    oldest_failed = None
+    starting_after = None
+    while True:
+        page = list_events(since, starting_after, page_size)
+        summary["pages"] += 1
+        if page.data:
+            newest = max(newest or 0, page.data[0].created)
+            summary["events"] += len(page.data)
+            applied, failed = apply_events_page(page.data)
+            summary["applied"] += applied
+            summary["failed"] += len(failed)
+            for event in failed:
+                oldest_failed = min(oldest_failed or event.created, event.created)
+        if not page.has_more:
+            break
+        starting_after = page.data[-1].id
+
+    if oldest_failed is not None:
+        # Keep failed events inside the next run's window
+        newest = oldest_failed
+    if newest is not None:
+        high_water = datetime.fromtimestamp(newest, tz=dt_timezone.utc)
+        # Never move the mark back, e.g. behind a concurrent run
+        StripeSyncState.objects.filter(
+            name=StripeSyncState.EVENTS, high_water__lt=high_water
+        ).update(high_water=high_water, updated_at=timezone.now())
+    if summary["applied"]:
+        logger.warning(
+            f"Reconciled {summary['applied']} Stripe events missed by the webhook."
+        )
+    return summary
@@ -1,8 +1,18 @@
 from rest_framework import serializers
+
+from borrowings.serializers import BorrowingSerializer
+from config.expand import ExpandableSerializerMixin
+from config.fields import CommaSeparatedListField
+from config.sparse import SparseFieldsSerializerMixin
 from payments.models import Payment
+from payments.pricing import MAX_QUOTE_BOOKS, MAX_QUOTE_DATES
+
 
+class PaymentSerializer(
+    SparseFieldsSerializerMixin, ExpandableSerializerMixin, serializers.ModelSerializer
+):
+    expandable_fields = {"borrowing": BorrowingSerializer}
 
-class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = [
@@ -15,3 +25,26 @@ class PaymentSerializer(serializers.ModelSerializer):
             "money_to_pay",
         ]
         read_only_fields = fields
+
+
+class PriceQuoteRequestSerializer(serializers.Serializer):
+    books = CommaSeparatedListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=MAX_QUOTE_BOOKS,
+    )
+    dates = CommaSeparatedListField(
+        child=serializers.DateField(), min_length=1, max_length=MAX_QUOTE_DATES
+    )
+    start_date = serializers.DateField(required=False)
+
+
+class PriceQuoteSerializer(serializers.Serializer):
+    book = serializers.IntegerField()
+    daily_fee = serializers.DecimalField(max_digits=10, decimal_places=2)
+    fees = serializers.ListField(
+        child=serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    )
+    fines = serializers.ListField(
+        child=serializers.DecimalField(max_digits=10, decimal_places=2)
+    )
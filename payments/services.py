@@ -1,71 +1,218 @@
+import time
+
 import stripe
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, F, Func, IntegerField, Q, Value
 from django.utils import timezone
-from decimal import Decimal
 
 
-from .models import Payment
+from borrowings.models import Borrowing
+from config.instrumentation.metrics import timed_call
+from .fake_stripe import fake_stripe
+from .models import Payment, PaymentItem
+from .pricing import FINE_MULTIPLIER, fee_row, fine_row
 
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
 
+def get_stripe():
+    """Return the Stripe SDK, or the in-memory fake when STRIPE_FAKE is on."""
+    if settings.STRIPE_FAKE:
+        return fake_stripe
+    return stripe
+
+
 def calculate_fine(borrowing):
     if not borrowing.actual_return_date:
         raise ValueError("Actual return date not set")
 
-    overdue_days = (borrowing.actual_return_date - borrowing.expected_return_date).days
-    if overdue_days <= 0:
-        return Decimal("0.00")
-
-    daily_fee = borrowing.book.daily_fee
-    fine = Decimal(overdue_days) * daily_fee * Decimal("2")
-    return fine.quantize(Decimal("0.01"))
+    (fine,) = fine_row(
+        borrowing.book.daily_fee,
+        borrowing.expected_return_date,
+        [borrowing.actual_return_date],
+    )
+    return fine
+
+
+def fine_expression(on_date, daily_fee):
+    """
+    Database expression for the fine a borrowing accrues by `on_date`,
+    evaluated set-wise with the same formula as `calculate_fine`.
+    Only meaningful for rows already filtered to be overdue on that date.
+    """
+    overdue_days = Func(
+        Value(on_date),
+        F("expected_return_date"),
+        template="(%(expressions)s)",
+        arg_joiner=" - ",
+        output_field=IntegerField(),
+    )
+    return Func(
+        overdue_days * daily_fee * Value(FINE_MULTIPLIER),
+        template="ROUND(%(expressions)s, 2)",
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
 
 
 def calculate_borrowing_fee(borrowing):
-    daily_fee = borrowing.book.daily_fee
-
     start_date = borrowing.borrow_date or timezone.now().date()
-    days = (borrowing.expected_return_date - start_date).days
+    (fee,) = fee_row(
+        borrowing.book.daily_fee, start_date, [borrowing.expected_return_date]
+    )
 
-    if days <= 0:
+    if fee is None:
         raise ValueError("Expected return date must be after start date")
 
-    return daily_fee * days
+    return fee
+
+
+def payment_borrowings(payment):
+    """Borrowings a payment pays for: its cart items, or just `borrowing`."""
+    return Borrowing.objects.filter(
+        Q(pk=payment.borrowing_id)
+        | Q(pk__in=PaymentItem.objects.filter(payment=payment).values("borrowing_id"))
+    )
+
+
+def checkout_items(payment):
+    """(borrowing, amount) lines of a cart payment, or None for a single one."""
+    items = payment.items.select_related("borrowing__book").order_by("id")
+    return [(item.borrowing, item.amount) for item in items] or None
 
 
-def create_stripe_payment_session(borrowing, payment_type, amount_usd):
-    amount_cents = int(amount_usd * 100)
+def checkout_session_params(borrowing, payment_type, amount_usd, items=None):
+    """
+    Parameters of the Stripe checkout session for a borrowing.
 
-    session = stripe.checkout.Session.create(
-        payment_method_types=["card"],
-        mode="payment",
-        line_items=[
+    `items` lists (borrowing, amount) pairs for a cart checkout; each one
+    becomes a line item of the same session.
+    """
+    items = items or [(borrowing, amount_usd)]
+    params = {
+        "payment_method_types": ["card"],
+        "mode": "payment",
+        "line_items": [
             {
                 "price_data": {
                     "currency": "usd",
                     "product_data": {
-                        "name": f"Library {payment_type} for book '{borrowing.book.title}'",
+                        "name": f"Library {payment_type} for book '{item.book.title}'",
                     },
-                    "unit_amount": amount_cents,
+                    "unit_amount": int(amount * 100),
                 },
                 "quantity": 1,
             }
+            for item, amount in items
         ],
-        success_url=settings.STRIPE_SUCCESS_URL + "?session_id={CHECKOUT_SESSION_ID}",
-        cancel_url=settings.STRIPE_CANCEL_URL,
-        metadata={
+        "success_url": settings.STRIPE_SUCCESS_URL
+        + "?session_id={CHECKOUT_SESSION_ID}",
+        "cancel_url": settings.STRIPE_CANCEL_URL,
+        "metadata": {
             "borrowing_id": borrowing.id,
             "payment_type": payment_type,
         },
-    )
-
-    return Payment.objects.create(
-        borrowing=borrowing,
-        type=payment_type,
-        money_to_pay=amount_usd,
-        session_url=session.url,
-        session_id=session.id,
-        status=Payment.StatusType.PENDING,
+    }
+    if payment_type == Payment.TypeType.PAYMENT:
+        # Unpaid borrowings are expired after this, so Stripe must stop
+        # accepting the payment first
+        params["expires_at"] = int(time.time()) + settings.BORROWING_PAYMENT_TIMEOUT
+    return params
+
+
+def create_checkout_session(borrowing, payment_type, amount_usd, items=None):
+    """Call Stripe to open a checkout session for a borrowing."""
+    params = checkout_session_params(borrowing, payment_type, amount_usd, items)
+    with timed_call("stripe", "checkout.session.create"):
+        return get_stripe().checkout.Session.create(**params)
+
+
+async def acreate_checkout_session(borrowing, payment_type, amount_usd, items=None):
+    """
+    Async `create_checkout_session`: the SDK sends the request through its
+    httpx client, so the event loop serves other requests meanwhile.
+    The books of `borrowing` and `items` must already be loaded.
+    """
+    params = checkout_session_params(borrowing, payment_type, amount_usd, items)
+    with timed_call("stripe", "checkout.session.create"):
+        return await get_stripe().checkout.Session.create_async(**params)
+
+
+async def aretrieve_checkout_session(session_id):
+    with timed_call("stripe", "checkout.session.retrieve"):
+        return await get_stripe().checkout.Session.retrieve_async(session_id)
+
+
+def create_payment_items(payment, items):
+    if items:
+        PaymentItem.objects.bulk_create(
+            PaymentItem(payment=payment, borrowing=item, amount=amount)
+            for item, amount in items
+        )
+
+
+def save_pending_payment(borrowing, payment_type, amount_usd, session, items=None):
+    """Record the PENDING payment (and cart items) of an opened session."""
+    with transaction.atomic():
+        payment = Payment.objects.create(
+            borrowing=borrowing,
+            type=payment_type,
+            money_to_pay=amount_usd,
+            session_url=session.url,
+            session_id=session.id,
+            status=Payment.StatusType.PENDING,
+        )
+        create_payment_items(payment, items)
+    return payment
+
+
+def create_stripe_payment_session(borrowing, payment_type, amount_usd, items=None):
+    session = create_checkout_session(borrowing, payment_type, amount_usd, items)
+    return save_pending_payment(borrowing, payment_type, amount_usd, session, items)
+
+
+def request_stripe_payment_session(borrowing, payment_type, amount_usd, items=None):
+    """
+    Record a SESSION_PENDING payment and create its Stripe session in Celery.
+
+    The task is enqueued only once the surrounding transaction commits, so
+    the worker always sees the payment row.
+    """
+    from .tasks import create_payment_checkout_session
+
+    with transaction.atomic():
+        payment = Payment.objects.create(
+            borrowing=borrowing,
+            type=payment_type,
+            money_to_pay=amount_usd,
+            status=Payment.StatusType.SESSION_PENDING,
+        )
+        create_payment_items(payment, items)
+        transaction.on_commit(lambda: create_payment_checkout_session.delay(payment.id))
+    return payment
+
+
+def start_stripe_payment(borrowing, payment_type, amount_usd, items=None):
+    """Open a payment session inline or in the background (STRIPE_ASYNC_CHECKOUT)."""
+    if settings.STRIPE_ASYNC_CHECKOUT:
+        return request_stripe_payment_session(
+            borrowing, payment_type, amount_usd, items
+        )
+    return create_stripe_payment_session(borrowing, payment_type, amount_usd, items)
+
+
+async def astart_stripe_payment(borrowing, payment_type, amount_usd, items=None):
+    """
+    Async `start_stripe_payment`. Only the Stripe call is awaited on the
+    event loop; the database writes run in the request's sync thread.
+    """
+    if settings.STRIPE_ASYNC_CHECKOUT:
+        return await sync_to_async(request_stripe_payment_session)(
+            borrowing, payment_type, amount_usd, items
+        )
+    session = await acreate_checkout_session(borrowing, payment_type, amount_usd, items)
+    return await sync_to_async(save_pending_payment)(
+        borrowing, payment_type, amount_usd, session, items
     )
@@ -0,0 +1,112 @@
+import logging
+
+import stripe
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from books.services import release_copies
+from borrowings.holds import allocate_holds
+from borrowings.models import Borrowing
+from .models import Payment
+from .reconciliation import reconcile_stripe_events
+from .services import checkout_items, create_checkout_session, payment_borrowings
+from .webhooks import process_stripe_events
+
+logger = logging.getLogger(__name__)
+
+# Transient Stripe failures worth retrying; anything else fails immediately.
+RETRYABLE_STRIPE_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.RateLimitError,
+    stripe.error.APIError,
+)
+
+
+@shared_task(bind=True, max_retries=settings.STRIPE_SESSION_MAX_RETRIES)
+def create_payment_checkout_session(self, payment_id):
+    """
+    Create the Stripe checkout session for a SESSION_PENDING payment.
+
+    Retries transient Stripe errors with exponential backoff. When Stripe
+    keeps failing the payment is canceled and, for borrowing payments, the
+    reserved copy is released.
+    """
+    payment = (
+        Payment.objects.select_related("borrowing__book")
+        .filter(pk=payment_id, status=Payment.StatusType.SESSION_PENDING)
+        .first()
+    )
+    if payment is None:
+        return
+
+    try:
+        session = create_checkout_session(
+            payment.borrowing,
+            payment.type,
+            payment.money_to_pay,
+            checkout_items(payment),
+        )
+    except RETRYABLE_STRIPE_ERRORS as exc:
+        if self.request.retries < self.max_retries:
+            countdown = settings.STRIPE_SESSION_RETRY_BACKOFF * 2**self.request.retries
+            raise self.retry(exc=exc, countdown=countdown)
+        logger.error(
+            f"Stripe session creation failed for payment id={payment.id}: {exc}"
+        )
+        cancel_session_pending_payment(payment)
+        return
+    except stripe.error.StripeError as exc:
+        logger.error(
+            f"Stripe session creation failed for payment id={payment.id}: {exc}"
+        )
+        cancel_session_pending_payment(payment)
+        return
+
+    Payment.objects.filter(
+        pk=payment.pk, status=Payment.StatusType.SESSION_PENDING
+    ).update(
+        session_url=session.url,
+        session_id=session.id,
+        status=Payment.StatusType.PENDING,
+    )
+
+
+def cancel_session_pending_payment(payment):
+    with transaction.atomic():
+        canceled = Payment.objects.filter(
+            pk=payment.pk, status=Payment.StatusType.SESSION_PENDING
+        ).update(status=Payment.StatusType.CANCELED)
+        if canceled and payment.type == Payment.TypeType.PAYMENT:
+            borrowings = payment_borrowings(payment)
+            book_ids = list(borrowings.values_list("book_id", flat=True))
+            borrowings.update(
+                status=Borrowing.BorrowingStatus.CANCELED, updated_at=timezone.now()
+            )
+            release_copies(book_ids)
+            allocate_holds(book_ids)
+
+
+@shared_task
+def process_stripe_event(event_pk):
+    """
+    Apply a stored Stripe webhook event.
+
+    Events of the same borrowing are applied in arrival order; a worker
+    picking up a later event first also applies the earlier pending ones.
+    """
+    process_stripe_events(event_pk)
+
+
+@shared_task
+def reconcile_stripe_events_task():
+    """
+    Periodic (celery-beat) catch-up on checkout events the webhook missed.
+    Stripe failures are left to the next run, which starts from the same
+    high-water mark.
+    """
+    try:
+        return reconcile_stripe_events()
+    except stripe.error.StripeError as exc:
+        logger.error(f"Stripe reconciliation failed: {exc}")
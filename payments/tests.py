@@ -1,3 +1,700 @@
-from django.test import TestCase
+import io
+import json
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from books.models import Book
+from borrowings.models import Borrowing
+from payments.fake_stripe import fake_stripe
+from payments.exports import payment_queryset
+from payments.models import Payment, StripeEvent, StripeSyncState
+from payments.webhooks import apply_payment_event
+from payments.services import calculate_borrowing_fee, calculate_fine
+from payments.tasks import (
+    create_payment_checkout_session,
+    process_stripe_event,
+    reconcile_stripe_events_task,
+)
+from users.models import User
+
+
+def run_checkout_task_eagerly(payment_id):
+    return create_payment_checkout_session.apply(args=[payment_id])
+
+
+def run_event_task_eagerly(event_pk):
+    return process_stripe_event.apply(args=[event_pk])
+
+
+@override_settings(STRIPE_FAKE=True, STRIPE_ASYNC_CHECKOUT=True)
+@mock.patch(
+    "payments.tasks.create_payment_checkout_session.delay",
+    side_effect=run_checkout_task_eagerly,
+)
+class AsyncCheckoutTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        fake_stripe.reset()
+        self.user = User.objects.create_user(email="user@example.com", password="pass")
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=2,
+            daily_fee="1.50",
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def borrow(self):
+        return self.client.post(
+            reverse("borrowing:borrowings-list"),
+            {
+                "book": self.book.id,
+                "expected_return_date": (
+                    timezone.now().date() + timezone.timedelta(days=7)
+                ).isoformat(),
+            },
+        )
+
+    def test_borrowing_is_committed_before_session_exists(self, delay):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.borrow()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsNone(response.data["checkout_url"])
+        payment = Payment.objects.get()
+        self.assertEqual(payment.status, Payment.StatusType.SESSION_PENDING)
+        self.assertEqual(fake_stripe.calls, [])
+
+        poll = self.client.get(response.data["checkout_status_url"])
+        self.assertEqual(poll.status_code, status.HTTP_202_ACCEPTED)
+
+        for callback in callbacks:
+            callback()
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.StatusType.PENDING)
+        self.assertIn(payment.session_id, fake_stripe.sessions)
+
+        poll = self.client.get(response.data["checkout_status_url"])
+        self.assertEqual(poll.status_code, status.HTTP_303_SEE_OTHER)
+        self.assertEqual(poll["Location"], payment.session_url)
+
+    def test_transient_stripe_errors_are_retried(self, delay):
+        fake_stripe.fail_next(2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.borrow()
+
+        payment = Payment.objects.get()
+        self.assertEqual(payment.status, Payment.StatusType.PENDING)
+        self.assertEqual(len(fake_stripe.calls), 3)
+
+    def test_exhausted_retries_cancel_and_release_copy(self, delay):
+        fake_stripe.fail_next(create_payment_checkout_session.max_retries + 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.borrow()
+
+        payment = Payment.objects.get()
+        self.assertEqual(payment.status, Payment.StatusType.CANCELED)
+        borrowing = Borrowing.objects.get(pk=response.data["borrowing"]["id"])
+        self.assertEqual(borrowing.status, Borrowing.BorrowingStatus.CANCELED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 2)
+
+        poll = self.client.get(response.data["checkout_status_url"])
+        self.assertEqual(poll.status_code, status.HTTP_409_CONFLICT)
+
+
+@override_settings(STRIPE_FAKE=True)
+@mock.patch(
+    "payments.tasks.process_stripe_event.delay", side_effect=run_event_task_eagerly
+)
+@mock.patch("payments.webhooks.send_telegram_payment_notification")
+class StripeWebhookTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        fake_stripe.reset()
+        self.user = User.objects.create_user(email="user@example.com", password="pass")
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=1,
+            daily_fee="1.50",
+        )
+        self.borrowing = Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=3),
+        )
+        self.session = fake_stripe.checkout.Session.create(
+            line_items=[], metadata={"borrowing_id": self.borrowing.id}
+        )
+        self.payment = Payment.objects.create(
+            borrowing=self.borrowing,
+            money_to_pay="4.50",
+            session_id=self.session.id,
+            session_url=self.session.url,
+        )
+        self.url = reverse("payments:stripe-webhook")
+
+    def post_event(self, event_type, event_id=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                self.url,
+                fake_stripe.build_event(event_type, self.session, event_id),
+                content_type="application/json",
+            )
+
+    def test_completed_marks_payment_paid_and_borrowing_borrowed(self, notify, process):
+        response = self.post_event("checkout.session.completed")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.payment.refresh_from_db()
+        self.borrowing.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusType.PAID)
+        self.assertEqual(self.borrowing.status, Borrowing.BorrowingStatus.BORROWED)
+        notify.assert_called_once()
+
+    def test_repeated_expiry_releases_copy_once(self, notify, process):
+        self.post_event("checkout.session.expired")
+        self.post_event("checkout.session.expired")
+
+        self.book.refresh_from_db()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.book.inventory, 2)
+        self.assertEqual(self.payment.status, Payment.StatusType.CANCELED)
+
+    def test_task_inventory_change_invalidates_the_catalogue_cache(
+        self, notify, process
+    ):
+        list_url = reverse("book:book-list")
+        detail_url = reverse("book:book-detail", kwargs={"pk": self.book.pk})
+        self.client.get(list_url)
+        self.client.get(detail_url)
+
+        # Applied by process_stripe_event, as in the worker
+        self.post_event("checkout.session.expired")
+
+        process.assert_called_once()
+        self.assertEqual(self.client.get(detail_url).data["inventory"], 2)
+        self.assertEqual(self.client.get(list_url).data["results"][0]["inventory"], 2)
+
+    def test_redelivered_event_is_stored_and_processed_once(self, notify, process):
+        first = self.post_event("checkout.session.completed", event_id="evt_1")
+        second = self.post_event("checkout.session.completed", event_id="evt_1")
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        process.assert_called_once()
+        notify.assert_called_once()
+        event = StripeEvent.objects.get()
+        self.assertEqual(event.status, StripeEvent.StatusType.PROCESSED)
+        self.assertEqual(event.borrowing_id, self.borrowing.id)
+
+    def test_redelivery_enqueues_event_whose_enqueue_failed(self, notify, process):
+        process.side_effect = ConnectionError("Broker is unreachable")
+        with self.assertRaises(ConnectionError):
+            self.post_event("checkout.session.completed", event_id="evt_1")
+        self.assertEqual(
+            StripeEvent.objects.get().status, StripeEvent.StatusType.RECEIVED
+        )
+
+        process.side_effect = run_event_task_eagerly
+        self.post_event("checkout.session.completed", event_id="evt_1")
+
+        self.assertEqual(process.call_count, 2)
+        self.assertEqual(
+            StripeEvent.objects.get().status, StripeEvent.StatusType.PROCESSED
+        )
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusType.PAID)
+
+    def test_webhook_is_not_throttled(self, notify, process):
+        anon_rate = int(
+            settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]["anon"].split("/")[0]
+        )
+        for _ in range(anon_rate + 1):
+            response = self.post_event("checkout.session.expired")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_duplicate_completion_notifies_once(self, notify, process):
+        self.post_event("checkout.session.completed")
+        self.post_event("checkout.session.completed")
+
+        self.assertEqual(StripeEvent.objects.count(), 2)
+        notify.assert_called_once()
+
+    def test_pending_events_of_a_borrowing_are_applied_in_order(self, notify, process):
+        # The worker is down: events are only recorded
+        process.side_effect = None
+        self.post_event("checkout.session.completed", event_id="evt_1")
+        self.post_event("checkout.session.expired", event_id="evt_2")
+
+        # The later event arrives at a worker first
+        process_stripe_event.apply(args=[StripeEvent.objects.get(event_id="evt_2").pk])
+
+        self.payment.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusType.PAID)
+        self.assertEqual(self.book.inventory, 1)
+        self.assertFalse(
+            StripeEvent.objects.filter(status=StripeEvent.StatusType.RECEIVED).exists()
+        )
+
+    def test_late_completion_reserves_copy_again(self, notify, process):
+        self.post_event("checkout.session.expired")
+        self.post_event("checkout.session.completed")
+
+        self.payment.refresh_from_db()
+        self.borrowing.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusType.PAID)
+        self.assertEqual(self.borrowing.status, Borrowing.BorrowingStatus.BORROWED)
+        self.assertEqual(self.book.inventory, 1)
+        notify.assert_called_once()
+
+    def test_late_completion_without_copy_is_flagged_for_refund(self, notify, process):
+        self.post_event("checkout.session.expired")
+        Book.objects.filter(pk=self.book.pk).update(inventory=0)
+
+        self.post_event("checkout.session.completed")
+
+        self.payment.refresh_from_db()
+        self.borrowing.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusType.REFUND_DUE)
+        self.assertIsNotNone(self.payment.paid_at)
+        self.assertEqual(self.borrowing.status, Borrowing.BorrowingStatus.CANCELED)
+        self.assertEqual(self.book.inventory, 0)
+        notify.assert_not_called()
+
+    def test_completion_leaves_returned_borrowing_returned(self, notify, process):
+        Borrowing.objects.filter(pk=self.borrowing.pk).update(
+            status=Borrowing.BorrowingStatus.RETURNED,
+            actual_return_date=timezone.now().date(),
+        )
+
+        self.post_event("checkout.session.completed")
+
+        self.payment.refresh_from_db()
+        self.borrowing.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusType.PAID)
+        self.assertEqual(self.borrowing.status, Borrowing.BorrowingStatus.RETURNED)
+
+    def test_unknown_session_is_ignored(self, notify, process):
+        self.session = fake_stripe.checkout.Session.create(line_items=[])
+        response = self.post_event("checkout.session.completed")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            StripeEvent.objects.get().status, StripeEvent.StatusType.IGNORED
+        )
+
+
+@override_settings(STRIPE_FAKE=True, STRIPE_RECONCILE_PAGE_SIZE=2)
+@mock.patch("payments.webhooks.send_telegram_payment_notification")
+class StripeReconciliationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        fake_stripe.reset()
+        self.user = User.objects.create_user(email="user@example.com", password="pass")
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            inventory=0,
+            daily_fee="1.50",
+        )
+        self.payments = [self.create_payment() for _ in range(3)]
+
+    def create_payment(self):
+        borrowing = Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=3),
+        )
+        session = fake_stripe.checkout.Session.create(
+            line_items=[], metadata={"borrowing_id": borrowing.id}
+        )
+        return Payment.objects.create(
+            borrowing=borrowing,
+            money_to_pay="4.50",
+            session_id=session.id,
+            session_url=session.url,
+        )
+
+    def reconcile(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return reconcile_stripe_events_task.apply().get()
+
+    def test_missed_events_are_applied_page_by_page(self, notify):
+        first, second, third = self.payments
+        fake_stripe.complete_session(first.session_id)
+        fake_stripe.complete_session(second.session_id)
+        fake_stripe.expire_session(third.session_id)
+
+        summary = self.reconcile()
+
+        self.assertEqual(summary, {"events": 3, "applied": 3, "failed": 0, "pages": 2})
+        statuses = dict(Payment.objects.values_list("pk", "status"))
+        self.assertEqual(statuses[first.pk], Payment.StatusType.PAID)
+        self.assertEqual(statuses[second.pk], Payment.StatusType.PAID)
+        self.assertEqual(statuses[third.pk], Payment.StatusType.CANCELED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+        self.assertEqual(notify.call_count, 2)
+        self.assertEqual(
+            StripeEvent.objects.filter(status=StripeEvent.StatusType.PROCESSED).count(),
+            3,
+        )
+        pages = [params for name, params in fake_stripe.calls if name == "Event.list"]
+        self.assertNotIn("starting_after", pages[0])
+        self.assertEqual(pages[1]["starting_after"], fake_stripe.events[1].id)
+
+    def test_rerun_applies_nothing_twice(self, notify):
+        fake_stripe.complete_session(self.payments[0].session_id)
+        self.reconcile()
+
+        summary = self.reconcile()
+
+        self.assertEqual(summary["applied"], 0)
+        notify.assert_called_once()
+        state = StripeSyncState.objects.get(name=StripeSyncState.EVENTS)
+        self.assertEqual(
+            int(state.high_water.timestamp()), fake_stripe.events[0].created
+        )
+
+    def test_late_webhook_of_reconciled_event_is_a_duplicate(self, notify):
+        event = fake_stripe.complete_session(self.payments[0].session_id)
+        self.reconcile()
+
+        with mock.patch("payments.tasks.process_stripe_event.delay") as process:
+            response = self.client.post(
+                reverse("payments:stripe-webhook"),
+                json.dumps(event),
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        process.assert_not_called()
+        notify.assert_called_once()
+
+    def test_events_before_the_high_water_mark_are_not_listed(self, notify):
+        mark = timezone.now()
+        StripeSyncState.objects.create(name=StripeSyncState.EVENTS, high_water=mark)
+
+        self.reconcile()
+
+        params = fake_stripe.calls[-1][1]
+        self.assertEqual(
+            params["created"],
+            {"gte": int(mark.timestamp()) - settings.STRIPE_RECONCILE_OVERLAP},
+        )
+
+    def test_stripe_failure_keeps_the_high_water_mark(self, notify):
+        fake_stripe.complete_session(self.payments[0].session_id)
+        fake_stripe.fail_next()
+
+        self.assertIsNone(self.reconcile())
+
+        high_water = StripeSyncState.objects.get().high_water
+        self.assertLess(high_water.timestamp(), fake_stripe.events[0].created)
+        self.assertEqual(self.reconcile()["applied"], 1)
+
+    def test_failed_event_is_retried_by_the_next_run(self, notify):
+        failing, applied = self.payments[:2]
+        event = fake_stripe.complete_session(failing.session_id)
+        # Older than the overlap each run re-reads
+        event["created"] -= settings.STRIPE_RECONCILE_OVERLAP * 2
+        fake_stripe.complete_session(applied.session_id)
+
+        def apply_or_fail(event_type, payment):
+            if payment.pk == failing.pk:
+                raise RuntimeError("boom")
+            apply_payment_event(event_type, payment)
+
+        with mock.patch(
+            "payments.reconciliation.apply_payment_event", side_effect=apply_or_fail
+        ):
+            summary = self.reconcile()
+        self.assertEqual((summary["applied"], summary["failed"]), (1, 1))
+
+        high_water = StripeSyncState.objects.get().high_water
+        self.assertEqual(int(high_water.timestamp()), event.created)
+        self.assertEqual(self.reconcile()["applied"], 1)
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, Payment.StatusType.PAID)
+
+
+@override_settings(STRIPE_FAKE=True)
+@mock.patch("payments.webhooks.send_telegram_payment_notification")
+class AsyncPaymentViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        fake_stripe.reset()
+        self.user = User.objects.create(email="user@example.com")
+        self.book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=1, daily_fee="1.50"
+        )
+        self.borrowing = Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=3),
+        )
+        self.session = fake_stripe.checkout.Session.create(
+            line_items=[], metadata={"borrowing_id": self.borrowing.id}
+        )
+        self.payment = Payment.objects.create(
+            borrowing=self.borrowing,
+            money_to_pay="4.50",
+            session_id=self.session.id,
+            session_url=self.session.url,
+        )
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.refresh_url = reverse(
+            "payments:async-payment-refresh", kwargs={"pk": self.payment.pk}
+        )
+
+    @mock.patch(
+        "payments.tasks.process_stripe_event.delay",
+        side_effect=run_event_task_eagerly,
+    )
+    def test_webhook_stores_event_once(self, process, notify):
+        post = async_to_sync(self.async_client.post)
+        url = reverse("payments:async-stripe-webhook")
+        payload = fake_stripe.build_event(
+            "checkout.session.completed", self.session, "evt_1"
+        )
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = post(url, payload, content_type="application/json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        process.assert_called_once_with(StripeEvent.objects.get().pk)
+
+        response = post(url, "not json", content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @mock.patch("payments.tasks.process_stripe_event.delay")
+    async def test_webhook_is_not_throttled(self, process, notify):
+        url = reverse("payments:async-stripe-webhook")
+        anon_rate = int(
+            settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]["anon"].split("/")[0]
+        )
+        for _ in range(anon_rate + 1):
+            response = await self.async_client.post(
+                url,
+                fake_stripe.build_event("checkout.session.expired", self.session),
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    async def test_refresh_applies_completed_session(self, notify):
+        self.session["status"] = "complete"
+        self.session["payment_status"] = "paid"
+
+        response = await self.async_client.post(self.refresh_url, headers=self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["status"], Payment.StatusType.PAID)
+        await self.borrowing.arefresh_from_db()
+        self.assertEqual(self.borrowing.status, Borrowing.BorrowingStatus.BORROWED)
+
+    async def test_refresh_leaves_open_session_pending(self, notify):
+        response = await self.async_client.post(self.refresh_url, headers=self.headers)
+
+        self.assertEqual(response.json()["status"], Payment.StatusType.PENDING)
+
+    async def test_refresh_reports_stripe_outage(self, notify):
+        fake_stripe.fail_next()
+        response = await self.async_client.post(self.refresh_url, headers=self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    async def test_refresh_hides_other_users_payments(self, notify):
+        other = await User.objects.acreate(email="other@example.com")
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(other)}"}
+        response = await self.async_client.post(self.refresh_url, headers=self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class FinanceExportTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff_user = User.objects.create(email="staff@example.com", is_staff=True)
+        book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=1, daily_fee="1.50"
+        )
+        self.borrowing = Borrowing.objects.create(
+            book=book,
+            user=self.staff_user,
+            borrow_date=timezone.now().date(),
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=3),
+            status=Borrowing.BorrowingStatus.BORROWED,
+        )
+        self.paid = Payment.objects.create(
+            borrowing=self.borrowing,
+            money_to_pay="4.50",
+            session_id="cs_paid",
+            status=Payment.StatusType.PAID,
+        )
+        Payment.objects.create(
+            borrowing=self.borrowing,
+            type=Payment.TypeType.FINE,
+            money_to_pay="3.00",
+            session_id="cs_fine",
+        )
+        self.url = reverse("payments:finance-export")
+        self.client.force_authenticate(user=self.staff_user)
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode("utf-8").splitlines()
+
+    def test_payments_csv_filtered_by_status_and_type(self):
+        lines = self.export(status="paid", type="payment")
+        self.assertEqual(
+            lines[0].split(",")[:4], ["id", "created_at", "type", "status"]
+        )
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f"{self.paid.id},"))
+
+    def test_date_range(self):
+        today = timezone.localdate()
+        self.assertEqual(len(self.export(date_from=today.isoformat())), 3)
+        yesterday = (today - timezone.timedelta(days=1)).isoformat()
+        self.assertEqual(len(self.export(date_to=yesterday)), 1)
+
+        # Compared on the bare column, so the created_at index applies
+        sql = str(
+            payment_queryset(
+                {"date_from": yesterday, "date_to": today.isoformat()}
+            ).query
+        )
+        self.assertIn('"payments_payment"."created_at" >=', sql)
+        self.assertIn('"payments_payment"."created_at" <', sql)
+        self.assertNotIn("AT TIME ZONE", sql)
+
+    def test_borrowings_ndjson(self):
+        lines = self.export(dataset="borrowings", file_format="ndjson")
+        row = json.loads(lines[0])
+        self.assertEqual(row["id"], self.borrowing.id)
+        self.assertEqual(row["book__title"], "Test Book")
+
+    def test_invalid_filters(self):
+        response = self.client.get(self.url, {"date_from": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {"dataset": "users"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(user=User.objects.create(email="u@example.com"))
+        self.assertEqual(
+            self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN
+        )
+
+    def test_management_command(self):
+        out = io.StringIO()
+        call_command(
+            "export_finance",
+            "payments",
+            "--type",
+            "fine",
+            stdout=out,
+            stderr=io.StringIO(),
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("cs_fine", lines[1])
+
+
+class PriceQuoteTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+        self.books = [
+            Book.objects.create(
+                title=f"Book {fee}",
+                author="Author",
+                inventory=1,
+                daily_fee=Decimal(fee),
+            )
+            for fee in ("1.50", "0.99")
+        ]
+        self.url = reverse("payments:price-quote")
+
+    def get_quote(self, **params):
+        return self.client.get(self.url, params)
+
+    def day(self, offset):
+        return self.today + timezone.timedelta(days=offset)
+
+    def test_quotes_books_by_dates_in_one_query(self):
+        books = ",".join(str(book.id) for book in self.books)
+        dates = ",".join(self.day(offset).isoformat() for offset in (0, 3, 10))
+
+        with self.assertNumQueries(1):
+            response = self.get_quote(books=books, dates=dates)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["start_date"], self.today)
+        first, second = response.data["quotes"]
+        self.assertEqual(first["book"], self.books[0].id)
+        self.assertEqual(first["fees"], [None, "4.50", "15.00"])
+        self.assertEqual(second["fees"], [None, "2.97", "9.90"])
+        self.assertEqual(second["fines"], ["0.00", "5.94", "19.80"])
+
+    def test_matches_single_borrowing_prices(self):
+        book = self.books[1]
+        start = self.day(-5)
+        response = self.get_quote(
+            books=book.id, dates=self.day(4).isoformat(), start_date=start
+        )
+
+        borrowing = Borrowing(
+            book=book,
+            borrow_date=start,
+            expected_return_date=self.day(4),
+        )
+        overdue = Borrowing(
+            book=book,
+            expected_return_date=start,
+            actual_return_date=self.day(4),
+        )
+        quote = response.data["quotes"][0]
+        self.assertEqual(quote["fees"], [str(calculate_borrowing_fee(borrowing))])
+        self.assertEqual(quote["fines"], [str(calculate_fine(overdue))])
+
+    def test_unknown_books_are_left_out(self):
+        response = self.get_quote(
+            books=f"{self.books[0].id},999999", dates=self.day(1).isoformat()
+        )
+
+        self.assertEqual(
+            [quote["book"] for quote in response.data["quotes"]], [self.books[0].id]
+        )
+
+    def test_invalid_params(self):
+        for params in (
+            {"dates": self.day(1).isoformat()},
+            {"books": "x", "dates": self.day(1).isoformat()},
+            {"books": self.books[0].id, "dates": "tomorrow"},
+            {"books": self.books[0].id, "dates": ",".join(["2030-01-01"] * 32)},
+        ):
+            with self.subTest(params=params):
+                response = self.get_quote(**params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
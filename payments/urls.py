@@ -1,7 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import PaymentViewSet, stripe_webhook
+from . import async_views
+from .views import FinanceExportView, PaymentViewSet, PriceQuoteView, stripe_webhook
 
 app_name = "payments"
 
@@ -11,4 +12,12 @@ router.register(r"payments", PaymentViewSet, basename="payments")
 urlpatterns = [
     path("", include(router.urls)),
     path("webhook/", stripe_webhook, name="stripe-webhook"),
+    path("export/", FinanceExportView.as_view(), name="finance-export"),
+    path("quote/", PriceQuoteView.as_view(), name="price-quote"),
+    path("async/webhook/", async_views.stripe_webhook, name="async-stripe-webhook"),
+    path(
+        "async/payments/<int:pk>/refresh/",
+        async_views.refresh_payment,
+        name="async-payment-refresh",
+    ),
 ]
@@ -1,17 +1,35 @@
-from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (
+    action,
+    api_view,
+    permission_classes,
+    throttle_classes,
+)
+from rest_framework.views import APIView
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+from django.utils import timezone
+import json
 import stripe
 import logging
 
-from borrowings.models import Borrowing
-from config.notifications.tasks import send_telegram_payment_notification
+from config.expand import ExpandViewMixin
+from config.permissions import IsStaffUser
+from config.sparse import SparseFieldsViewMixin
+from config.streaming import get_file_format, streaming_export
+from .exports import export_dataset
 from .models import Payment
-from .serializers import PaymentSerializer
+from .pricing import quote
+from .serializers import (
+    PaymentSerializer,
+    PriceQuoteRequestSerializer,
+    PriceQuoteSerializer,
+)
+from .services import get_stripe
+from .webhooks import accept_stripe_event
 
 
 # Initialize Stripe API key from Django settings
@@ -19,112 +37,172 @@ stripe.api_key = settings.STRIPE_SECRET_KEY
 logger = logging.getLogger(__name__)
 
 
-class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
+class PaymentViewSet(
+    SparseFieldsViewMixin, ExpandViewMixin, viewsets.ReadOnlyModelViewSet
+):
     """
     ViewSet for read-only access to Payment records.
 
     Permissions:
     - Staff users can view all payments.
     - Regular users can view only their own payments related to borrowings.
+
+    Expansion:
+    - `expand=borrowing` nests the borrowing, loaded with a join.
+
+    Pagination:
+    - List is cursor-paginated, newest payments first.
+
+    Sparse fieldsets:
+    - `fields` / `omit` select the returned fields (and loaded columns) of
+      list items; `compact=true` returns a columnar page.
     """
 
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    expand_related = {"borrowing": "borrowing"}
 
     def get_queryset(self):
         user = self.request.user
+        queryset = self.select_sparse(self.select_expanded(Payment.objects.all()))
         if user.is_staff:
             # Staff users can access all payments
-            return Payment.objects.all()
+            return queryset
         # Regular users see only payments linked to their borrowings
-        return self.queryset.filter(borrowing__user=user)
+        return queryset.filter(borrowing__user=user)
+
+    @action(detail=True, methods=["get"])
+    def checkout(self, request, pk=None):
+        """
+        Poll the checkout session of a payment:
+        - 202 with a Retry-After header while the session is being created.
+        - 303 redirect to the Stripe checkout page once it is ready
+          (or 200 with the URL when `redirect=false`).
+        - 409 if the payment was canceled before a session could be opened.
+        """
+        payment = self.get_object()
+
+        if payment.status == Payment.StatusType.SESSION_PENDING:
+            return Response(
+                {"status": payment.status, "session_url": None},
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Retry-After": "1"},
+            )
+        if not payment.session_url:
+            return Response(
+                {"status": payment.status, "session_url": None},
+                status=status.HTTP_409_CONFLICT,
+            )
+        if request.query_params.get("redirect", "true").lower() in ["false", "0"]:
+            return Response(
+                {"status": payment.status, "session_url": payment.session_url}
+            )
+        return Response(
+            {"status": payment.status, "session_url": payment.session_url},
+            status=status.HTTP_303_SEE_OTHER,
+            headers={"Location": payment.session_url},
+        )
+
+
+class FinanceExportView(APIView):
+    """
+    Staff-only streaming export for finance reconciliation.
+
+    Query params:
+    - `dataset`: payments (default) or borrowings.
+    - `file_format`: csv (default) or ndjson.
+    - `date_from` / `date_to`: inclusive YYYY-MM-DD range (payment creation
+      date or borrow date).
+    - `status`, and `type` for payments.
+    """
+
+    permission_classes = [IsStaffUser]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name=name, required=False, type=str)
+            for name in (
+                "dataset",
+                "file_format",
+                "date_from",
+                "date_to",
+                "status",
+                "type",
+            )
+        ],
+        responses={200: str},
+    )
+    def get(self, request):
+        file_format = get_file_format(request)
+        dataset, rows, fields = export_dataset(request.query_params)
+        return streaming_export(rows, fields, file_format, dataset)
+
+
+class PriceQuoteView(APIView):
+    """
+    Fees and projected fines for many books and return dates in one call.
+
+    Query params:
+    - `books`: comma-separated book ids.
+    - `dates`: comma-separated YYYY-MM-DD return dates.
+    - `start_date`: defaults to today.
+
+    `fees[i]` prices a borrowing from `start_date` returned on `dates[i]`
+    (null unless that is after the start); `fines[i]` is the fine of a
+    borrowing due on `start_date` returned on `dates[i]`. Unknown books
+    are left out.
+    """
+
+    permission_classes = [AllowAny]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name="books", required=True, type=str),
+            OpenApiParameter(name="dates", required=True, type=str),
+            OpenApiParameter(name="start_date", required=False, type=str),
+        ],
+        responses={200: PriceQuoteSerializer(many=True)},
+    )
+    def get(self, request):
+        params = PriceQuoteRequestSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        start_date = params.validated_data.get("start_date") or timezone.now().date()
+        dates = params.validated_data["dates"]
+
+        quotes = quote(params.validated_data["books"], dates, start_date)
+        return Response(
+            {
+                "start_date": start_date,
+                "dates": dates,
+                "quotes": PriceQuoteSerializer(quotes, many=True).data,
+            }
+        )
 
 
 @csrf_exempt  # Disable CSRF for webhook (Stripe signs requests)
 @api_view(["POST"])
 @permission_classes([AllowAny])  # Stripe webhook must be accessible publicly
+@throttle_classes([])  # Stripe delivers bursts; unverified payloads are rejected
 def stripe_webhook(request):
     """
-    Endpoint to handle Stripe webhook events.
+    Endpoint to receive Stripe webhook events.
 
-    Handles events:
-    - checkout.session.completed: marks payment as PAID and updates borrowing status.
-    - checkout.session.expired, payment_intent.canceled: cancels payment and restores book inventory.
+    Verified events are stored once per Stripe event id and acknowledged
+    straight away; `process_stripe_event` applies them in the background.
+    Redelivered events are acknowledged without being processed again.
     """
     payload = request.body
     sig_header = request.META.get("HTTP_STRIPE_SIGNATURE")
     endpoint_secret = settings.STRIPE_WEBHOOK_SECRET
 
     try:
-        event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
+        event = get_stripe().Webhook.construct_event(
+            payload, sig_header, endpoint_secret
+        )
     except (ValueError, stripe.error.SignatureVerificationError) as e:
         logger.warning(f"Stripe webhook verification failed: {e}")
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
-    event_type = event["type"]
-    session = event["data"]["object"]
-
-    try:
-        payment = Payment.objects.get(session_id=session["id"])
-    except Payment.DoesNotExist:
-        logger.error(f"Payment with session_id={session['id']} not found.")
-        return Response(status=status.HTTP_404_NOT_FOUND)
-
-    borrowing = payment.borrowing
-    book = borrowing.book
-
-    if event_type == "checkout.session.completed":
-        # Mark payment as successful
-        payment.status = Payment.StatusType.PAID
-        payment.save()
-
-        if payment.type == Payment.TypeType.PAYMENT:
-            # Mark borrowing as active (borrowed)
-            borrowing.status = Borrowing.BorrowingStatus.BORROWED
-            borrowing.borrow_date = timezone.now().date()
-            borrowing.save()
-        elif payment.type == Payment.TypeType.FINE:
-            # Fine payment processed - already marked PAID above
-            logger.info(
-                f"Fine payment completed and marked as PAID for borrowing id={borrowing.id}"
-            )
-
-        logger.info(f"Payment completed for session {session['id']}.")
-
-        # Asynchronously notify via Telegram
-        send_telegram_payment_notification.delay(
-            {
-                "user": payment.user.email,
-                "type": payment.type.upper(),
-                "amount": str(payment.amount),
-                "borrowing_id": borrowing.id,
-                "book": book.title,
-            }
-        )
-
-    elif event_type in ["checkout.session.expired", "payment_intent.canceled"]:
-        # If payment not completed, restore inventory and cancel borrowing/payment
-        if payment.status != Payment.StatusType.PAID:
-            if book.inventory is not None:
-                book.inventory += 1
-                book.save()
-                logger.info(
-                    f"Inventory restored for book id={book.id} due to {event_type} event."
-                )
-            else:
-                logger.error(
-                    f"Book inventory is None for book id={book.id} on {event_type} event."
-                )
-
-            payment.status = Payment.StatusType.CANCELED
-            payment.save()
-
-            borrowing.status = Borrowing.BorrowingStatus.CANCELED
-            borrowing.save()
-
-    else:
-        # Unhandled events are logged for later analysis
-        logger.debug(f"Unhandled Stripe event type: {event_type}")
-
+    accept_stripe_event(event, json.loads(payload))
     return Response(status=status.HTTP_200_OK)
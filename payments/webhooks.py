@@ -0,0 +1,284 @@
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from books.services import release_copies, reserve_copies
+from borrowings.holds import allocate_holds
+from borrowings.models import Borrowing
+from config.notifications.tasks import send_telegram_payment_notification
+from stats.services import record_payment
+from .models import Payment, StripeEvent
+from .services import payment_borrowings
+
+logger = logging.getLogger(__name__)
+
+# Payments a completed checkout may move to PAID
+UNPAID_STATUSES = (Payment.StatusType.SESSION_PENDING, Payment.StatusType.PENDING)
+
+HANDLED_EVENT_TYPES = (
+    "checkout.session.completed",
+    "checkout.session.expired",
+    "payment_intent.canceled",
+)
+
+
+def record_stripe_event(event, payload):
+    """
+    Store a verified webhook event unless it was already received.
+
+    `payload` is the decoded request body. Returns the event row and
+    whether it is new.
+    """
+    session = event["data"]["object"]
+    borrowing_id = (session.get("metadata") or {}).get("borrowing_id")
+    return StripeEvent.objects.get_or_create(
+        event_id=event["id"],
+        defaults={
+            "type": event["type"],
+            "session_id": session.get("id"),
+            "borrowing_id": int(borrowing_id) if borrowing_id else None,
+            "payload": payload,
+        },
+    )
+
+
+def accept_stripe_event(event, payload):
+    """
+    Store a verified event and enqueue its processing once the row is
+    committed. Returns whether the event is new.
+
+    A redelivered event that is still RECEIVED is enqueued again: its
+    first enqueue may have failed after the row was committed, and
+    processing an event twice is a no-op.
+    """
+    from .tasks import process_stripe_event
+
+    with transaction.atomic():
+        stripe_event, created = record_stripe_event(event, payload)
+        if created or stripe_event.status == StripeEvent.StatusType.RECEIVED:
+            transaction.on_commit(lambda: process_stripe_event.delay(stripe_event.pk))
+        else:
+            logger.info(f"Duplicate Stripe event {stripe_event.event_id} ignored.")
+    return created
+
+
+def process_stripe_events(event_pk):
+    """
+    Apply a received event and any earlier pending events of its borrowing.
+
+    The borrowing row is locked for the duration, so concurrent workers
+    apply events of one borrowing strictly in the order they were received.
+    """
+    event = StripeEvent.objects.filter(pk=event_pk).first()
+    if event is None or event.status != StripeEvent.StatusType.RECEIVED:
+        return
+
+    with transaction.atomic():
+        if event.borrowing_id is None:
+            pending = StripeEvent.objects.filter(pk=event.pk)
+        else:
+            Borrowing.objects.select_for_update().filter(pk=event.borrowing_id).first()
+            pending = StripeEvent.objects.filter(
+                borrowing_id=event.borrowing_id, id__lte=event.pk
+            ).order_by("id")
+
+        for pending_event in pending.filter(status=StripeEvent.StatusType.RECEIVED):
+            process_stripe_event(pending_event)
+
+
+def process_stripe_event(event):
+    try:
+        with transaction.atomic():
+            handled = apply_checkout_event(event.type, event.session_id)
+    except Exception as e:
+        logger.exception(f"Stripe event {event.event_id} failed.")
+        event.status = StripeEvent.StatusType.FAILED
+        event.error = str(e)
+    else:
+        event.status = (
+            StripeEvent.StatusType.PROCESSED
+            if handled
+            else StripeEvent.StatusType.IGNORED
+        )
+    event.processed_at = timezone.now()
+    event.save(update_fields=["status", "error", "processed_at"])
+
+
+def apply_checkout_event(event_type, session_id):
+    """
+    Apply a checkout event to its payment and borrowing.
+
+    - checkout.session.completed: marks payment as PAID and updates borrowing status.
+    - checkout.session.expired, payment_intent.canceled: cancels payment and
+      restores book inventory.
+
+    State changes are conditional updates, so applying an event twice is a
+    no-op. Returns False for unhandled events or unknown sessions.
+    """
+    if event_type not in HANDLED_EVENT_TYPES:
+        # Unhandled events are logged for later analysis
+        logger.debug(f"Unhandled Stripe event type: {event_type}")
+        return False
+
+    try:
+        payment = Payment.objects.select_related("borrowing__user").get(
+            session_id=session_id
+        )
+    except Payment.DoesNotExist:
+        logger.error(f"Payment with session_id={session_id} not found.")
+        return False
+
+    apply_payment_event(event_type, payment)
+    return True
+
+
+def apply_payment_event(event_type, payment):
+    """
+    Apply a handled checkout event to an already loaded payment (with
+    `borrowing__user` selected). Call inside a transaction.
+    """
+    session_id = payment.session_id
+    borrowing = payment.borrowing
+
+    if event_type == "checkout.session.completed":
+        # Mark payment as successful
+        paid = Payment.objects.filter(pk=payment.pk, status__in=UNPAID_STATUSES).update(
+            status=Payment.StatusType.PAID, paid_at=timezone.now()
+        )
+        if paid:
+            book_ids = activate_borrowings(
+                payment, Borrowing.BorrowingStatus.WAITING_PAYMENT
+            )
+        else:
+            book_ids = apply_late_payment(payment)
+            if book_ids is None:
+                return
+
+        if payment.type == Payment.TypeType.FINE:
+            logger.info(
+                f"Fine payment completed and marked as PAID for borrowing id={borrowing.id}"
+            )
+
+        record_payment(payment, book_ids)
+        logger.info(f"Payment completed for session {session_id}.")
+
+        # Queue a Telegram notification (coalesced and sent by Celery)
+        notification = {
+            "user": borrowing.user.email,
+            "type": payment.type.upper(),
+            "amount": str(payment.money_to_pay),
+            "borrowing_id": borrowing.id,
+            "book": ", ".join(
+                payment_borrowings(payment)
+                .order_by("id")
+                .values_list("book__title", flat=True)
+            ),
+        }
+        transaction.on_commit(lambda: send_telegram_payment_notification(notification))
+        return
+
+    # If payment not completed, cancel borrowing/payment and restore inventory.
+    canceled = Payment.objects.filter(pk=payment.pk, status__in=UNPAID_STATUSES).update(
+        status=Payment.StatusType.CANCELED
+    )
+    # An unpaid fine leaves the (already returned) borrowing untouched
+    if canceled and payment.type == Payment.TypeType.PAYMENT:
+        borrowings = payment_borrowings(payment).filter(
+            status=Borrowing.BorrowingStatus.WAITING_PAYMENT
+        )
+        book_ids = list(borrowings.values_list("book_id", flat=True))
+        borrowings.update(
+            status=Borrowing.BorrowingStatus.CANCELED, updated_at=timezone.now()
+        )
+        release_copies(book_ids)
+        allocate_holds(book_ids)
+        logger.info(
+            f"Inventory restored for book ids={book_ids} due to {event_type} event."
+        )
+
+
+def activate_borrowings(payment, from_status):
+    """
+    Mark the borrowings a PAYMENT pays for, if still in `from_status`, as
+    borrowed from today. Returns their book ids (none for fines).
+    """
+    if payment.type != Payment.TypeType.PAYMENT:
+        return []
+    borrowings = payment_borrowings(payment).filter(status=from_status)
+    book_ids = list(borrowings.values_list("book_id", flat=True))
+    borrowings.update(
+        status=Borrowing.BorrowingStatus.BORROWED,
+        borrow_date=timezone.now().date(),
+        updated_at=timezone.now(),
+    )
+    return book_ids
+
+
+def apply_late_payment(payment):
+    """
+    Apply a completed checkout whose payment was canceled first, e.g. by
+    the session's expiry or the stale-borrowing job.
+
+    The canceled borrowings' copies are reserved again and the payment is
+    accepted. If any copy is gone, nothing is reserved and the payment is
+    marked REFUND_DUE for staff to refund. Returns the activated book ids,
+    or None when the payment was not accepted (or is not canceled).
+    """
+    canceled = (
+        Payment.objects.select_for_update()
+        .filter(pk=payment.pk, status=Payment.StatusType.CANCELED)
+        .first()
+    )
+    if canceled is None:
+        return None
+
+    if payment.type == Payment.TypeType.PAYMENT:
+        book_ids = list(
+            payment_borrowings(payment)
+            .filter(status=Borrowing.BorrowingStatus.CANCELED)
+            .values_list("book_id", flat=True)
+        )
+        savepoint = transaction.savepoint()
+        if not reserve_copies(book_ids):
+            transaction.savepoint_rollback(savepoint)
+            Payment.objects.filter(pk=payment.pk).update(
+                status=Payment.StatusType.REFUND_DUE, paid_at=timezone.now()
+            )
+            logger.error(
+                f"Late payment for canceled session {payment.session_id}: "
+                f"copies of book ids={book_ids} are gone, refund due."
+            )
+            return None
+        transaction.savepoint_commit(savepoint)
+
+    Payment.objects.filter(pk=payment.pk).update(
+        status=Payment.StatusType.PAID, paid_at=timezone.now()
+    )
+    logger.warning(f"Late payment accepted for canceled session {payment.session_id}.")
+    return activate_borrowings(payment, Borrowing.BorrowingStatus.CANCELED)
+
+
+def checkout_event_type(session):
+    """The webhook event matching a retrieved checkout session's state, if any."""
+    if session.status == "complete" and session.payment_status in (
+        "paid",
+        "no_payment_required",
+    ):
+        return "checkout.session.completed"
+    if session.status == "expired":
+        return "checkout.session.expired"
+    return None
+
+
+def apply_checkout_session(session):
+    """
+    Apply a checkout session retrieved from Stripe as its webhook would,
+    for payments whose webhook is late or was lost. Returns False while
+    the session is still open.
+    """
+    event_type = checkout_event_type(session)
+    if event_type is None:
+        return False
+    with transaction.atomic():
+        return apply_checkout_event(event_type, session.id)
@@ -0,0 +1,21 @@
+from django.contrib import admin
+
+from stats.models import BookStats, Counter, DailyRevenue
+
+
+@admin.register(DailyRevenue)
+class DailyRevenueAdmin(admin.ModelAdmin):
+    list_display = ("date", "type", "amount", "payments")
+    list_filter = ("type",)
+
+
+@admin.register(BookStats)
+class BookStatsAdmin(admin.ModelAdmin):
+    list_display = ("book", "borrow_count", "active_count")
+    list_select_related = ("book",)
+    raw_id_fields = ("book",)
+
+
+@admin.register(Counter)
+class CounterAdmin(admin.ModelAdmin):
+    list_display = ("name", "value")
@@ -0,0 +1,60 @@
+from django.db import models
+
+from payments.models import Payment
+
+
+class DailyRevenue(models.Model):
+    """Paid amounts per day and payment type."""
+
+    date = models.DateField()
+    type = models.CharField(max_length=10, choices=Payment.TypeType.choices)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    payments = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "type"], name="unique_daily_revenue"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.type}: {self.amount}"
+
+
+class BookStats(models.Model):
+    """Paid borrowings of a book, all time and currently out."""
+
+    book = models.OneToOneField(
+        "books.Book",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+    )
+    borrow_count = models.PositiveIntegerField(default=0)
+    active_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "book stats"
+        indexes = [
+            models.Index(fields=["-borrow_count"], name="book_stats_borrowed_idx"),
+            models.Index(fields=["-active_count"], name="book_stats_active_idx"),
+        ]
+
+    def __str__(self):
+        return f"Stats for book {self.book_id}"
+
+
+class Counter(models.Model):
+    """Library-wide totals, one row per name."""
+
+    ACTIVE_BORROWINGS = "active_borrowings"
+    OVERDUE_BORROWINGS = "overdue_borrowings"
+    # Running total of copies freed by expiring unpaid borrowings
+    RECLAIMED_COPIES = "reclaimed_copies"
+
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
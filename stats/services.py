@@ -0,0 +1,187 @@
+"""
+Pre-aggregated library statistics.
+
+The summary tables are bumped in the same transaction as the state change
+they count (a payment turning PAID, a book coming back), so reads never
+aggregate the big tables. `reconcile_stats` recounts everything from source
+rows into the existing summary rows and runs periodically to correct any
+drift; the overdue count, which
+changes with the calendar rather than with events, is set by the overdue
+sweep.
+"""
+
+from collections import Counter as Tally
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from borrowings.models import Borrowing
+from borrowings.services import overdue_borrowings
+from payments.models import Payment
+from .models import BookStats, Counter, DailyRevenue
+
+PAID_BORROWING_STATUSES = (
+    Borrowing.BorrowingStatus.BORROWED,
+    Borrowing.BorrowingStatus.RETURNED,
+)
+
+
+def _add(model, lookup, **increments):
+    # get_or_create tolerates a concurrent insert; the F() update is atomic
+    row, _ = model.objects.get_or_create(**lookup)
+    model.objects.filter(pk=row.pk).update(
+        **{field: F(field) + value for field, value in increments.items()}
+    )
+
+
+def _rebuild(model, key_fields, value_fields, rows):
+    """
+    Overwrite a summary table in place with recounted `rows`.
+
+    The existing rows are locked before `rows` is evaluated: an increment
+    committed earlier is part of the recount, a later one waits for the
+    lock and lands on the new value. Rows are upserted rather than deleted
+    and re-inserted, and rows with nothing left to count are zeroed.
+    """
+    existing = {
+        tuple(key): pk
+        for pk, *key in model.objects.select_for_update()
+        .order_by("pk")
+        .values_list("pk", *key_fields)
+    }
+    rows = list(rows)
+    model.objects.bulk_create(
+        [model(**row) for row in rows],
+        update_conflicts=True,
+        unique_fields=key_fields,
+        update_fields=value_fields,
+    )
+    recounted = {tuple(row[field] for field in key_fields) for row in rows}
+    model.objects.filter(
+        pk__in=[pk for key, pk in existing.items() if key not in recounted]
+    ).update(**{field: 0 for field in value_fields})
+
+
+def set_counter(name, value):
+    Counter.objects.update_or_create(name=name, defaults={"value": value})
+
+
+def record_payment(payment, book_ids=()):
+    """
+    Count a payment that just became PAID. `book_ids` are the books whose
+    borrowings it started (none for fines).
+    """
+    _add(
+        DailyRevenue,
+        {"date": timezone.now().date(), "type": payment.type},
+        amount=payment.money_to_pay,
+        payments=1,
+    )
+    for book_id, borrowings in Tally(book_ids).items():
+        _add(
+            BookStats,
+            {"book_id": book_id},
+            borrow_count=borrowings,
+            active_count=borrowings,
+        )
+    if book_ids:
+        _add(Counter, {"name": Counter.ACTIVE_BORROWINGS}, value=len(book_ids))
+
+
+def record_return(borrowing):
+    """Count the return of a borrowing that was BORROWED."""
+    _add(BookStats, {"book_id": borrowing.book_id}, active_count=-1)
+    _add(Counter, {"name": Counter.ACTIVE_BORROWINGS}, value=-1)
+    # Borrowings the overdue sweep has fined are part of its latest count
+    if borrowing.fine_calculated_at is not None:
+        _add(Counter, {"name": Counter.OVERDUE_BORROWINGS}, value=-1)
+
+
+def record_reclaimed_copies(copies):
+    """Count copies restocked by expiring unpaid borrowings."""
+    _add(Counter, {"name": Counter.RECLAIMED_COPIES}, value=copies)
+
+
+@transaction.atomic
+def reconcile_stats(on_date=None):
+    """Recount every summary table from payments and borrowings."""
+    on_date = on_date or timezone.now().date()
+
+    revenue = (
+        Payment.objects.filter(status=Payment.StatusType.PAID, paid_at__isnull=False)
+        .annotate(date=TruncDate("paid_at"))
+        .values("date", "type")
+        .annotate(amount=Sum("money_to_pay"), payments=Count("id"))
+    )
+    _rebuild(DailyRevenue, ["date", "type"], ["amount", "payments"], revenue)
+
+    active = Q(
+        status=Borrowing.BorrowingStatus.BORROWED, actual_return_date__isnull=True
+    )
+    books = (
+        Borrowing.objects.filter(status__in=PAID_BORROWING_STATUSES)
+        .values("book_id")
+        .annotate(
+            borrow_count=Count("id"),
+            active_count=Count("id", filter=active),
+        )
+    )
+    _rebuild(BookStats, ["book_id"], ["borrow_count", "active_count"], books)
+
+    set_counter(Counter.ACTIVE_BORROWINGS, Borrowing.objects.filter(active).count())
+    set_counter(Counter.OVERDUE_BORROWINGS, overdue_borrowings(on_date).count())
+
+
+def get_stats(days):
+    """Dashboard payload; every query reads a small summary table."""
+    since = timezone.now().date() - timezone.timedelta(days=days - 1)
+    revenue = list(
+        DailyRevenue.objects.filter(date__gte=since)
+        .order_by("-date", "type")
+        .values("date", "type", "amount", "payments")
+    )
+    counters = dict(Counter.objects.values_list("name", "value"))
+
+    most_borrowed = (
+        BookStats.objects.filter(borrow_count__gt=0)
+        .select_related("book")
+        .order_by("-borrow_count", "book_id")[:10]
+    )
+    busiest = (
+        BookStats.objects.filter(active_count__gt=0)
+        .select_related("book")
+        .order_by("-active_count", "book_id")[:10]
+    )
+    return {
+        "revenue": revenue,
+        "fines_collected": sum(
+            (row["amount"] for row in revenue if row["type"] == Payment.TypeType.FINE),
+            start=0,
+        ),
+        "most_borrowed": [
+            {
+                "book": stats.book_id,
+                "title": stats.book.title,
+                "borrow_count": stats.borrow_count,
+            }
+            for stats in most_borrowed
+        ],
+        "utilisation": [
+            {
+                "book": stats.book_id,
+                "title": stats.book.title,
+                "active": stats.active_count,
+                "available": stats.book.inventory,
+                "utilisation": round(
+                    stats.active_count / (stats.active_count + stats.book.inventory),
+                    4,
+                ),
+            }
+            for stats in busiest
+        ],
+        "active_borrowings": counters.get(Counter.ACTIVE_BORROWINGS, 0),
+        "overdue_borrowings": counters.get(Counter.OVERDUE_BORROWINGS, 0),
+        "reclaimed_copies": counters.get(Counter.RECLAIMED_COPIES, 0),
+    }
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from stats.services import reconcile_stats
+
+
+@shared_task
+def reconcile_stats_task():
+    """Periodic (celery-beat) rebuild of the statistics tables."""
+    reconcile_stats()
@@ -0,0 +1,150 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from books.models import Book
+from borrowings.models import Borrowing
+from borrowings.tasks import sweep_overdue_borrowings_task
+from payments.fake_stripe import fake_stripe
+from payments.models import Payment
+from payments.webhooks import apply_checkout_event
+from stats.models import BookStats, Counter, DailyRevenue
+from stats.services import reconcile_stats
+from users.models import User
+
+
+@override_settings(STRIPE_FAKE=True)
+class StatsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        fake_stripe.reset()
+        self.staff_user = User.objects.create(email="staff@example.com", is_staff=True)
+        self.user = User.objects.create(email="user@example.com")
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", author="Author", inventory=3, daily_fee="1.00"
+            )
+            for i in range(2)
+        ]
+        self.url = reverse("stats:stats")
+
+    def borrow(self, book, days=3):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            reverse("borrowing:borrowings-list"),
+            {
+                "book": book.id,
+                "expected_return_date": timezone.now().date()
+                + timezone.timedelta(days=days),
+            },
+        )
+        borrowing = Borrowing.objects.get(pk=response.data["borrowing"]["id"])
+        payment = borrowing.payments.get()
+        apply_checkout_event("checkout.session.completed", payment.session_id)
+        return borrowing
+
+    def snapshot(self):
+        return (
+            list(
+                DailyRevenue.objects.order_by("date", "type").values(
+                    "date", "type", "amount", "payments"
+                )
+            ),
+            list(BookStats.objects.order_by("book_id").values()),
+            Counter.objects.get(name=Counter.ACTIVE_BORROWINGS).value,
+        )
+
+    def test_state_changes_update_summary_tables(self):
+        first = self.borrow(self.books[0])
+        self.borrow(self.books[0])
+        self.borrow(self.books[1])
+        self.client.post(reverse("borrowing:borrowings-return-book", args=[first.id]))
+
+        stats = BookStats.objects.get(book=self.books[0])
+        self.assertEqual((stats.borrow_count, stats.active_count), (2, 1))
+        revenue = DailyRevenue.objects.get(type=Payment.TypeType.PAYMENT)
+        self.assertEqual((revenue.amount, revenue.payments), (Decimal("9.00"), 3))
+        self.assertEqual(Counter.objects.get(name="active_borrowings").value, 2)
+
+        incremental = self.snapshot()
+        reconcile_stats()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_reconcile_recounts_existing_rows_in_place(self):
+        self.borrow(self.books[0])
+        revenue = DailyRevenue.objects.get()
+        DailyRevenue.objects.filter(pk=revenue.pk).update(payments=5)
+        stale = DailyRevenue.objects.create(
+            date=timezone.now().date() - timezone.timedelta(days=1),
+            type=Payment.TypeType.FINE,
+            amount=Decimal("2.00"),
+            payments=1,
+        )
+
+        with CaptureQueriesContext(connection) as context:
+            reconcile_stats()
+
+        sql = [
+            query["sql"]
+            for query in context.captured_queries
+            if not query["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT"))
+        ]
+        self.assertFalse(any(query.startswith("DELETE") for query in sql))
+        # Rows are locked before they are recounted
+        self.assertIn("FOR UPDATE", sql[0])
+        revenue.refresh_from_db()
+        self.assertEqual(revenue.payments, 1)
+        stale.refresh_from_db()
+        self.assertEqual((stale.amount, stale.payments), (Decimal("0.00"), 0))
+
+    def test_repeated_completion_is_counted_once(self):
+        borrowing = self.borrow(self.books[0])
+        payment = borrowing.payments.get()
+        apply_checkout_event("checkout.session.completed", payment.session_id)
+
+        self.assertEqual(DailyRevenue.objects.get().payments, 1)
+
+    def test_overdue_count_set_by_sweep(self):
+        borrowing = self.borrow(self.books[0])
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            expected_return_date=timezone.now().date() - timezone.timedelta(days=2)
+        )
+
+        sweep_overdue_borrowings_task.apply()
+        self.assertEqual(Counter.objects.get(name="overdue_borrowings").value, 1)
+
+        self.client.force_authenticate(user=self.user)
+        self.client.post(
+            reverse("borrowing:borrowings-return-book", args=[borrowing.id])
+        )
+        self.assertEqual(Counter.objects.get(name="overdue_borrowings").value, 0)
+
+    def test_endpoint_reads_summary_tables(self):
+        self.borrow(self.books[1])
+        self.client.force_authenticate(user=self.staff_user)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["active_borrowings"], 1)
+        self.assertEqual(response.data["most_borrowed"][0]["title"], "Book 1")
+        self.assertEqual(response.data["utilisation"][0]["utilisation"], 0.3333)
+        self.assertEqual(response.data["revenue"][0]["amount"], Decimal("3.00"))
+
+    def test_staff_only_and_days_validation(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(
+            self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN
+        )
+
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.get(self.url, {"days": "0"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from stats.views import StatsView
+
+app_name = "stats"
+
+urlpatterns = [
+    path("", StatsView.as_view(), name="stats"),
+]
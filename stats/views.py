@@ -0,0 +1,43 @@
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from config.permissions import IsStaffUser
+from stats.services import get_stats
+
+MAX_DAYS = 366
+
+
+class StatsView(APIView):
+    """
+    Staff-only library statistics, read from pre-aggregated tables.
+
+    - `revenue`: paid amounts per day and payment type for the last `days`
+      days (30 by default), and `fines_collected` over the same window.
+    - `most_borrowed` / `utilisation`: top ten books by paid borrowings and
+      by copies currently out.
+    - `active_borrowings` / `overdue_borrowings`: library-wide totals.
+    """
+
+    permission_classes = [IsStaffUser]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="days",
+                description=f"Revenue window in days (1-{MAX_DAYS}, default 30).",
+                required=False,
+                type=int,
+            ),
+        ],
+        responses={200: dict},
+    )
+    def get(self, request):
+        try:
+            days = int(request.query_params.get("days", 30))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= MAX_DAYS:
+            raise ValidationError({"days": f"Must be between 1 and {MAX_DAYS}."})
+        return Response(get_stats(days))